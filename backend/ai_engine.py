@@ -1,15 +1,23 @@
-import google.generativeai as genai
 import os
 import json
-from dotenv import load_dotenv
+import copy
+import time
 
-load_dotenv()
+from json_stream import IncrementalJSONParser, JSONRepairError, parse as parse_json
+from netlist import generate_fallback_wiring, normalize_wire, normalize_wiring
+from cache import SingleFlight
+from plan_cache import plan_cache, make_key, hash_text
+from upstream import gemini_limiter, UpstreamUnavailable
+from metrics import JSON_REPAIRS, STAGE_SECONDS, record_upstream, span
+import logs
+from model_router import (
+    GEMINI_API_KEY, GEMINI_MODELS, MODEL_HEDGE_ENABLED, MODEL_HEDGE_PERCENTILE, MODEL_HEDGE_MIN_SAMPLES,
+    MODEL_HEDGE_DEFAULT_SECONDS, BlockedResponse, GeminiBackend, ModelRouter, PlanParseError,
+    gemini_sdk, supported_generation_config,
+)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY, transport="rest")
-
-MODEL_NAME = "gemini-flash-latest"
+# Blocking generation goes through model_router (GEMINI_MODELS); streams use the first model
+MODEL_NAME = GEMINI_MODELS[0]
 
 # System prompt to enforce JSON structure
 SYSTEM_PROMPT = """
@@ -86,171 +94,247 @@ For the `parts` array, the `type` field MUST be one of:
 4. **Safety**: If the request is unsafe, return a JSON with error field.
 """
 
+SYSTEM_PROMPT_HASH = hash_text(SYSTEM_PROMPT)
+
+generation_flights = SingleFlight()
+
+# Configure safety settings to avoid blocking harmless hardware descriptions
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+GENERATION_CONFIG = {"response_mime_type": "application/json"}
+
+# Charged against the tokens-per-minute limit before the call; corrected once the reply is in
+GEMINI_EXPECTED_OUTPUT_TOKENS = int(os.getenv("GEMINI_EXPECTED_OUTPUT_TOKENS", "2048"))
+
+MOCK_PLAN = {
+    "device_name": "Mock Device (No API Key)",
+    "description": "Please add GEMINI_API_KEY to .env to get real results.",
+    "parts": [],
+    "wiring_diagram": [],
+    "firmware": "// No API Key",
+    "analysis": "No analysis (Mock).",
+    "steps": []
+}
+
+model_router = ModelRouter(
+    [GeminiBackend(name, SAFETY_SETTINGS, GENERATION_CONFIG, GEMINI_EXPECTED_OUTPUT_TOKENS) for name in GEMINI_MODELS],
+    hedge_enabled=MODEL_HEDGE_ENABLED,
+    hedge_percentile=MODEL_HEDGE_PERCENTILE,
+    hedge_min_samples=MODEL_HEDGE_MIN_SAMPLES,
+    hedge_default_seconds=MODEL_HEDGE_DEFAULT_SECONDS,
+)
+
+# Top-level arrays streamed element by element, and the event name used for each element
+STREAMED_ARRAYS = {"parts": "part", "wiring_diagram": "wire", "steps": "step"}
+
+def build_full_prompt(prompt: str) -> str:
+    return f"{SYSTEM_PROMPT}\n\nUser Request: {prompt}\n\nResponse:"
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for rate limiting
+    return len(text) // 4
+
 async def generate_build_plan(prompt: str):
     if not GEMINI_API_KEY:
         # Mock response for when API key is missing (for safety/testing)
-        return {
-            "device_name": "Mock Device (No API Key)",
-            "description": "Please add GEMINI_API_KEY to .env to get real results.",
-            "parts": [],
-            "wiring_diagram": [],
-            "firmware": "// No API Key",
-            "analysis": "No analysis (Mock).",
-            "steps": []
-        }
+        return copy.deepcopy(MOCK_PLAN)
 
-    model = genai.GenerativeModel(MODEL_NAME)
-    
-    full_prompt = f"{SYSTEM_PROMPT}\n\nUser Request: {prompt}\n\nResponse:"
-    
-    # Configure safety settings to avoid blocking harmless hardware descriptions
-    safety_settings = [
-        {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-    ]
+    # Identical (normalized) prompts against the same models + system prompt are served from cache
+    cache_key = make_key(prompt, model_router.name, SYSTEM_PROMPT_HASH)
+    cached = await plan_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Concurrent identical prompts share one upstream call; each caller gets its own copy
+    data = await generation_flights.do(cache_key, lambda: _generate_and_cache(prompt, cache_key))
+    return copy.deepcopy(data)
+
+async def _generate_and_cache(prompt: str, cache_key: str):
+    data = await _generate_uncached(prompt)
+    if "error" not in data:
+        await plan_cache.set(cache_key, data, model_name=model_router.name, prompt=prompt)
+    return data
+
+async def _generate_uncached(prompt: str):
+    try:
+        # Hedged across GEMINI_MODELS; the first reply that survives parse_plan_text wins
+        data, model_name = await model_router.generate(build_full_prompt(prompt), parse_plan_text)
+        logs.debug("plan_generated", model=model_name)
+        return postprocess_plan(data)
+    except UpstreamUnavailable as e:
+        return _upstream_error(e)
+    except BlockedResponse as e:
+        return {"error": "AI response blocked by safety filters.", "details": str(e)}
+    except PlanParseError as e:
+        return e.error
+    except Exception as e:
+        return _engine_error(e)
+
+def parse_plan_text(text: str) -> dict:
+    """
+    Extracts and repairs the JSON document from raw model output.
+    Returns the parsed dict, or an error dict if nothing usable was found.
+    """
+    try:
+        with span("parse"):
+            data, repairs = parse_json(text)
+    except JSONRepairError as e:
+        return _parse_error(e, text)
+    _log_repairs(repairs)
+    return data
+
+def finish_plan(parser: IncrementalJSONParser) -> dict:
+    """parse_plan_text for a stream that was fed to `parser` chunk by chunk."""
+    try:
+        with span("parse"):
+            data = parser.finish()
+    except JSONRepairError as e:
+        return _parse_error(e, parser.buffer)
+    _log_repairs(parser.repairs)
+    return data
+
+def _parse_error(e: JSONRepairError, text: str) -> dict:
+    logs.error("plan_json_unparseable", error=str(e), raw_text=text)
+    return {"error": "Failed to generate valid JSON.", "details": text}
+
+def _log_repairs(repairs: list):
+    actions = [action for action, _ in repairs if action not in ("skipped_prefix", "ignored_trailing_text")]
+    for action in actions:
+        JSON_REPAIRS.labels(action).inc()
+    if actions:
+        logs.debug("plan_json_repaired", actions=sorted(set(actions)))
+
+def postprocess_plan(data: dict) -> dict:
+    # --- POST-PROCESSING & VALIDATION ---
     
-    from starlette.concurrency import run_in_threadpool
+    # 1. Ensure 'parts' exists
+    if not isinstance(data.get("parts"), list):
+        data["parts"] = []
+
+    # 2. FORMAT NORMALIZATION (Crucial for Frontend); wires that aren't objects are dropped
+    wiring = data.get("wiring_diagram")
+    wiring = normalize_wiring(wiring) if isinstance(wiring, list) else []
+
+    # 3. MANDATORY WIRING GENERATION (Fallback)
+    # If wiring_diagram is missing, empty or unusable, AUTO-GENERATE it based on parts.
+    if not wiring:
+        logs.debug("fallback_wiring", parts=len(data["parts"]))
+        with span("wiring_fallback"):
+            wiring = normalize_wiring(generate_fallback_wiring(data["parts"]))
+    data["wiring_diagram"] = wiring
+
+    return data
+
+async def stream_build_plan(prompt: str):
+    """
+    Async generator over (event, payload) pairs for the streaming endpoint.
+
+    Scalar fields are emitted under their own key ("device_name", ...), array
+    elements as "part" / "wire" / "step", and wires are normalized as they
+    arrive. The last event is ("plan", full_plan) or ("error", error_dict).
+    """
+    if not GEMINI_API_KEY:
+        for event in plan_events(MOCK_PLAN):
+            yield event
+        yield ("plan", copy.deepcopy(MOCK_PLAN))
+        return
 
+    cache_key = make_key(prompt, model_router.name, SYSTEM_PROMPT_HASH)
+    cached = await plan_cache.get(cache_key)
+    if cached is not None:
+        for event in plan_events(cached):
+            yield event
+        yield ("plan", cached)
+        return
+
+    from starlette.concurrency import iterate_in_threadpool
+
+    model = gemini_sdk().GenerativeModel(MODEL_NAME)
+    full_prompt = build_full_prompt(prompt)
+    parser = IncrementalJSONParser()
+    streamed_wires = 0
+    started = time.perf_counter()
     try:
-        # Use sync method in threadpool to avoid blocking event loop
-        # and bypass async library compatibility issues
-        response = await run_in_threadpool(
-            model.generate_content,
-            full_prompt, 
-            safety_settings=safety_settings,
-            generation_config={"response_mime_type": "application/json"}
-        )
-        
-        # Check if response was blocked
-        if not response.parts:
-            print(f"DEBUG: Response blocked. Feedback: {response.prompt_feedback}")
-            return {"error": "AI response blocked by safety filters.", "details": str(response.prompt_feedback)}
-
-        text = response.text
-        
-        # Robust JSON extraction and Repair
-        import re
-        
-        # 0. Cleanups
-        # Remove markdown code blocks if present
-        text = re.sub(r'```json', '', text)
-        text = re.sub(r'```', '', text)
-        
-        # 1. Try to find JSON block
-        match = re.search(r'\{.*\}', text, re.DOTALL)
-        if match:
-            text = match.group(0)
-            
-        # 2. Escape newlines inside strings to prevent JSON errors
-        # Improved: Remove ALL control characters except newlines and tabs which are valid in JSON strings (escaped)
-        # But for raw JSON parsing, we usually want to strip unescaped controls.
-        # We will strip non-printable characters.
-        text = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F]', '', text) 
-
-        # 3. Parse JSON
-        try:
-            data = json.loads(text)
-        except json.JSONDecodeError:
-            # Fallback: try to fix common trailing comma issues
-            text = re.sub(r',\s*\}', '}', text)
-            text = re.sub(r',\s*\]', ']', text)
-            try:
-                data = json.loads(text)
-            except:
-                print(f"ERROR: Failed to parse JSON. Raw text: {text}")
-                return {"error": "Failed to generate valid JSON.", "details": text}
-
-        # --- POST-PROCESSING & VALIDATION ---
-        
-        # 1. Ensure 'parts' exists
-        if "parts" not in data:
-            data["parts"] = []
-
-        # 2. MANDATORY WIRING GENERATION (Fallback)
-        # If wiring_diagram is missing or empty, AUTO-GENERATE it based on parts.
-        if "wiring_diagram" not in data or not data["wiring_diagram"] or len(data["wiring_diagram"]) == 0:
-            print("DEBUG: Wiring diagram missing/empty. Auto-generating fallback wiring.")
-            parts = data.get("parts", [])
-            wiring = []
-            
-            # Find Power Source (Battery) and Controller (MCU/Camera)
-            battery = next((p for p in parts if p.get("type") == "battery"), None)
-            controller = next((p for p in parts if p.get("type") in ["microcontroller", "camera"]), None)
-            
-            if battery and controller:
-                # Power Controller
-                wiring.append({"from": f"{controller['name']} (5V/VCC)", "to": f"{battery['name']} (VCC)", "label": "Power", "wire_color": "Red"})
-                wiring.append({"from": f"{controller['name']} (GND)", "to": f"{battery['name']} (GND)", "label": "GND", "wire_color": "Black"})
-                
-                # Power other components from Controller or Battery
-                for p in parts:
-                    if p == battery or p == controller: continue
-                    if p.get("type") in ["frame", "enclosure", "wheel", "propeller"]: continue # Skip structural
-                    
-                    # Connect to Controller (Signal/Power)
-                    wiring.append({"from": f"{p['name']} (VCC)", "to": f"{controller['name']} (3V3/5V)", "label": "Power", "wire_color": "Red"})
-                    wiring.append({"from": f"{p['name']} (GND)", "to": f"{controller['name']} (GND)", "label": "GND", "wire_color": "Black"})
-                    wiring.append({"from": f"{p['name']} (Data)", "to": f"{controller['name']} (GPIO)", "label": "Signal", "wire_color": "Yellow"})
-            elif controller:
-                 # USB Power Fallback
-                 for p in parts:
-                    if p == controller: continue
-                    if p.get("type") in ["frame", "enclosure", "wheel", "propeller"]: continue
-                    wiring.append({"from": f"{p['name']} (VCC)", "to": f"{controller['name']} (3V3)", "label": "Power", "wire_color": "Red"})
-                    wiring.append({"from": f"{p['name']} (GND)", "to": f"{controller['name']} (GND)", "label": "GND", "wire_color": "Black"})
-
-            data["wiring_diagram"] = wiring
-
-        # 3. FORMAT NORMALIZATION (Crucial for Frontend)
-        # The frontend expects {from_part, from_pin, to_part, to_pin}
-        # The AI (and fallback) generates {from: "Part (Pin)", to: "Part (Pin)"}
-        # We must parse the strings.
-        normalized_wiring = []
-        for wire in data.get("wiring_diagram", []):
-            new_wire = wire.copy()
-            
-            # Parse 'from'
-            if "from" in wire and "(" in wire["from"]:
-                parts = wire["from"].rsplit(" (", 1)
-                new_wire["from_part"] = parts[0].strip()
-                new_wire["from_pin"] = parts[1].replace(")", "").strip()
-            elif "from_part" not in wire:
-                # Fallback if no parens
-                new_wire["from_part"] = wire.get("from", "Unknown")
-                new_wire["from_pin"] = "Pin"
-
-            # Parse 'to'
-            if "to" in wire and "(" in wire["to"]:
-                parts = wire["to"].rsplit(" (", 1)
-                new_wire["to_part"] = parts[0].strip()
-                new_wire["to_pin"] = parts[1].replace(")", "").strip()
-            elif "to_part" not in wire:
-                new_wire["to_part"] = wire.get("to", "Unknown")
-                new_wire["to_pin"] = "Pin"
-            
-            normalized_wiring.append(new_wire)
-        
-        data["wiring_diagram"] = normalized_wiring
-
-        return data
+        # The slot is held until the stream is drained, so streams count against the concurrency cap
+        async with gemini_limiter.slot(estimate_tokens(full_prompt) + GEMINI_EXPECTED_OUTPUT_TOKENS) as slot:
+            response = await slot.call(
+                model.generate_content,
+                full_prompt,
+                safety_settings=SAFETY_SETTINGS,
+                generation_config=supported_generation_config(GENERATION_CONFIG),
+                stream=True,
+            )
+            async for chunk in iterate_in_threadpool(iter(response)):
+                if not chunk.parts:
+                    continue
+                for event in parser.feed(chunk.text):
+                    if event[0] == "item" and event[1] in STREAMED_ARRAYS:
+                        _, key, _, value = event
+                        if key == "wiring_diagram":
+                            if not isinstance(value, dict):
+                                continue
+                            value = normalize_wire(value)
+                            streamed_wires += 1
+                        yield (STREAMED_ARRAYS[key], value)
+                    elif event[0] == "value" and event[1] not in STREAMED_ARRAYS:
+                        yield (event[1], event[2])
+        gemini_limiter.tpm.adjust(estimate_tokens(parser.buffer) - GEMINI_EXPECTED_OUTPUT_TOKENS)
+        # Includes the time the client took to read the events; non-streamed calls are "model_call"
+        STAGE_SECONDS.labels("model_stream").observe(time.perf_counter() - started)
+        record_upstream(MODEL_NAME, full_prompt, parser.buffer, getattr(response, "usage_metadata", None))
+
+        if not parser.buffer:
+            logs.warning("model_response_blocked", model=MODEL_NAME, feedback=str(response.prompt_feedback))
+            yield ("error", {"error": "AI response blocked by safety filters.", "details": str(response.prompt_feedback)})
+            return
+
+        data = finish_plan(parser)
+        if "error" in data:
+            yield ("error", data)
+            return
+        data = postprocess_plan(data)
+
+        # Fallback wiring only exists after post-processing; send it now
+        if streamed_wires == 0:
+            for wire in data["wiring_diagram"]:
+                yield ("wire", wire)
 
+        await plan_cache.set(cache_key, data, model_name=MODEL_NAME, prompt=prompt)
+        yield ("plan", data)
+
+    except UpstreamUnavailable as e:
+        yield ("error", _upstream_error(e))
     except Exception as e:
-        import traceback
-        err_msg = f"{e}\n{traceback.format_exc()}"
-        print(f"ERROR in AI Engine: {err_msg}")
-        # Write to file for debugging
-        try:
-            with open("backend_error_500.log", "w", encoding="utf-8") as f:
-                f.write(err_msg)
-                f.write("\n\nRAW TEXT:\n")
-                # write text if it exists, otherwise "N/A"
-                f.write(locals().get('text', 'N/A'))
-        except:
-            pass
-            
-        return {
-            "error": str(e), 
-            "details": "Failed to generate valid plan."
-        }
+        yield ("error", _engine_error(e, parser.buffer))
+
+def plan_events(plan: dict):
+    """Replays a finished plan as the same events stream_build_plan emits."""
+    for key, value in plan.items():
+        if key in STREAMED_ARRAYS and isinstance(value, list):
+            for item in value:
+                yield (STREAMED_ARRAYS[key], item)
+        else:
+            yield (key, value)
+
+def _upstream_error(e: UpstreamUnavailable) -> dict:
+    # Expected under load: no traceback dump, and the router answers 503 + Retry-After
+    logs.warning("upstream_unavailable", error=str(e), retry_after=e.retry_after)
+    return {
+        "error": str(e),
+        "details": "Upstream AI service is rate limited or unavailable.",
+        "status_code": 503,
+        "retry_after": max(1, round(e.retry_after)),
+    }
+
+def _engine_error(e: Exception, text=None) -> dict:
+    import traceback
+    logs.error("engine_error", error=str(e), traceback=traceback.format_exc(), raw_text=text)
+    return {
+        "error": str(e), 
+        "details": "Failed to generate valid plan."
+    }
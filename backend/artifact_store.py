@@ -0,0 +1,213 @@
+import asyncio
+import contextlib
+import glob
+import hashlib
+import os
+from datetime import datetime, timedelta
+from importlib import metadata
+
+from sqlalchemy import delete, select, update
+
+from cache import SingleFlight
+from cad_pool import cad_pool
+from database import AsyncSessionLocal
+import logs
+from models import CadArtifact
+
+# Content-addressed store for exported CAD files. Identical scripts (after
+# normalization) on the same build123d version and LOD settings map to one
+# set of files that any number of builds can point at; rows are reference
+# counted and the files are removed once the last build lets go of them.
+STATIC_DIR = "static/stls"
+# Unreferenced artifacts (a failed acquire, an aborted request) are swept once
+# they are this old; 0 disables the periodic sweep
+ARTIFACT_GC_INTERVAL_SECONDS = float(os.getenv("ARTIFACT_GC_INTERVAL_SECONDS", "3600"))
+ARTIFACT_GC_GRACE_SECONDS = float(os.getenv("ARTIFACT_GC_GRACE_SECONDS", "3600"))
+
+
+def _build123d_version() -> str:
+    # Read from package metadata so the API process never imports build123d itself
+    try:
+        return metadata.version("build123d")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+BUILD123D_VERSION = _build123d_version()
+
+
+def normalize_script(script: str) -> str:
+    """Ignore line endings, trailing whitespace and surrounding blank lines; indentation is significant."""
+    lines = [line.rstrip() for line in script.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    return "\n".join(lines).strip("\n")
+
+
+def script_digest(script: str) -> str:
+    raw = f"{BUILD123D_VERSION}\x00{cad_pool.lods!r}\x00{normalize_script(script)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _url_to_path(url: str) -> str:
+    return os.path.join(STATIC_DIR, os.path.basename(url))
+
+
+def artifact_result(artifact: CadArtifact) -> dict:
+    """Same shape as cad_engine.generate_stl's result, plus the digest."""
+    result = {"cad_digest": artifact.digest, "mesh_variants": artifact.mesh_variants}
+    if artifact.body_url:
+        result["stl_body_url"] = result["openscad_body"] = artifact.body_url
+    if artifact.lid_url:
+        result["stl_lid_url"] = result["openscad_lid"] = artifact.lid_url
+    return result
+
+
+class ArtifactStore:
+    def __init__(self):
+        self._flights = SingleFlight()
+        # digest -> [lock, holders]; serializes writing and deleting one digest's files
+        self._locks: dict[str, list] = {}
+        self.hits = 0
+        self.misses = 0
+        self.collected = 0
+
+    async def get_or_create(self, script: str) -> dict:
+        """
+        Returns the artifact for `script`, running it in the CAD pool only if
+        no intact copy exists yet. Errors come back as {"error": ...}.
+        """
+        digest = script_digest(script)
+        async with AsyncSessionLocal() as db:
+            artifact = await db.get(CadArtifact, digest)
+        if artifact is not None and self._files_present(artifact):
+            self.hits += 1
+            return artifact_result(artifact)
+
+        self.misses += 1
+        return await self._flights.do(digest, lambda: self._create(digest, script))
+
+    async def acquire(self, db, script: str) -> dict:
+        """
+        Like get_or_create, but also takes a reference on the artifact inside
+        `db`'s transaction; the caller commits.
+        """
+        for _ in range(2):
+            result = await self.get_or_create(script)
+            if "error" in result:
+                return result
+            updated = await db.execute(
+                update(CadArtifact)
+                .where(CadArtifact.digest == result["cad_digest"])
+                .values(ref_count=CadArtifact.ref_count + 1)
+            )
+            if updated.rowcount:
+                return result
+            # Collected between the lookup and the increment; build it again
+        return {"error": "CAD artifact was removed while being attached, try again."}
+
+    async def release(self, db, digest: str) -> None:
+        """Drops one reference inside `db`'s transaction; call collect() after committing."""
+        if not digest:
+            return
+        await db.execute(
+            update(CadArtifact)
+            .where(CadArtifact.digest == digest)
+            .values(ref_count=CadArtifact.ref_count - 1)
+        )
+
+    async def collect(self, digest: str, created_before: datetime | None = None) -> bool:
+        """
+        Deletes the artifact and its files if nothing references it any more
+        (and, with `created_before`, it was last written before then).
+        """
+        if not digest:
+            return False
+        async with self._digest_lock(digest):
+            conditions = [CadArtifact.digest == digest, CadArtifact.ref_count <= 0]
+            if created_before is not None:
+                conditions.append(CadArtifact.created_at < created_before)
+            async with AsyncSessionLocal() as db:
+                deleted = await db.execute(delete(CadArtifact).where(*conditions))
+                await db.commit()
+            if not deleted.rowcount:
+                return False
+            # Every file derived from the artifact carries the digest in its name
+            for path in glob.glob(os.path.join(STATIC_DIR, f"*{digest}*")):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logs.warning("cad_artifact_remove_failed", path=path, error=str(e))
+        self.collected += 1
+        return True
+
+    async def sweep(self, grace_seconds: float = ARTIFACT_GC_GRACE_SECONDS) -> int:
+        """Collects every unreferenced artifact older than `grace_seconds`; returns how many went."""
+        cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+        async with AsyncSessionLocal() as db:
+            digests = (await db.execute(
+                select(CadArtifact.digest).where(CadArtifact.ref_count <= 0, CadArtifact.created_at < cutoff)
+            )).scalars().all()
+        collected = 0
+        for digest in digests:
+            # Re-checked row by row: a build may have acquired it since the select
+            if await self.collect(digest, created_before=cutoff):
+                collected += 1
+        if collected:
+            logs.log("info", "cad_artifacts_swept", count=collected)
+        return collected
+
+    async def run_sweeper(self, interval: float = ARTIFACT_GC_INTERVAL_SECONDS) -> None:
+        """Background loop started from the app lifespan."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logs.warning("cad_artifact_sweep_failed", error=str(e))
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "collected": self.collected,
+            "single_flight": self._flights.stats(),
+        }
+
+    async def _create(self, digest: str, script: str) -> dict:
+        # Held until the row exists, so a concurrent collect() can't delete the files mid-write
+        async with self._digest_lock(digest):
+            result = await cad_pool.generate_stl(script, digest)
+            if "error" in result:
+                return result
+            async with AsyncSessionLocal() as db:
+                artifact = await db.get(CadArtifact, digest)
+                if artifact is None:
+                    # Unreferenced until a build acquires it
+                    artifact = CadArtifact(digest=digest, ref_count=0)
+                    db.add(artifact)
+                artifact.body_url = result.get("stl_body_url")
+                artifact.lid_url = result.get("stl_lid_url")
+                artifact.mesh_variants = result.get("mesh_variants")
+                # The sweep's grace period counts from the last write
+                artifact.created_at = datetime.utcnow()
+                await db.commit()
+                return artifact_result(artifact)
+
+    @contextlib.asynccontextmanager
+    async def _digest_lock(self, digest: str):
+        entry = self._locks.setdefault(digest, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[digest]
+
+    @staticmethod
+    def _files_present(artifact: CadArtifact) -> bool:
+        urls = [url for url in (artifact.body_url, artifact.lid_url) if url]
+        return bool(urls) and all(os.path.exists(_url_to_path(url)) for url in urls)
+
+
+artifact_store = ArtifactStore()
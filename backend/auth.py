@@ -1,28 +1,45 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from cache import TTLCache
+from database import get_async_db
 from models import User
 from schemas import TokenData
+import hashlib
 import os
+import time
 
 # SECRET_KEY should be in .env in production
 SECRET_KEY = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "4096"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", str(ACCESS_TOKEN_EXPIRE_MINUTES * 60)))
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+_pwd_context = None
+
+def pwd_context():
+    """passlib's bcrypt context, imported on first use; its bcrypt backend loads on the first hash or verify."""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -34,12 +51,105 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+@dataclass(frozen=True)
+class CurrentUser:
+    """
+    The authenticated caller. A plain value rather than an ORM instance, so it
+    can be cached across requests and is not tied to any session.
+    """
+    id: int
+    email: str
+
+
+class UserIdentityCache:
+    """
+    Caches resolved identities by token hash, so repeat requests with the same
+    token skip both the JWT decode and the users lookup. Entries never outlive
+    the token itself. Invalidation works through a per-email version counter:
+    bumping it orphans every cached token of that user.
+
+    The cache is per process; with several workers an invalidated identity can
+    survive on other workers for at most USER_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self._versions = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        key = self.key(token)
+        entry = self.cache.get(key)
+        if entry is not None:
+            identity, version = entry
+            if version == self._versions.get(identity.email, 0):
+                self.hits += 1
+                return identity
+            self.cache.pop(key)
+        self.misses += 1
+        return None
+
+    def set(self, token: str, identity: CurrentUser, expires_at: Optional[float]) -> None:
+        ttl = self.ttl_seconds
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        if ttl <= 0:
+            return
+        entry = (identity, self._versions.get(identity.email, 0))
+        self.cache.set(self.key(token), entry, ttl_seconds=ttl)
+
+    def invalidate(self, email: str) -> None:
+        self._versions[email] = self._versions.get(email, 0) + 1
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.cache),
+            "max_entries": self.cache.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.cache.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+user_cache = UserIdentityCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS)
+
+
+@event.listens_for(User, "after_delete")
+def _invalidate_deleted_user(mapper, connection, target):
+    user_cache.invalidate(target.email)
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_changed_user(mapper, connection, target):
+    # A password change must revoke cached sessions; so must an email change
+    state = inspect(target)
+    email_history = state.attrs.email.history
+    if state.attrs.password_hash.history.has_changes() or email_history.has_changes():
+        for email in list(email_history.deleted or []) + [target.email]:
+            user_cache.invalidate(email)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cached = user_cache.get(token)
+    if cached is not None:
+        return cached
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -48,7 +158,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.email == token_data.email).first()
-    if user is None:
+    result = await db.execute(select(User.id, User.email).where(User.email == token_data.email))
+    row = result.first()
+    if row is None:
         raise credentials_exception
-    return user
+    # End the read transaction so the connection goes back to the pool while the
+    # handler runs (generation can take tens of seconds).
+    await db.commit()
+
+    identity = CurrentUser(id=row.id, email=row.email)
+    user_cache.set(token, identity, payload.get("exp"))
+    return identity
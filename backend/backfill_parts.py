@@ -0,0 +1,31 @@
+"""
+Links every stored build to the normalized parts catalog (parts /
+build_parts). New builds are linked when they are saved; run this once
+after `alembic upgrade head` adds the tables, or to rebuild the links.
+
+    python backfill_parts.py
+    python backfill_parts.py --batch-size 1000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from crud import backfill_build_parts
+from database import async_engine
+
+
+async def main(args):
+    started = time.perf_counter()
+    try:
+        stats = await backfill_build_parts(batch_size=args.batch_size)
+    finally:
+        await async_engine.dispose()
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
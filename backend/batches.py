@@ -0,0 +1,237 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Tuple
+
+from sqlalchemy import insert, or_, select, update
+
+from crud import add_builds
+from database import AsyncSessionLocal
+from feed_cache import feed_cache
+from jobs import FAILED as JOB_FAILED, QueueFull, job_queue
+from metrics import span
+import logs
+from models import Batch, BatchItem, Build
+from schemas import BuildResponse
+from validation_engine import validate_build
+
+# POST /builds/batch: many prompts in one request. Plans are generated as
+# plan-only jobs on the job queue, at most BATCH_CONCURRENCY per batch, so
+# batch items are scheduled round-robin with everyone else's generations
+# and count against the same per-user and global caps. Finished plans are
+# saved by a single writer that takes whatever has piled up (up to
+# BATCH_INSERT_CHUNK) into one transaction. While the model
+# is the bottleneck that is one build per commit; when plans come back
+# together (plan cache hits, retries of a batch) they share a commit.
+#
+# Every item's outcome is recorded in batch_items, so a batch whose stream
+# was cut off (client gone, worker restarted) is resumed by id: only the
+# items that are still pending or failed run again. A run claims the batch
+# with a lease in the batches row, so only one worker runs it at a time.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", "500"))
+BATCH_INSERT_CHUNK = int(os.getenv("BATCH_INSERT_CHUNK", "50"))
+# A run renews its lease every third of this; a worker that died stops blocking resumes after it
+BATCH_LEASE_SECONDS = int(os.getenv("BATCH_LEASE_SECONDS", "120"))
+# How long an item waits before retrying when the job queue is full
+BATCH_QUEUE_RETRY_SECONDS = float(os.getenv("BATCH_QUEUE_RETRY_SECONDS", "1"))
+
+PENDING = "pending"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class BatchRunning(Exception):
+    """Raised when a batch is already being run; the router turns it into a 409."""
+
+
+async def create_batch(user_id: int, prompts: List[str]) -> str:
+    batch_id = uuid.uuid4().hex
+    async with AsyncSessionLocal() as db:
+        db.add(Batch(id=batch_id, user_id=user_id, total=len(prompts)))
+        await db.flush()
+        await db.execute(insert(BatchItem), [
+            {"batch_id": batch_id, "position": position, "prompt": prompt, "status": PENDING}
+            for position, prompt in enumerate(prompts)
+        ])
+        await db.commit()
+    return batch_id
+
+
+async def get_batch(db, batch_id: str, user_id: int) -> Optional[Tuple[Batch, List[BatchItem]]]:
+    batch = await db.get(Batch, batch_id)
+    if batch is None or batch.user_id != user_id:
+        return None
+    items = (await db.execute(
+        select(BatchItem).where(BatchItem.batch_id == batch_id).order_by(BatchItem.position)
+    )).scalars().all()
+    return batch, items
+
+
+def batch_summary(batch: Batch, items: List[BatchItem]) -> dict:
+    counts = {PENDING: 0, SUCCEEDED: 0, FAILED: 0}
+    for item in items:
+        counts[item.status] += 1
+    if batch.lease_until is not None and batch.lease_until > datetime.utcnow():
+        status = "running"
+    elif counts[PENDING]:
+        status = "interrupted"
+    elif counts[FAILED]:
+        status = "partial"
+    else:
+        status = "completed"
+    return {
+        "id": batch.id,
+        "status": status,
+        "total": batch.total,
+        "succeeded": counts[SUCCEEDED],
+        "failed": counts[FAILED],
+        "pending": counts[PENDING],
+        "created_at": batch.created_at,
+        "finished_at": batch.finished_at,
+        "items": items,
+    }
+
+
+async def _claim(batch_id: str) -> Optional[str]:
+    """Takes the batch's lease if it is free or expired; returns the owner token, or None if another run holds it."""
+    owner = uuid.uuid4().hex
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        claimed = await db.execute(
+            update(Batch)
+            .where(Batch.id == batch_id, or_(Batch.lease_until.is_(None), Batch.lease_until < now))
+            .values(lease_owner=owner, lease_until=now + timedelta(seconds=BATCH_LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    return owner if claimed.rowcount == 1 else None
+
+
+async def _set_lease(batch_id: str, owner: str, until: Optional[datetime]) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Batch)
+            .where(Batch.id == batch_id, Batch.lease_owner == owner)
+            .values(lease_until=until)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+
+async def _keep_lease(batch_id: str, owner: str) -> None:
+    while True:
+        await asyncio.sleep(BATCH_LEASE_SECONDS / 3)
+        await _set_lease(batch_id, owner, datetime.utcnow() + timedelta(seconds=BATCH_LEASE_SECONDS))
+
+
+async def run_batch(batch_id: str, user_id: int) -> AsyncIterator[dict]:
+    """
+    Generates every pending or failed item of the batch. Yields a header
+    {"batch_id", "total", "running"} first, then one result per item in
+    completion order: {"position", "status": "succeeded", "warnings",
+    "build": BuildResponse} or {"position", "status": "failed", "error"}.
+    Callers check ownership. Raises BatchRunning, or QueueFull when the
+    user's job queue has no room, before the header. If the consumer goes
+    away, in-flight items stay pending for a resume (their jobs still finish
+    and warm the plan cache).
+    """
+    owner = await _claim(batch_id)
+    if owner is None:
+        raise BatchRunning("This batch is already running.")
+    lease = asyncio.create_task(_keep_lease(batch_id, owner))
+    workers = []
+    try:
+        async with AsyncSessionLocal() as db:
+            total = await db.scalar(select(Batch.total).where(Batch.id == batch_id))
+            todo = (await db.execute(
+                select(BatchItem.position, BatchItem.prompt)
+                .where(BatchItem.batch_id == batch_id, BatchItem.status != SUCCEEDED)
+                .order_by(BatchItem.position)
+            )).all()
+        # The first item is queued before the header, so a full queue refuses the batch (429) like POST /builds/jobs
+        first = await job_queue.submit(user_id, todo[0].prompt, plan_only=True) if todo else None
+        yield {"batch_id": batch_id, "total": total, "running": len(todo)}
+
+        queue = iter(todo[1:])
+        finished: asyncio.Queue = asyncio.Queue()
+
+        async def run_item(position: int, prompt: str, job=None):
+            while job is None:
+                try:
+                    job = await job_queue.submit(user_id, prompt, plan_only=True)
+                except QueueFull:
+                    await asyncio.sleep(BATCH_QUEUE_RETRY_SECONDS)
+            job = await job_queue.result(job.id)
+            if job.status == JOB_FAILED:
+                logs.error("batch_item_failed", batch_id=batch_id, position=position, error=job.error)
+                plan_data = {"error": job.error}
+            else:
+                plan_data = job.plan_data
+                # The batch owns the plan now; don't keep a copy in the job store until it expires
+                job.plan_data = None
+                await job_queue.backend.update(job)
+            await finished.put((position, prompt, plan_data))
+
+        async def worker(first_item=None):
+            if first_item is not None:
+                await run_item(*first_item)
+            for position, prompt in queue:
+                await run_item(position, prompt)
+
+        if todo:
+            workers = [asyncio.create_task(worker((todo[0].position, todo[0].prompt, first)))]
+            workers += [asyncio.create_task(worker()) for _ in range(min(BATCH_CONCURRENCY, len(todo)) - 1)]
+        remaining = len(todo)
+        while remaining:
+            chunk = [await finished.get()]
+            while len(chunk) < BATCH_INSERT_CHUNK and not finished.empty():
+                chunk.append(finished.get_nowait())
+            remaining -= len(chunk)
+            for result in await _save_chunk(batch_id, user_id, chunk):
+                yield result
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(Batch).where(Batch.id == batch_id).values(finished_at=datetime.utcnow()))
+            await db.commit()
+    finally:
+        for task in workers + [lease]:
+            task.cancel()
+        # If this doesn't get through, the lease simply expires
+        await _set_lease(batch_id, owner, None)
+
+
+async def _save_chunk(batch_id: str, user_id: int, chunk) -> List[dict]:
+    """Saves the builds of a chunk of finished plans and their items' outcomes in one transaction."""
+    results, item_updates, new_builds = [], [], []
+    for position, prompt, plan_data in chunk:
+        if "error" in plan_data:
+            results.append({"position": position, "status": FAILED, "error": plan_data["error"]})
+            item_updates.append({"batch_id": batch_id, "position": position, "status": FAILED,
+                                 "error": plan_data["error"], "build_id": None, "warnings": []})
+            continue
+        warnings = validate_build(plan_data.get("parts", []), wiring=plan_data.get("wiring_diagram"))
+        build = Build.from_plan(user_id, prompt, plan_data)
+        new_builds.append(build)
+        results.append({"position": position, "status": SUCCEEDED, "warnings": warnings, "build": build})
+        item_updates.append({"batch_id": batch_id, "position": position, "status": SUCCEEDED,
+                             "error": None, "warnings": warnings})
+
+    async with AsyncSessionLocal() as db:
+        with span("db_commit"):
+            await add_builds(db, new_builds)
+            for update_values, result in zip(item_updates, results):
+                if result["status"] == SUCCEEDED:
+                    update_values["build_id"] = result["build"].id
+            # ORM bulk UPDATE by primary key: one executemany for the whole chunk
+            await db.execute(update(BatchItem), item_updates)
+            await db.commit()
+    if new_builds:
+        feed_cache.invalidate()
+
+    for result in results:
+        if "build" in result:
+            result["build"] = BuildResponse.model_validate(result["build"]).model_dump(mode="json")
+    return results
+
@@ -0,0 +1,144 @@
+"""
+A 200-prompt kit generated as 200 sequential POST /builds/generate calls vs
+one POST /builds/batch, against a throwaway SQLite database.
+
+The model is replaced by a stub that answers with the mock plan after
+--model-ms, so the numbers are the API's own overhead (auth, request
+handling, commits) plus how well the batch overlaps model calls. Requests
+go straight into the ASGI app; commits are counted on the engine.
+
+    python benchmarks/bench_batch.py
+    python benchmarks/bench_batch.py --prompts 500 --model-ms 200
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def stream_post(app, path, body, headers):
+    """POST through the ASGI app; returns (status, [(seconds since start, chunk)]) as the chunks are sent."""
+    payload = json.dumps(body).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json")] + [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    started = time.perf_counter()
+    status, chunks, sent = 0, [], False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            chunks.append((time.perf_counter() - started, message["body"]))
+
+    await app(scope, receive, send)
+    disconnected.set()
+    return status, chunks
+
+
+def seed():
+    from database import Base, engine, SessionLocal
+    from models import User
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(User(email="bench@example.com", password_hash="x"))
+    db.commit()
+    db.close()
+
+
+async def run(args):
+    import httpx
+    from sqlalchemy import event
+
+    import ai_engine
+    import batches
+    import jobs
+    import main
+    import routers.builds
+    from auth import create_access_token
+    from database import async_engine
+
+    seed()
+
+    async def stub_model(prompt):
+        await asyncio.sleep(args.model_ms / 1000)
+        return copy.deepcopy(ai_engine.MOCK_PLAN)
+
+    routers.builds.generate_build_plan = stub_model
+    jobs.generate_build_plan = stub_model
+    # httpx's transport doesn't run the lifespan; batch items run on the job queue's workers
+    await jobs.job_queue.start()
+
+    commits = 0
+
+    def count_commit(conn):
+        nonlocal commits
+        commits += 1
+
+    event.listen(async_engine.sync_engine, "commit", count_commit)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'bench@example.com'})}"}
+    prompts = [f"bench kit project {i}" for i in range(args.prompts)]
+    results = {"prompts": args.prompts, "model_ms": args.model_ms, "concurrency": batches.BATCH_CONCURRENCY}
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        commits = 0
+        started = time.perf_counter()
+        for prompt in prompts:
+            response = await client.post("/builds/generate", json={"prompt": prompt}, headers=headers)
+            assert response.status_code == 200, response.text
+        elapsed = time.perf_counter() - started
+        results["sequential"] = {"seconds": round(elapsed, 2), "builds_per_second": round(args.prompts / elapsed, 1),
+                                 "commits": commits}
+
+    # httpx's ASGI transport buffers whole responses; time the stream's chunks as the app sends them
+    commits = 0
+    status, chunks = await stream_post(main.app, "/builds/batch", {"prompts": prompts}, headers)
+    assert status == 200, status
+    items = [(at, json.loads(chunk)) for at, chunk in chunks][1:]  # after the header line
+    assert len(items) == args.prompts and all(item["status"] == "succeeded" for _, item in items)
+    elapsed = chunks[-1][0]
+    results["batch"] = {"seconds": round(elapsed, 2), "builds_per_second": round(args.prompts / elapsed, 1),
+                        "first_result_ms": round(items[0][0] * 1000, 1), "commits": commits}
+
+    results["speedup"] = round(results["sequential"]["seconds"] / results["batch"]["seconds"], 1)
+    await jobs.job_queue.stop()
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prompts", type=int, default=200)
+    parser.add_argument("--model-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="prawler-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault("PLAN_CACHE_ENABLED", "0")
+    os.chdir(workdir)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
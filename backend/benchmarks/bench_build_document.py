@@ -0,0 +1,134 @@
+"""
+GET /builds/{id} for a large build (300 parts, 300 wires): CPU per request
+for the stored document vs the previous handler, which loaded every column and
+re-serialized them through response_model=BuildResponse. Requests go straight
+into the ASGI app on one worker, one at a time, so process CPU time per
+request is the app's own cost. The previous handler runs in a bare app
+without the API's middleware, which flatters "before". Also reports the
+one-off cost of rendering the document at write time and the 304 path.
+
+    python benchmarks/bench_build_document.py
+    python benchmarks/bench_build_document.py --parts 1000 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_feed_cache import call
+
+
+def large_plan(parts: int) -> dict:
+    return {
+        "device_name": "Large Test Rig",
+        "description": "A build with many parts, as produced by a multi-board robotics prompt. " * 5,
+        "parts": [
+            {"name": f"Module {i}", "type": ["sensor", "motor", "led", "module"][i % 4], "quantity": 1 + i % 3,
+             "specs": {"voltage": "5V", "current_ma": 20 + i, "interface": "I2C", "notes": "Mount on the left rail."}}
+            for i in range(parts)
+        ],
+        "wiring_diagram": [
+            {"from": f"MCU.GPIO{i % 40}", "to": f"Module {i}.SIG", "color": "yellow", "net": f"N{i}"} for i in range(parts)
+        ],
+        "firmware": "// firmware\nvoid loop() { read_sensors(); update_outputs(); }\n" * 400,
+        "enclosure": "Two-part enclosure with a removable lid. " * 20,
+        "analysis": "Power budget and pin usage checked. " * 50,
+        "steps": [{"step": i + 1, "title": f"Step {i + 1}", "description": "Wire the next module and test it."}
+                  for i in range(50)],
+    }
+
+
+async def seed(parts: int):
+    from crud import add_build, set_document
+    from database import AsyncSessionLocal, Base, engine
+    from models import Build, User
+
+    Base.metadata.create_all(bind=engine)
+    async with AsyncSessionLocal() as db:
+        user = User(email="bench@example.com", password_hash="x")
+        db.add(user)
+        await db.flush()
+        build = await add_build(db, Build.from_plan(user.id, "a large test rig", large_plan(parts)))
+        await db.commit()
+
+        rounds = 50
+        started = time.process_time()
+        for _ in range(rounds):
+            set_document(build)
+        render_ms = (time.process_time() - started) / rounds * 1000
+    return build.id, len(build.document), build.document_etag, render_ms
+
+
+def legacy_app():
+    """The handler as it was before documents were stored."""
+    from fastapi import Depends, FastAPI, HTTPException
+    from database import get_async_db
+    from models import Build
+    from schemas import BuildResponse
+
+    app = FastAPI()
+
+    @app.get("/builds/{build_id}", response_model=BuildResponse)
+    async def get_build(build_id: int, db=Depends(get_async_db)):
+        build = await db.get(Build, build_id)
+        if not build:
+            raise HTTPException(status_code=404, detail="Build not found")
+        return build
+
+    return app
+
+
+async def cpu_per_request(app, path, headers, requests):
+    status, size = await call(app, path, "", headers)
+    started_cpu, started_wall = time.process_time(), time.perf_counter()
+    for _ in range(requests):
+        await call(app, path, "", headers)
+    return {
+        "status": status,
+        "bytes": size,
+        "cpu_us": round((time.process_time() - started_cpu) / requests * 1e6),
+        "wall_us": round((time.perf_counter() - started_wall) / requests * 1e6),
+    }
+
+
+async def run(args):
+    import main
+    from database import async_engine
+
+    build_id, document_bytes, etag, render_ms = await seed(args.parts)
+    path = f"/builds/{build_id}"
+    before = await cpu_per_request(legacy_app(), path, {}, args.requests)
+    after = await cpu_per_request(main.app, path, {}, args.requests)
+    not_modified = await cpu_per_request(main.app, path, {"If-None-Match": etag}, args.requests)
+    await async_engine.dispose()
+    return {
+        "parts": args.parts,
+        "document_bytes": document_bytes,
+        "render_document_ms": round(render_ms, 2),
+        "before": before,
+        "stored_document": after,
+        "not_modified": not_modified,
+        "cpu_reduction": round(before["cpu_us"] / after["cpu_us"], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--parts", type=int, default=300)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="prawler-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault("CAD_WORKERS", "0")
+    os.chdir(workdir)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Response size and latency of the build listing for a user with many builds.
+
+Compares the old behaviour (every build fully hydrated through BuildResponse)
+with one keyset page of BuildSummary from GET /builds/, and with walking all
+pages via X-Next-Cursor.
+
+    python benchmarks/bench_build_listing.py --builds 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(builds):
+    from database import Base, engine, SessionLocal
+    from models import Build, User
+    from auth import get_password_hash
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = User(email="bench@example.com", password_hash=get_password_hash("bench"))
+    db.add(user)
+    db.commit()
+    parts = [{"name": f"Part {i}", "type": "sensor", "specs": "3.3V, I2C", "note": "x" * 80} for i in range(25)]
+    wires = [{"from": f"Part {i} (VCC)", "to": "ESP32 (3V3)", "from_part": f"Part {i}", "from_pin": "VCC",
+              "to_part": "ESP32", "to_pin": "3V3", "label": "Power", "wire_color": "Red"} for i in range(40)]
+    for start in range(0, builds, 200):
+        db.add_all([
+            Build(
+                user_id=user.id, prompt=f"bench build {i}", device_name=f"Device {i}",
+                description="A seeded device used for listing benchmarks.",
+                parts_json=parts, wiring_json=wires, firmware_code="// firmware\n" * 400,
+                enclosure_md="", analysis="analysis " * 300, steps_json=[f"Step {n}" for n in range(15)],
+            )
+            for i in range(start, min(builds, start + 200))
+        ])
+        db.commit()
+    db.close()
+
+
+async def run(args):
+    import httpx
+    from pydantic import TypeAdapter
+    from typing import List
+    from sqlalchemy import select
+    from auth import create_access_token
+    from database import AsyncSessionLocal, async_engine
+    from models import Build
+    from schemas import BuildResponse
+    import main
+
+    seed(args.builds)
+    results = {"builds": args.builds}
+
+    # Old behaviour: load and serialize every build in full
+    adapter = TypeAdapter(List[BuildResponse])
+    timings = []
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(select(Build).order_by(Build.created_at.desc()))).scalars().all()
+            body = adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+        timings.append(time.perf_counter() - start)
+    results["full_list"] = {"bytes": len(body), "best_ms": round(min(timings) * 1000, 2)}
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'bench@example.com'})}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+        timings = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            response = await client.get("/builds/", params={"limit": args.page_size}, headers=headers)
+            timings.append(time.perf_counter() - start)
+        results["summary_page"] = {
+            "page_size": args.page_size,
+            "bytes": len(response.content),
+            "best_ms": round(min(timings) * 1000, 2),
+        }
+
+        start = time.perf_counter()
+        total_bytes, pages, cursor = 0, 0, None
+        while True:
+            params = {"limit": args.page_size}
+            if cursor:
+                params["cursor"] = cursor
+            response = await client.get("/builds/", params=params, headers=headers)
+            total_bytes += len(response.content)
+            pages += 1
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        results["all_summary_pages"] = {
+            "pages": pages,
+            "bytes": total_bytes,
+            "ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--builds", type=int, default=1000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="prawler-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.chdir(workdir)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Cold start of an API worker, measured from the outside as a container
+autoscaler would see it. Each round starts a fresh `uvicorn main:app` against
+a migrated SQLite database and the local fake Gemini (zero latency), then
+records:
+
+  import_ms          `python -c "import main"` on its own
+  ready_ms           process start until the port is open and GET / answers
+  first_login_ms     the first POST /auth/login (bcrypt's backend loads here unless warmed)
+  first_generate_ms  the first POST /builds/generate (the Gemini SDK import, unless warmed)
+  second_generate_ms a second one, for the steady-state cost
+
+Rounds run with STARTUP_WARMUP off and on; medians are printed as JSON.
+--app-dir points at another checkout's backend/ to compare commits:
+
+    python benchmarks/bench_cold_start.py
+    python benchmarks/bench_cold_start.py --rounds 10 --app-dir /tmp/prawler-old/backend
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from load_test import BACKEND_DIR, free_port, start_process
+
+EMAIL, PASSWORD = "cold@example.com", "cold-start-password"
+
+
+def wait_until_ready(port: int, process, timeout: float = 60) -> None:
+    """
+    Polls with bare connects (uvicorn only listens once startup is done), then
+    confirms with one GET; an HTTP client per attempt would compete with the
+    starting worker for CPU.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"process exited with {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.01)
+    else:
+        raise RuntimeError(f"port {port} did not open within {timeout:.0f}s")
+    httpx.get(f"http://127.0.0.1:{port}/", timeout=10)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    response = fn()
+    response.raise_for_status()
+    return round((time.perf_counter() - started) * 1000, 1), response
+
+
+def one_round(app_dir: str, env: dict, workdir: str) -> dict:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], cwd=app_dir, env=env, check=True, capture_output=True)
+    result = {"import_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    api = start_process(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", app_dir, "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        workdir, env, os.path.join(workdir, "api.log"),
+    )
+    try:
+        started = time.perf_counter()
+        wait_until_ready(port, api)
+        result["ready_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        with httpx.Client(base_url=url, timeout=60) as client:
+            # A fresh address each round, so signup never collides with an earlier round's user
+            email = f"{port}-{EMAIL}"
+            client.post("/auth/signup", json={"email": email, "password": PASSWORD}).raise_for_status()
+            result["first_login_ms"], response = timed(
+                lambda: client.post("/auth/login", data={"username": email, "password": PASSWORD})
+            )
+            auth = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            for key in ("first_generate_ms", "second_generate_ms"):
+                result[key], _ = timed(
+                    lambda: client.post("/builds/generate", json={"prompt": f"cold start {key} {port}"}, headers=auth)
+                )
+    finally:
+        api.terminate()
+        api.wait(timeout=10)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--app-dir", default=BACKEND_DIR, help="backend/ directory to start (another checkout to compare)")
+    args = parser.parse_args()
+    app_dir = os.path.abspath(args.app_dir)
+
+    workdir = tempfile.mkdtemp(prefix="prawler-cold-")
+    fake_port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'cold.db')}",
+        "GEMINI_API_KEY": "fake",
+        "GEMINI_API_ENDPOINT": f"http://127.0.0.1:{fake_port}",
+        "PLAN_CACHE_ENABLED": "0",
+        "CAD_WORKERS": "0",
+        "LOG_DEBUG_SAMPLE_RATE": "0",
+    })
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=app_dir, env=env, check=True,
+                   capture_output=True)
+    fake = start_process(
+        [sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "fake_gemini.py"), "--port", str(fake_port),
+         "--latency", "fixed:0", "--chunk-delay", "0"],
+        workdir, env, os.path.join(workdir, "fake.log"),
+    )
+    results = {"app_dir": app_dir, "rounds": args.rounds}
+    try:
+        wait_until_ready(fake_port, fake)
+        for warmup in ("0", "1"):
+            rounds = [one_round(app_dir, dict(env, STARTUP_WARMUP=warmup), workdir) for _ in range(args.rounds)]
+            results[f"warmup_{'on' if warmup == '1' else 'off'}"] = {
+                key: round(statistics.median(r[key] for r in rounds), 1) for key in rounds[0]
+            }
+    finally:
+        fake.terminate()
+        fake.wait(timeout=10)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+GET /builds/public throughput with and without the feed cache, on one worker.
+
+Requests are driven straight into the ASGI app (no sockets or HTTP parsing),
+so the numbers are the app's own cost per request: middleware, routing and
+either a database page + serialization (uncached) or a memory lookup in
+FeedCacheMiddleware (cached). Scenarios:
+
+  uncached      FEED_CACHE_ENABLED off: every request queries and serializes
+  cached        repeat visitors without an ETag: 200 from memory
+  revalidated   If-None-Match with the current ETag: 304, no body
+  with_writes   cached, while a writer saves a build (and invalidates) every 100 ms
+
+    python benchmarks/bench_feed_cache.py
+    python benchmarks/bench_feed_cache.py --seconds 10 --clients 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(builds):
+    from database import Base, engine, SessionLocal
+    from models import Build, User
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = User(email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.add_all([
+        Build(
+            user_id=user_id, prompt=f"bench build {i}", device_name=f"Device {i}",
+            description="A seeded device used for feed benchmarks. " * 4,
+            parts_json=[{"name": f"Part {n}", "type": "sensor"} for n in range(25)], wiring_json=[],
+            firmware_code="// firmware\n" * 400, enclosure_md="", analysis="analysis " * 300, steps_json=[],
+        )
+        for i in range(builds)
+    ])
+    db.commit()
+    db.close()
+    return user_id
+
+
+async def call(app, path, query, headers):
+    """One request through the ASGI app; returns (status, body length)."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    status, size = 0, 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status, size
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, size
+
+
+async def load(app, seconds, clients, headers=None, expect=200):
+    latencies, sizes = [], []
+    deadline = time.perf_counter() + seconds
+
+    async def client():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            status, size = await call(app, "/builds/public", "limit=20", headers or {})
+            latencies.append(time.perf_counter() - started)
+            sizes.append(size)
+            assert status == expect, status
+            # A real connection yields on socket I/O; let the writer (and other clients) run
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(clients)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "req_per_second": round(len(latencies) / elapsed),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3),
+        "bytes_per_response": round(statistics.mean(sizes)),
+    }
+
+
+async def run(args):
+    import feed_cache as feed_cache_module
+    import main
+    import routers.builds
+    from crud import save_build_from_plan
+    from database import async_engine
+    from feed_cache import feed_cache
+
+    user_id = seed(args.builds)
+    results = {"builds": args.builds, "clients": args.clients, "seconds": args.seconds}
+
+    routers.builds.FEED_CACHE_ENABLED = feed_cache_module.FEED_CACHE_ENABLED = False
+    results["uncached"] = await load(main.app, args.seconds, args.clients)
+    routers.builds.FEED_CACHE_ENABLED = feed_cache_module.FEED_CACHE_ENABLED = True
+
+    results["cached"] = await load(main.app, args.seconds, args.clients)
+    page, _ = await feed_cache.get(("public", 20, None), None)
+    results["revalidated"] = await load(main.app, args.seconds, args.clients, {"If-None-Match": page.etag}, expect=304)
+
+    stop = asyncio.Event()
+    writes = 0
+
+    async def writer():
+        nonlocal writes
+        while not stop.is_set():
+            await save_build_from_plan(user_id, "bench write", {"device_name": "Fresh build", "parts": []})
+            writes += 1
+            await asyncio.sleep(0.1)
+
+    task = asyncio.create_task(writer())
+    results["with_writes"] = await load(main.app, args.seconds, args.clients)
+    stop.set()
+    await task
+    results["with_writes"]["writes"] = writes
+    results["feed_cache"] = feed_cache.stats()
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--builds", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="prawler-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault("PLAN_CACHE_ENABLED", "0")
+    os.chdir(workdir)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Plan JSON extraction: the old regex repair chain vs json_stream's tolerant
+single-pass parser, on a corpus of model-output shapes plus a fuzz run.
+
+Corpus: clean / fenced / prose-wrapped plans, trailing commas, raw control
+characters, firmware whose strings contain ``` and ",}" (which the regex
+chain rewrites), truncated output, and a real Gemini error dump checked in as
+benchmarks/corpus/gemini_error_500.log (the bench fails without it).
+
+Fuzz: plans serialized with random defects (trailing/missing/extra commas,
+comments, unquoted keys, Python literals, stray control characters, invalid
+escapes, prose around the object) must parse back to the original plan,
+fed whole or in random chunks. Truncations must be rejected. Exits 1 if an
+invariant fails.
+
+    python benchmarks/bench_json_extract.py
+    python benchmarks/bench_json_extract.py --parts 300 --fuzz 5000
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# A 429 traceback captured from a production 500, with Python-repr dicts the parser must reject
+ERROR_DUMP_PATH = os.path.join(BACKEND_DIR, "benchmarks", "corpus", "gemini_error_500.log")
+
+from json_stream import IncrementalJSONParser, JSONRepairError, parse  # noqa: E402
+
+FIRMWARE = r'''```cpp
+#include <WiFi.h>
+// {"status": "ok"} is what the hub expects
+const int pins[] = {4, 5, 18,};
+const char* pattern = "^\\d+,\\s*$";
+void setup() { Serial.begin(115200); }
+void loop() { if (ready) { send("{}"); } }
+```'''
+
+
+def legacy_parse_plan_text(text: str):
+    """The regex chain parse_plan_text used before json_stream, minus its logging."""
+    text = re.sub(r'```json', '', text)
+    text = re.sub(r'```', '', text)
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if match:
+        text = match.group(0)
+    text = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F]', '', text)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        text = re.sub(r',\s*\}', '}', text)
+        text = re.sub(r',\s*\]', ']', text)
+        try:
+            return json.loads(text)
+        except Exception:
+            return {"error": "Failed to generate valid JSON.", "details": text}
+
+
+def make_plan(parts: int) -> dict:
+    types = ["microcontroller", "sensor", "motor", "display", "battery", "led", "module"]
+    return {
+        "device_name": "Greenhouse Monitor",
+        "description": "Tracks soil moisture, light and temperature; reports over WiFi.",
+        "parts": [
+            {
+                "name": f"Part {i} (v{i % 3})",
+                "type": types[i % len(types)],
+                "quantity": 1 + i % 4,
+                "placement": {"x": i * 0.5, "y": -1.25, "z": 0},
+                "specs": "3.3V, I2C @ 0x3C; see \"datasheet\" ± 5%",
+                "note": "Mount away from the pump",
+                "optional": i % 5 == 0,
+                "alternative": None,
+            }
+            for i in range(parts)
+        ],
+        "wiring_diagram": [
+            {"from": f"Part {i} (VCC)", "to": "Part 0 (3V3)", "label": "Power", "wire_color": "Red"}
+            for i in range(1, parts)
+        ],
+        "firmware": FIRMWARE,
+        "steps": [f"Step {i}: fit part {i}" for i in range(parts)],
+        "analysis": "## Power\nAverage draw is ~80 mA.\tPeak 240 mA.",
+    }
+
+
+def corpus(plan: dict) -> list:
+    """(name, text, expected plan or None when the text must be rejected)."""
+    clean = json.dumps(plan, indent=2)
+    compact = json.dumps(plan)
+    raw_newlines = compact.replace("\\n", "\n").replace("\\t", "\t")
+    cases = [
+        ("clean", clean, plan),
+        ("fenced", f"```json\n{clean}\n```", plan),
+        ("prose_wrapped", f"Here is your build plan {{as requested}}:\n\n{clean}\n\nLet me know if you need changes!", plan),
+        ("trailing_commas", re.sub(r'(\]|\}|"|\d|true|false|null)(\n\s*[\]\}])', r"\1,\2", clean), plan),
+        ("raw_control_characters", raw_newlines.replace('"Mount', '"\x01Mount'), plan),
+        ("truncated", clean[: len(clean) * 2 // 3], None),
+    ]
+    # Missing fixture is an error, not a skipped case
+    with open(ERROR_DUMP_PATH, encoding="utf-8") as f:
+        log = f.read()
+    raw = log.split("RAW TEXT:\n", 1)[1] if "RAW TEXT:\n" in log else ""
+    # The whole dump (traceback with Python-repr dicts) and its RAW TEXT section
+    cases.append(("gemini_error_500.log", log, None))
+    if raw.strip() and raw.strip() != "N/A":
+        cases.append(("gemini_error_500.log:raw_text", raw, "any"))
+    return cases
+
+
+def outcome(fn, text):
+    try:
+        data = fn(text)
+    except JSONRepairError:
+        return None
+    return None if isinstance(data, dict) and "error" in data and "details" in data else data
+
+
+def new_parse(text):
+    return parse(text)[0]
+
+
+def chunked_parse(text, chunk_size=64, rnd=None):
+    parser = IncrementalJSONParser()
+    i = 0
+    while i < len(text):
+        size = rnd.randint(1, chunk_size) if rnd else chunk_size
+        parser.feed(text[i:i + size])
+        i += size
+    return parser.finish()
+
+
+def timed(fn, text, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        outcome(fn, text)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return round(statistics.median(samples), 1)
+
+
+# --- fuzz -------------------------------------------------------------------
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*\Z")
+
+
+def defective(value, rnd, rate):
+    """Serializes `value` with random defects that the parser must repair."""
+    if isinstance(value, dict):
+        members = []
+        for key, item in value.items():
+            name = key if IDENTIFIER.match(key) and rnd.random() < rate else defective_string(key, rnd, 0)
+            members.append(f"{name}:{' ' if rnd.random() < 0.5 else ''}{defective(item, rnd, rate)}")
+        # A missing comma is only recoverable before a quoted key
+        return "{" + join(members, rnd, rate, lambda m: m.startswith('"')) + close(rnd, rate, members) + "}"
+    if isinstance(value, list):
+        items = [defective(item, rnd, rate) for item in value]
+        return "[" + join(items, rnd, rate, lambda m: True) + close(rnd, rate, items) + "]"
+    if isinstance(value, str):
+        return defective_string(value, rnd, rate)
+    if value is True or value is False or value is None:
+        return {True: "True", False: "False", None: "None"}[value] if rnd.random() < rate else json.dumps(value)
+    return json.dumps(value)
+
+
+def defective_string(value, rnd, rate):
+    text = json.dumps(value, ensure_ascii=False)
+    if rnd.random() < rate:
+        # Stray control character (dropped by the parser)
+        at = rnd.randint(1, len(text) - 1)
+        while text[at - 1] == "\\":
+            at -= 1
+        text = text[:at] + "\x01" + text[at:]
+    if rnd.random() < rate:
+        # "\\d" -> "\d": an invalid escape, kept as a literal backslash
+        text = re.sub(r"\\\\(?=[^\"\\/bfnrtu])", lambda m: "\\", text)
+    return text
+
+
+def join(members, rnd, rate, can_drop_comma):
+    out = []
+    for i, member in enumerate(members):
+        if i:
+            if rnd.random() < rate / 3 and can_drop_comma(member):
+                out.append(" ")
+            elif rnd.random() < rate / 3:
+                out.append(", /* note */ ,")
+            else:
+                out.append(",\n" if rnd.random() < 0.3 else ",")
+        out.append(member)
+    return "".join(out)
+
+
+def close(rnd, rate, members):
+    if not members or rnd.random() >= rate:
+        return ""
+    return ", // trailing\n" if rnd.random() < 0.5 else ","
+
+
+def wrap(text, rnd):
+    prefix = rnd.choice(["", "```json\n", "Sure! Here's the plan:\n", "Plan {draft 2}:\n```json\n"])
+    suffix = rnd.choice(["", "\n```", "\n```\nAnything else?", " trailing"])
+    return prefix + text + suffix
+
+
+def fuzz(plan, iterations, seed, rate):
+    rnd = random.Random(seed)
+    stats = {"cases": 0, "recovered": 0, "legacy_recovered": 0, "truncations": 0, "truncations_rejected": 0, "failures": []}
+    for n in range(iterations):
+        text = wrap(defective(plan, rnd, rate), rnd)
+        stats["cases"] += 1
+        whole = outcome(new_parse, text)
+        chunked = outcome(lambda t: chunked_parse(t, 256, rnd), text)
+        if whole == plan and chunked == plan:
+            stats["recovered"] += 1
+        elif len(stats["failures"]) < 5:
+            stats["failures"].append({"case": n, "whole_ok": whole == plan, "chunked_ok": chunked == plan, "text": text[:300]})
+        if outcome(legacy_parse_plan_text, text) == plan:
+            stats["legacy_recovered"] += 1
+
+        # Cut inside the object: must never come back as a plan
+        root_end = text.rindex("}")
+        cut = text[: rnd.randint(text.index("{") + 1, root_end)]
+        stats["truncations"] += 1
+        if outcome(new_parse, cut) is None and outcome(lambda t: chunked_parse(t, 256, rnd), cut) is None:
+            stats["truncations_rejected"] += 1
+        elif len(stats["failures"]) < 5:
+            stats["failures"].append({"case": n, "truncation_accepted": True, "text": cut[-300:]})
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--parts", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--fuzz", type=int, default=1000)
+    parser.add_argument("--fuzz-parts", type=int, default=4)
+    parser.add_argument("--defect-rate", type=float, default=0.15)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    plan = make_plan(args.parts)
+    results = {"corpus": {}}
+    for name, text, expected in corpus(plan):
+        new, legacy = outcome(new_parse, text), outcome(legacy_parse_plan_text, text)
+        chunked = outcome(chunked_parse, text)
+        if expected == "any":
+            correct = {"new": new is not None, "legacy": legacy is not None, "new_chunked": chunked is not None}
+        else:
+            correct = {"new": new == expected, "legacy": legacy == expected, "new_chunked": chunked == expected}
+        try:
+            repairs = sorted({action for action, _ in parse(text)[1]})
+        except JSONRepairError as e:
+            repairs = f"rejected: {e}"
+        results["corpus"][name] = {
+            "bytes": len(text.encode()),
+            "correct": correct,
+            "repairs": repairs,
+            "legacy_us": timed(legacy_parse_plan_text, text, args.repeat),
+            "new_us": timed(new_parse, text, args.repeat),
+            "new_chunked_us": timed(chunked_parse, text, args.repeat),
+        }
+
+    results["fuzz"] = fuzz(make_plan(args.fuzz_parts), args.fuzz, args.seed, args.defect_rate)
+    print(json.dumps(results, indent=2))
+
+    ok = all(
+        case["correct"]["new"] and case["correct"]["new_chunked"] for case in results["corpus"].values()
+    ) and not results["fuzz"]["failures"]
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
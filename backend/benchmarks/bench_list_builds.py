@@ -0,0 +1,118 @@
+"""
+Event-loop latency and GET /builds/ latency under concurrent clients.
+
+Runs the app in-process against a throwaway SQLite database, seeds one user
+with builds, then hammers GET /builds/ from N concurrent clients while a
+probe task measures how late the event loop wakes it up. Any handler that
+does blocking I/O on the loop shows up directly as probe lag.
+
+    python benchmarks/bench_list_builds.py --clients 200 --requests 2000
+
+Run it on two commits (git stash / checkout) to compare.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(samples):
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+        "mean_ms": round(statistics.mean(samples) * 1000, 2),
+    }
+
+
+async def probe_loop(stop, lags, interval=0.005):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - start - interval))
+
+
+async def run(args):
+    import httpx
+    from database import Base, engine, SessionLocal, async_engine
+    from models import Build, User
+    from auth import get_password_hash, create_access_token
+    import main
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = User(email="bench@example.com", password_hash=get_password_hash("bench"))
+    db.add(user)
+    db.commit()
+    db.add_all([
+        Build(
+            user_id=user.id, prompt=f"bench {i}", device_name=f"Device {i}", description="seeded",
+            parts_json=[{"name": "ESP32", "type": "microcontroller"}], wiring_json=[],
+            firmware_code="// fw", enclosure_md="", steps_json=[],
+        )
+        for i in range(args.builds)
+    ])
+    db.commit()
+    db.close()
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'bench@example.com'})}"}
+    transport = httpx.ASGITransport(app=main.app)
+    latencies, lags = [], []
+    remaining = args.requests
+    stop = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                response = await client.get("/builds/", headers=headers)
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+
+        probe = asyncio.create_task(probe_loop(stop, lags))
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.clients)])
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+    await async_engine.dispose()
+
+    return {
+        "clients": args.clients,
+        "requests": args.requests,
+        "builds": args.builds,
+        "throughput_rps": round(args.requests / elapsed, 1),
+        "latency": summarize(latencies),
+        "event_loop_lag": summarize(lags or [0.0]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--builds", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="prawler-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.chdir(workdir)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
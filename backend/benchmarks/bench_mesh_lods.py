@@ -0,0 +1,132 @@
+"""
+Bytes and tessellation time per level of detail for a few sample enclosures.
+
+Each part is tessellated once per LOD (CAD_LODS, or --lods) and written as
+binary STL and quantized GLB, exactly as the CAD workers do. Sizes are also
+reported gzipped, which is what a browser actually downloads. The GLB is
+read back to measure the position error introduced by quantization.
+
+    python benchmarks/bench_mesh_lods.py
+    python benchmarks/bench_mesh_lods.py --lods "preview:0.5:0.8,medium:0.05:0.3,fine:0.001:0.1"
+"""
+import argparse
+import gzip
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Typical enclosure bodies the model generates: rounded shells with cut-outs and bosses
+ENCLOSURES = {
+    "rounded_box": """
+with BuildPart() as b:
+    Box(80, 50, 30)
+    fillet(b.edges(), 4)
+    offset(amount=-2, openings=b.faces().sort_by(Axis.Z)[-1])
+    with Locations((0, 0, -15)):
+        with GridLocations(60, 30, 2, 2):
+            Cylinder(3, 8, mode=Mode.ADD)
+            Hole(1.5)
+    with Locations((40, 0, 0)):
+        Box(6, 12, 8, mode=Mode.SUBTRACT)  # USB port
+body = b.part
+""",
+    "cylinder_sensor": """
+with BuildPart() as b:
+    Cylinder(30, 40)
+    fillet(b.edges(), 3)
+    offset(amount=-2, openings=b.faces().sort_by(Axis.Z)[-1])
+    with PolarLocations(22, 8):
+        Hole(2)
+body = b.part
+""",
+    "vented_lid": """
+with BuildPart() as b:
+    Box(80, 50, 3)
+    fillet(b.edges().filter_by(Axis.Z), 4)
+    with GridLocations(6, 6, 8, 5):
+        Hole(2)
+body = b.part
+""",
+}
+
+
+def read_glb_positions(path):
+    """Dequantized POSITION data of a GLB written by mesh_export.write_quantized_glb."""
+    import numpy as np
+
+    with open(path, "rb") as f:
+        data = f.read()
+    json_length, = struct.unpack_from("<I", data, 12)
+    document = json.loads(data[20:20 + json_length])
+    binary = data[20 + json_length + 8:]
+    view = document["bufferViews"][document["accessors"][0]["bufferView"]]
+    count = document["accessors"][0]["count"]
+    raw = np.frombuffer(binary, dtype="<u2", count=count * 4, offset=view["byteOffset"]).reshape(-1, 4)[:, :3]
+    node = document["nodes"][0]
+    return raw * np.array(node["scale"]) + np.array(node["translation"])
+
+
+def main():
+    from cad_pool import CAD_LODS, parse_lods
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lods", default=CAD_LODS)
+    args = parser.parse_args()
+    lods = sorted(parse_lods(args.lods), key=lambda lod: -lod[1])
+
+    workdir = tempfile.mkdtemp(prefix="prawler-bench-")
+    os.chdir(workdir)  # cad_engine writes to ./static/stls
+    import build123d
+    import numpy as np
+    import cad_engine
+    from mesh_export import write_binary_stl, write_quantized_glb
+
+    results = {"lods": [list(lod) for lod in lods], "enclosures": {}}
+    for name, script in ENCLOSURES.items():
+        scope = {}
+        exec(script, dict(build123d.__dict__), scope)
+        part = scope["body"]
+        rows = {}
+        for lod, tolerance, angular_tolerance in lods:
+            started = time.perf_counter()
+            vertices, triangles = cad_engine.tessellate(part, tolerance, angular_tolerance)
+            tessellate_ms = (time.perf_counter() - started) * 1000
+
+            stl_path = os.path.join(workdir, f"{name}.{lod}.stl")
+            glb_path = os.path.join(workdir, f"{name}.{lod}.glb")
+            started = time.perf_counter()
+            stl_bytes = write_binary_stl(stl_path, vertices, triangles)
+            glb_bytes = write_quantized_glb(glb_path, vertices, triangles)
+            write_ms = (time.perf_counter() - started) * 1000
+
+            with open(stl_path, "rb") as f:
+                stl_gzip = len(gzip.compress(f.read(), 6))
+            with open(glb_path, "rb") as f:
+                glb_gzip = len(gzip.compress(f.read(), 6))
+            error = float(np.abs(read_glb_positions(glb_path) - vertices).max())
+            rows[lod] = {
+                "triangles": len(triangles),
+                "tessellate_ms": round(tessellate_ms, 1),
+                "write_ms": round(write_ms, 1),
+                "stl_bytes": stl_bytes,
+                "stl_gzip_bytes": stl_gzip,
+                "glb_bytes": glb_bytes,
+                "glb_gzip_bytes": glb_gzip,
+                "glb_max_position_error_mm": round(error, 5),
+            }
+        finest = rows[lods[-1][0]]["stl_bytes"]
+        for row in rows.values():
+            row["glb_vs_finest_stl"] = round(finest / row["glb_bytes"], 1)
+        results["enclosures"][name] = rows
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
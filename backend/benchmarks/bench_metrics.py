@@ -0,0 +1,94 @@
+"""
+Cost of the instrumentation layer: a span() around an empty block, a
+histogram observation, rendering /metrics, and GET / through the ASGI app
+with MetricsMiddleware enabled vs disabled (one worker, no sockets).
+
+    python benchmarks/bench_metrics.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def per_call_ns(fn, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return round((time.perf_counter() - started) / rounds * 1e9)
+
+
+async def requests_per_second(app, seconds):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/", "raw_path": b"/", "query_string": b"", "root_path": "", "headers": [],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    count = 0
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        await app(dict(scope), receive, send)
+        count += 1
+    return round(count / (time.perf_counter() - started))
+
+
+def run(args):
+    import main
+    import metrics
+
+    def empty_span():
+        with metrics.span("bench"):
+            pass
+
+    child = metrics.STAGE_SECONDS.labels("bench")
+    results = {
+        "span_ns": per_call_ns(empty_span, args.rounds),
+        "observe_ns": per_call_ns(lambda: child.observe(0.003), args.rounds),
+        "labels_observe_ns": per_call_ns(lambda: metrics.STAGE_SECONDS.labels("bench").observe(0.003), args.rounds),
+    }
+
+    # A realistic number of series: every stage, a few dozen routes x statuses
+    for i in range(40):
+        metrics.REQUEST_SECONDS.labels("GET", f"/route/{i}", 200).observe(0.01)
+    started = time.perf_counter()
+    body = metrics.render()
+    results["render_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    results["render_bytes"] = len(body)
+
+    metrics.METRICS_ENABLED = False
+    results["root_rps_without_metrics"] = asyncio.run(requests_per_second(main.app, args.seconds))
+    metrics.METRICS_ENABLED = True
+    results["root_rps_with_metrics"] = asyncio.run(requests_per_second(main.app, args.seconds))
+    results["middleware_us_per_request"] = round(
+        (1 / results["root_rps_with_metrics"] - 1 / results["root_rps_without_metrics"]) * 1e6, 1
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=200000)
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="prawler-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.chdir(workdir)
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Tail latency of plan generation with and without hedged requests, using
+in-process fake backends (no API key or network needed).
+
+Backend latency is lognormal, shaped like the production Gemini numbers
+(median ~8 s, p99 ~40 s) and scaled down by --time-scale so a run takes
+seconds. Replies go through the real parse_plan_text repair pipeline.
+
+    python benchmarks/bench_model_router.py
+    python benchmarks/bench_model_router.py --requests 1000 --percentile 0.95
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+PLAN = json.dumps({"device_name": "Bench Device", "parts": [{"name": "ESP32", "type": "microcontroller"}]})
+# What a model sometimes returns: prose around a truncated object
+GARBAGE = 'Sure! Here is your plan: {"device_name": "Bench Device", "parts": [{"name": "ESP32"'
+
+
+def lognormal(median, p99):
+    sigma = math.log(p99 / median) / 2.326
+    return lambda: random.lognormvariate(math.log(median), sigma)
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+async def run(router, requests, concurrency, time_scale):
+    from ai_engine import parse_plan_text
+
+    latencies = []
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await router.generate("prompt", parse_plan_text)
+            except Exception:
+                failures += 1
+                return
+            latencies.append((time.perf_counter() - started) / time_scale)
+
+    await asyncio.gather(*[one() for _ in range(requests)])
+    calls = sum(backend.calls for backend in router.backends)
+    return {
+        "p50_s": round(percentile(latencies, 0.5), 2),
+        "p95_s": round(percentile(latencies, 0.95), 2),
+        "p99_s": round(percentile(latencies, 0.99), 2),
+        "max_s": round(max(latencies), 2),
+        "failures": failures,
+        "upstream_calls_per_request": round(calls / requests, 3),
+        "hedges": router.hedges,
+        "hedge_wins": router.hedge_wins,
+        "fallbacks": router.fallbacks,
+    }
+
+
+async def main():
+    from model_router import FakeBackend, ModelRouter
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--percentile", type=float, default=0.9)
+    parser.add_argument("--time-scale", type=float, default=0.01, help="1.0 = real seconds")
+    parser.add_argument("--garbage-rate", type=float, default=0.1, help="share of primary replies that fail to parse")
+    args = parser.parse_args()
+
+    scale = args.time_scale
+    slow = lognormal(8 * scale, 40 * scale)
+    fast = lognormal(5 * scale, 15 * scale)
+
+    def hedged(backends):
+        return ModelRouter(backends, hedge_percentile=args.percentile, hedge_min_samples=20, hedge_default_seconds=20 * scale)
+
+    def flaky(_prompt):
+        return GARBAGE if random.random() < args.garbage_rate else PLAN
+
+    scenarios = {
+        "single_model_no_hedge": ModelRouter([FakeBackend("primary", PLAN, slow)], hedge_enabled=False),
+        "single_model_hedged": hedged([FakeBackend("primary", PLAN, slow)]),
+        "two_models_hedged": hedged([FakeBackend("primary", PLAN, slow), FakeBackend("secondary", PLAN, fast)]),
+        "unparseable_no_fallback": ModelRouter([FakeBackend("primary", flaky, slow)], hedge_enabled=False),
+        "unparseable_with_fallback": ModelRouter(
+            [FakeBackend("primary", flaky, slow), FakeBackend("secondary", PLAN, fast)], hedge_enabled=False
+        ),
+    }
+    results = {}
+    # parse_plan_text prints the raw text of every reply it can't repair
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            for name, router in scenarios.items():
+                results[name] = await run(router, args.requests, args.concurrency, scale)
+        finally:
+            sys.stdout = stdout
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
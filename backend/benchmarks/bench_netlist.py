@@ -0,0 +1,127 @@
+"""
+Wiring post-processing at 10 / 100 / 1,000 parts: the previous
+fallback-wiring + normalize_wire code vs netlist.py, plus the cost of
+building a Netlist and answering its queries.
+
+    python benchmarks/bench_netlist.py
+    python benchmarks/bench_netlist.py --sizes 10 100 1000 5000 --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from netlist import Netlist, generate_fallback_wiring, normalize_wire  # noqa: E402
+
+TYPES = ["sensor", "motor", "display", "led", "button", "module", "frame", "wheel"]
+
+
+def legacy_fallback_wiring(parts):
+    """ai_engine.generate_fallback_wiring before netlist.py."""
+    wiring = []
+    battery = next((p for p in parts if p.get("type") == "battery"), None)
+    controller = next((p for p in parts if p.get("type") in ["microcontroller", "camera"]), None)
+    if battery and controller:
+        wiring.append({"from": f"{controller['name']} (5V/VCC)", "to": f"{battery['name']} (VCC)", "label": "Power", "wire_color": "Red"})
+        wiring.append({"from": f"{controller['name']} (GND)", "to": f"{battery['name']} (GND)", "label": "GND", "wire_color": "Black"})
+        for p in parts:
+            if p == battery or p == controller: continue
+            if p.get("type") in ["frame", "enclosure", "wheel", "propeller"]: continue
+            wiring.append({"from": f"{p['name']} (VCC)", "to": f"{controller['name']} (3V3/5V)", "label": "Power", "wire_color": "Red"})
+            wiring.append({"from": f"{p['name']} (GND)", "to": f"{controller['name']} (GND)", "label": "GND", "wire_color": "Black"})
+            wiring.append({"from": f"{p['name']} (Data)", "to": f"{controller['name']} (GPIO)", "label": "Signal", "wire_color": "Yellow"})
+    elif controller:
+        for p in parts:
+            if p == controller: continue
+            if p.get("type") in ["frame", "enclosure", "wheel", "propeller"]: continue
+            wiring.append({"from": f"{p['name']} (VCC)", "to": f"{controller['name']} (3V3)", "label": "Power", "wire_color": "Red"})
+            wiring.append({"from": f"{p['name']} (GND)", "to": f"{controller['name']} (GND)", "label": "GND", "wire_color": "Black"})
+    return wiring
+
+
+def legacy_normalize_wire(wire):
+    """ai_engine.normalize_wire before netlist.py."""
+    new_wire = wire.copy()
+    if "from" in wire and "(" in wire["from"]:
+        parts = wire["from"].rsplit(" (", 1)
+        new_wire["from_part"] = parts[0].strip()
+        new_wire["from_pin"] = parts[1].replace(")", "").strip()
+    elif "from_part" not in wire:
+        new_wire["from_part"] = wire.get("from", "Unknown")
+        new_wire["from_pin"] = "Pin"
+    if "to" in wire and "(" in wire["to"]:
+        parts = wire["to"].rsplit(" (", 1)
+        new_wire["to_part"] = parts[0].strip()
+        new_wire["to_pin"] = parts[1].replace(")", "").strip()
+    elif "to_part" not in wire:
+        new_wire["to_part"] = wire.get("to", "Unknown")
+        new_wire["to_pin"] = "Pin"
+    return new_wire
+
+
+def make_parts(count):
+    # Rich part dicts (what the model returns) make the old deep `p == battery` comparisons realistic
+    parts = []
+    for i in range(count):
+        kind = "microcontroller" if i % 20 == 0 else TYPES[i % len(TYPES)]
+        parts.append({
+            "name": f"{kind.title()} {i}",
+            "type": kind,
+            "quantity": 1,
+            "specs": "3.3V logic, 5V tolerant inputs",
+            "note": "Mount on the upper deck",
+            "placement": {"x": i, "y": 0, "z": 0},
+            "image_search_term": f"{kind} module",
+        })
+    # The battery last: the old code scans the whole list for it
+    parts.append({"name": "LiPo 3S", "type": "battery", "quantity": 1, "specs": "11.1V 2200mAh"})
+    return parts
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e3)
+    return round(statistics.median(samples), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        parts = make_parts(size)
+        legacy_wires = [legacy_normalize_wire(w) for w in legacy_fallback_wiring(parts)]
+        wires = [normalize_wire(w) for w in generate_fallback_wiring(parts)]
+        assert wires == legacy_wires, "netlist fallback wiring differs from the old output"
+
+        # A model-written diagram with a reference to a part that isn't in the list
+        modelled = wires + [{"from": "Ghost Relay (IN)", "to": f"{parts[0]['name']} (GPIO4)"}]
+        netlist = Netlist(parts, modelled)
+        results[str(size)] = {
+            "wires": len(wires),
+            "legacy_postprocess_ms": timed(lambda: [legacy_normalize_wire(w) for w in legacy_fallback_wiring(parts)], args.repeat),
+            "postprocess_ms": timed(lambda: [normalize_wire(w) for w in generate_fallback_wiring(parts)], args.repeat),
+            "netlist_build_ms": timed(lambda: Netlist(parts, modelled), args.repeat),
+            "ground_pins_ms": timed(netlist.ground_pins, args.repeat),
+            "unpowered_parts_ms": timed(netlist.unpowered_parts, args.repeat),
+            "netlist": netlist.stats(),
+            "ground_pins": len(netlist.ground_pins()),
+            "unpowered_parts": len(netlist.unpowered_parts()),
+            "dangling": netlist.dangling[:3],
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
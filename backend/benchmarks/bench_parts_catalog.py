@@ -0,0 +1,146 @@
+"""
+Part queries over stored builds: scanning every Build.parts_json in Python
+(the only option before the catalog) vs the indexed parts / build_parts
+tables, plus backfill throughput, against a throwaway SQLite database.
+
+    python benchmarks/bench_parts_catalog.py
+    python benchmarks/bench_parts_catalog.py --builds 50000 --parts 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MCUS = ["ESP32 Dev Kit C", "Arduino Nano", "Arduino Uno", "STM32F103 Blue Pill", "Raspberry Pi Pico", "ESP8266 NodeMCU"]
+OTHERS = [
+    ("L298N Motor Driver", "module"), ("DHT22 Sensor", "sensor"), ("SG90 Servo", "motor"), ("0.96 inch OLED", "display"),
+    ("WS2812B LED Strip", "led"), ("3S 2200mAh LiPo Battery", "battery"), ("5V Relay Module", "module"),
+    ("HC-SR04 Ultrasonic Sensor", "sensor"), ("Project Box", "enclosure"), ("Jumper Wires", "other"),
+]
+
+
+def make_parts(rnd, count):
+    parts = [{"name": rnd.choice(MCUS), "type": "microcontroller", "quantity": 1}]
+    for _ in range(count - 1):
+        name, kind = rnd.choice(OTHERS)
+        # Long tail of one-off parts next to the common ones
+        if rnd.random() < 0.3:
+            name = f"{name} rev {rnd.randint(1, 500)}"
+        parts.append({"name": name, "type": kind, "quantity": rnd.randint(1, 4), "specs": "5V"})
+    return parts
+
+
+def seed(args):
+    from database import Base, engine, SessionLocal
+    from models import Build, User
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = User(email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    rnd = random.Random(args.seed)
+    now = datetime.utcnow()
+    for start in range(0, args.builds, 500):
+        db.add_all([
+            Build(user_id=user.id, prompt=f"bench {i}", device_name=f"Device {i}", description="",
+                  parts_json=make_parts(rnd, args.parts), wiring_json=[], steps_json=[],
+                  created_at=now - timedelta(minutes=rnd.randint(0, 60 * 24 * 90)))
+            for i in range(start, min(args.builds, start + 500))
+        ])
+        db.commit()
+    db.close()
+
+
+async def scan_queries(since):
+    """Both questions answered by loading every build, as before the catalog."""
+    from sqlalchemy import select
+    from database import AsyncSessionLocal
+    from models import Build
+
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(Build.id, Build.parts_json, Build.created_at))).all()
+    mcus = Counter()
+    using = []
+    for build_id, parts, created_at in rows:
+        names = {p.get("name", "").lower() for p in parts}
+        if any("l298n" in name for name in names):
+            using.append(build_id)
+        if created_at >= since:
+            mcus.update({p["name"] for p in parts if p.get("type") == "microcontroller"})
+    return mcus.most_common(5), len(using)
+
+
+async def catalog_queries(since):
+    from sqlalchemy import func, select
+    from database import AsyncSessionLocal
+    from models import Build
+    from parts_catalog import builds_using, parts_matching, popular_parts
+
+    async with AsyncSessionLocal() as db:
+        top = await popular_parts(db, kind="microcontroller", since=since, limit=5)
+        using = await db.scalar(
+            select(func.count()).select_from(Build).where(Build.id.in_(builds_using(parts_matching("l298n"))))
+        )
+    return [(part["name"], part["builds"]) for part in top], using
+
+
+async def timed(fn, *args, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await fn(*args)
+        samples.append(time.perf_counter() - started)
+    return result, round(min(samples) * 1000, 2)
+
+
+async def run(args):
+    from crud import backfill_build_parts
+    from database import async_engine
+
+    seed(args)
+    results = {"builds": args.builds, "parts_per_build": args.parts}
+
+    started = time.perf_counter()
+    results["backfill"] = await backfill_build_parts(batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+    results["backfill"]["builds_per_second"] = round(args.builds / elapsed)
+
+    since = datetime.utcnow() - timedelta(days=7)
+    (scan_top, scan_using), scan_ms = await timed(scan_queries, since)
+    (top, using), catalog_ms = await timed(catalog_queries, since)
+    results["queries"] = {
+        "scan_ms": scan_ms,
+        "catalog_ms": catalog_ms,
+        "same_answer": scan_top == top and scan_using == using,
+        "top_microcontrollers_7d": top,
+        "builds_using_l298n": using,
+    }
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--builds", type=int, default=10000)
+    parser.add_argument("--parts", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="prawler-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.chdir(workdir)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Exercises the upstream limiter against a local stub of the Gemini API that
+enforces a requests-per-minute quota (429 when exceeded) and can simulate an
+outage (503). No network or API key needed.
+
+Scenarios:
+  burst_unprotected  every request fired at once, straight at the stub
+  burst_limited      the same burst through UpstreamLimiter with matching RPM
+  burst_over_quota   the limiter configured above the quota: 429s retried within the budget
+  outage             the stub fails for a while; the breaker opens, then recovers
+
+    python benchmarks/bench_upstream_limiter.py
+    python benchmarks/bench_upstream_limiter.py --requests 200 --quota-rpm 1200 --concurrency 16
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+class StubError(Exception):
+    """Shaped like google.api_core exceptions: the HTTP status is in `.code`."""
+
+    def __init__(self, code: int):
+        super().__init__(f"{code} from stub upstream")
+        self.code = code
+
+
+class QuotaStub:
+    def __init__(self, quota_rpm: float, latency_seconds: float):
+        # The quota is enforced over one-second windows
+        self.per_second = quota_rpm / 60.0
+        self.latency_seconds = latency_seconds
+        self.down_until = 0.0
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rejected = 0
+
+    def generate_content(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            if now < self.down_until:
+                self.rejected += 1
+                raise StubError(503)
+            while self._recent and self._recent[0] < now - 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= max(1, int(self.per_second)):
+                self.rejected += 1
+                raise StubError(429)
+            self._recent.append(now)
+        time.sleep(self.latency_seconds)
+        return '{"device_name": "stub"}'
+
+
+def make_limiter(args, rpm):
+    from upstream import UpstreamLimiter
+
+    return UpstreamLimiter(
+        max_concurrency=args.concurrency,
+        rpm=rpm,
+        tpm=0,
+        queue_timeout_seconds=60,
+        max_retries=4,
+        retry_base_seconds=0.2,
+        retry_max_seconds=2,
+        retry_budget_ratio=0.2,
+        breaker_failures=5,
+        breaker_reset_seconds=1,
+    )
+
+
+async def burst_unprotected(args):
+    from starlette.concurrency import run_in_threadpool
+
+    stub = QuotaStub(args.quota_rpm, args.latency)
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *[run_in_threadpool(stub.generate_content, "x") for _ in range(args.requests)],
+        return_exceptions=True,
+    )
+    return {
+        "ok": sum(1 for r in results if not isinstance(r, Exception)),
+        "errors": sum(1 for r in results if isinstance(r, Exception)),
+        "upstream_429s": stub.rejected,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+async def burst_limited(args):
+    from upstream import UpstreamUnavailable
+
+    stub = QuotaStub(args.quota_rpm, args.latency)
+    # A little under the quota, starting from an empty bucket (a full one allows a minute's worth at once)
+    limiter = make_limiter(args, rpm=args.quota_rpm * 0.9)
+    limiter.rpm.tokens = 1
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *[limiter.call(stub.generate_content, "x") for _ in range(args.requests)],
+        return_exceptions=True,
+    )
+    return {
+        "ok": sum(1 for r in results if not isinstance(r, Exception)),
+        "errors": sum(1 for r in results if isinstance(r, UpstreamUnavailable)),
+        "upstream_429s": stub.rejected,
+        "seconds": round(time.perf_counter() - started, 2),
+        "limiter": limiter.stats(),
+    }
+
+
+async def burst_over_quota(args):
+    from upstream import UpstreamUnavailable
+
+    stub = QuotaStub(args.quota_rpm, args.latency)
+    limiter = make_limiter(args, rpm=args.quota_rpm * 3)
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *[limiter.call(stub.generate_content, "x") for _ in range(args.requests)],
+        return_exceptions=True,
+    )
+    return {
+        "ok": sum(1 for r in results if not isinstance(r, Exception)),
+        "errors": sum(1 for r in results if isinstance(r, UpstreamUnavailable)),
+        "upstream_429s": stub.rejected,
+        "seconds": round(time.perf_counter() - started, 2),
+        "limiter": limiter.stats(),
+    }
+
+
+async def outage(args):
+    from upstream import UpstreamUnavailable
+
+    stub = QuotaStub(quota_rpm=60000, latency_seconds=args.latency)
+    limiter = make_limiter(args, rpm=0)
+    stub.down_until = time.monotonic() + args.outage_seconds
+    timeline = []
+    started = time.perf_counter()
+    while time.perf_counter() - started < args.outage_seconds + 2:
+        t0 = time.perf_counter()
+        try:
+            await limiter.call(stub.generate_content, "x")
+            outcome = "ok"
+        except UpstreamUnavailable as e:
+            outcome = f"unavailable({e})"
+        timeline.append({
+            "t": round(t0 - started, 2),
+            "outcome": outcome,
+            "ms": round((time.perf_counter() - t0) * 1000, 1),
+            "breaker": limiter.breaker.state,
+        })
+        await asyncio.sleep(0.1)
+    fast_fails = [e for e in timeline if e["outcome"] != "ok" and e["ms"] < 5]
+    return {
+        "outage_seconds": args.outage_seconds,
+        "calls": len(timeline),
+        "upstream_calls": stub.calls,
+        "fast_failed_while_open": len(fast_fails),
+        "recovered_at_s": next((e["t"] for e in timeline if e["outcome"] == "ok"), None),
+        "limiter": limiter.stats(),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--quota-rpm", type=float, default=1200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--outage-seconds", type=float, default=3)
+    args = parser.parse_args()
+
+    # The limiter logs retries with print(); keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        results = {
+            "burst_unprotected": await burst_unprotected(args),
+            "burst_limited": await burst_limited(args),
+            "burst_over_quota": await burst_over_quota(args),
+            "outage": await outage(args),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""
+validate_build: the old substring scans vs the compiled rule engine, and a
+batch revalidation of every stored build (crud.revalidate_builds) with
+per-rule timing, against a throwaway SQLite database.
+
+    python benchmarks/bench_validation.py
+    python benchmarks/bench_validation.py --builds 20000 --parts 40
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NAMES = [
+    ("ESP32 Dev Kit C", "microcontroller", "3.3V logic, 240mA peak"),
+    ("Arduino Nano", "microcontroller", "5V, 19mA"),
+    ("STM32F103 Blue Pill", "microcontroller", "3v3"),
+    ("DHT22 Sensor", "sensor", "3.3V-5V, 1.5mA"),
+    ("SG90 Servo", "motor", "4.8V-6V, stall 650mA"),
+    ("12V DC Fan", "motor", "12V, 0.2A"),
+    ("0.96 inch OLED", "display", "I2C, 20mA"),
+    ("WS2812B LED Strip (60)", "led", "5V, 60mA per LED, 3.6A max"),
+    ("L298N Motor Driver", "module", "2A per channel, 5V logic"),
+    ("5V Relay Module", "module", "10A 250VAC"),
+    ("3S 2200mAh LiPo Battery", "battery", "11.1V, 30C"),
+    ("USB-C PD Trigger", "module", "15V 3A"),
+    ("5V 2A Power Supply Adapter", "other", "Barrel jack"),
+    ("18650 Cell Holder", "battery", "Single cell"),
+    ("Project Box", "enclosure", "ABS, 150x80x50mm"),
+]
+
+# The old heuristics misfire on these (substring matches); the new ones shouldn't
+FALSE_POSITIVES = {
+    "15v_is_not_5v": [{"name": "ESP32", "specs": "3.3V logic"}, {"name": "LiPo pack", "specs": "15V"}],
+    "13.3v_is_not_3.3v": [{"name": "Arduino Uno", "specs": "5V"}, {"name": "Lead acid battery", "specs": "13.3V float"}],
+    "plugin_is_not_plug": [{"name": "Arduino Uno", "specs": "plugin shield"}],
+    "picoammeter_is_not_pico": [{"name": "Picoammeter front end", "specs": "USB powered"}],
+}
+
+
+def legacy_validate_build(parts):
+    """validation_engine.validate_build before the rule engine."""
+    warnings = []
+    parts_text = " ".join([p.get("name", "").lower() + " " + p.get("specs", "").lower() for p in parts])
+    if not any(x in parts_text for x in ["battery", "usb", "power supply", "adapter", "plug"]):
+        warnings.append("No obvious power source detected (battery, USB, adapter).")
+    if "3.3v" in parts_text and "5v" in parts_text:
+        warnings.append("Mixed voltages (3.3V and 5V) detected. Ensure logic level shifting or regulation is used.")
+    if not any(x in parts_text for x in ["arduino", "esp32", "esp8266", "stm32", "raspberry", "pico", "attiny"]):
+        warnings.append("No common microcontroller detected. Ensure this is intended.")
+    return warnings
+
+
+def make_parts(rnd, count):
+    parts = []
+    for i in range(count):
+        name, kind, specs = rnd.choice(NAMES)
+        parts.append({"name": f"{name} #{i}", "type": kind, "quantity": rnd.randint(1, 4), "specs": specs,
+                      "note": "Mounted on the main plate", "image_search_term": name})
+    return parts
+
+
+def seed(args):
+    from database import Base, engine, SessionLocal
+    from models import Build, User
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = User(email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    rnd = random.Random(args.seed)
+    for start in range(0, args.builds, 500):
+        db.add_all([
+            Build(user_id=user.id, prompt=f"bench {i}", device_name=f"Device {i}", description="",
+                  parts_json=make_parts(rnd, args.parts), wiring_json=[], steps_json=[])
+            for i in range(start, min(args.builds, start + 500))
+        ])
+        db.commit()
+    db.close()
+
+
+async def run(args):
+    from crud import revalidate_builds
+    from database import async_engine
+    from validation_engine import BatchReport, _part_facts, scan_text, validate_build
+
+    rnd = random.Random(args.seed)
+    samples = [make_parts(rnd, args.parts) for _ in range(500)]
+    results = {"parts_per_build": args.parts}
+
+    def cold(parts):
+        # Every part scanned from scratch, as for a build of never-seen parts
+        scan_text.cache_clear()
+        _part_facts.cache_clear()
+        return validate_build(parts)
+
+    for name, fn in (("legacy", legacy_validate_build), ("rules_cold", cold), ("rules", validate_build)):
+        started = time.perf_counter()
+        for parts in samples:
+            fn(parts)
+        results[f"{name}_us_per_build"] = round((time.perf_counter() - started) / len(samples) * 1e6, 1)
+
+    results["false_positives"] = {
+        name: {"legacy": legacy_validate_build(parts), "rules": validate_build(parts)}
+        for name, parts in FALSE_POSITIVES.items()
+    }
+
+    seed(args)
+    report = BatchReport(keep_warnings=False)
+    started = time.perf_counter()
+    await revalidate_builds(batch_size=args.batch_size, report=report)
+    elapsed = time.perf_counter() - started
+    results["revalidate"] = dict(report.to_dict(), seconds=round(elapsed, 3),
+                                 builds_per_second=round(report.builds / elapsed))
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--builds", type=int, default=5000)
+    parser.add_argument("--parts", type=int, default=25)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="prawler-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.chdir(workdir)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+A local stand-in for the Gemini REST API (generateContent and
+streamGenerateContent), so /builds/generate can be load-tested without a
+key. Point the API at it with:
+
+    GEMINI_API_KEY=fake GEMINI_API_ENDPOINT=http://127.0.0.1:8765 uvicorn main:app
+
+Replies are recorded plan texts replayed round-robin (--replies, a JSONL
+file of {"text": ...} lines or bare plan objects), or synthetic plans of
+realistic size. Latency, streaming, malformed JSON and quota errors are
+configurable:
+
+    python benchmarks/fake_gemini.py --latency lognormal:1.5:0.4
+    python benchmarks/fake_gemini.py --latency uniform:0.2:2 --chunk-chars 120 --chunk-delay 0.03
+    python benchmarks/fake_gemini.py --malformed-rate 0.1 --rate-429 0.05
+
+--latency is the time to the first byte (fixed:SECONDS, uniform:MIN:MAX or
+lognormal:MEDIAN:SIGMA). Streams then send --chunk-chars characters every
+--chunk-delay seconds. GET /stats returns what was served.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+from collections import Counter
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+MCUS = ["ESP32 Dev Kit C", "Arduino Nano", "Raspberry Pi Pico", "STM32F103 Blue Pill", "ESP8266 NodeMCU"]
+MODULES = [
+    ("DHT22 Sensor", "sensor", "3.3-5V"), ("BME280 Sensor", "sensor", "3.3V I2C"), ("SG90 Servo", "motor", "5V"),
+    ("L298N Motor Driver", "module", "5-35V"), ("0.96 inch OLED", "display", "3.3V I2C"),
+    ("WS2812B LED Strip", "led", "5V 60mA/LED"), ("HC-SR04 Ultrasonic Sensor", "sensor", "5V"),
+    ("3S LiPo Battery", "battery", "11.1V 2200mAh"), ("LM2596 Buck Converter", "power", "out 5V 3A"),
+    ("5V Relay Module", "module", "5V coil"), ("Piezo Buzzer", "other", "3-5V"), ("Rotary Encoder", "input", "5V"),
+]
+DEVICES = ["weather station", "plant waterer", "robot car", "pet feeder", "air quality monitor", "led clock"]
+MALFORMATIONS = ("fenced", "prose", "trailing_comma", "python_literal", "truncated")
+
+
+def synthetic_plan(rnd: random.Random) -> dict:
+    """A plan shaped like real model output: 6-20 parts, wiring (sometimes left out), firmware and steps."""
+    mcu = rnd.choice(MCUS)
+    modules = [rnd.choice(MODULES) for _ in range(rnd.randint(5, 19))]
+    parts = [{"name": mcu, "type": "microcontroller", "quantity": 1, "specs": "3.3V logic"}]
+    parts += [{"name": name, "type": kind, "quantity": rnd.randint(1, 3), "specs": specs} for name, kind, specs in modules]
+    wiring = [
+        {"from": f"{mcu}.GPIO{4 + i}", "to": f"{part['name']}.SIG", "color": rnd.choice(["red", "black", "yellow"])}
+        for i, part in enumerate(parts[1:])
+    ]
+    device = rnd.choice(DEVICES)
+    return {
+        "device_name": f"Smart {device.title()}",
+        "description": f"A {device} built around the {mcu}. " * 3,
+        "parts": parts,
+        # ~1 in 5 replies leave wiring out, so the fallback generator runs as it does in production
+        "wiring_diagram": [] if rnd.random() < 0.2 else wiring,
+        "firmware": "#include <Arduino.h>\n" + "void loop() { /* read sensors, update outputs */ }\n" * 60,
+        "enclosure": "Snap-fit box with vents.",
+        "analysis": "Power budget and pin usage checked. " * 20,
+        "steps": [{"step": i + 1, "title": f"Step {i + 1}", "description": "Wire and test the next module."}
+                  for i in range(rnd.randint(5, 12))],
+    }
+
+
+def load_replies(path: str) -> list:
+    replies = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                replies.append(entry["text"] if isinstance(entry, dict) and "text" in entry else json.dumps(entry))
+    return replies
+
+
+def malform(text: str, kind: str) -> str:
+    if kind == "fenced":
+        return f"```json\n{text}\n```"
+    if kind == "prose":
+        return "Sure! Here is the build plan you asked for:\n\n" + text
+    if kind == "trailing_comma":
+        return text.replace("]", ",]", 1).replace("}", ",}", 1)
+    if kind == "python_literal":
+        return text.replace('"quantity": 1,', '"quantity": 1, "optional": False,', 1)
+    # truncated: the parser is expected to reject this, not repair it
+    return text[: len(text) * 2 // 3]
+
+
+def parse_latency(spec: str):
+    kind, *args = spec.split(":")
+    values = [float(a) for a in args]
+    if kind == "fixed":
+        return lambda rnd: values[0]
+    if kind == "uniform":
+        return lambda rnd: rnd.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rnd: rnd.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"Unknown latency distribution {spec!r}")
+
+
+def candidate(text: str, finish: bool = True) -> dict:
+    body = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finish:
+        body["finishReason"] = "STOP"
+    return body
+
+
+def create_app(args) -> Starlette:
+    rnd = random.Random(args.seed)
+    latency = parse_latency(args.latency)
+    replies = load_replies(args.replies) if args.replies else [json.dumps(synthetic_plan(rnd)) for _ in range(50)]
+    stats = Counter()
+    turn = {"next": 0}
+
+    def next_reply() -> str:
+        text = replies[turn["next"] % len(replies)]
+        turn["next"] += 1
+        if rnd.random() < args.malformed_rate:
+            kind = rnd.choice(MALFORMATIONS)
+            stats[f"malformed_{kind}"] += 1
+            text = malform(text, kind)
+        return text
+
+    def usage(prompt_chars: int, text: str) -> dict:
+        prompt_tokens, output_tokens = prompt_chars // 4, len(text) // 4
+        return {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens}
+
+    async def begin(request: Request):
+        """Common prologue: quota errors, then the time-to-first-byte delay. Returns (prompt chars, error response)."""
+        body = await request.json()
+        prompt_chars = sum(len(part.get("text", "")) for content in body.get("contents", []) for part in content.get("parts", []))
+        if rnd.random() < args.rate_429:
+            stats["rate_limited"] += 1
+            return prompt_chars, JSONResponse(
+                {"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).", "status": "RESOURCE_EXHAUSTED"}},
+                status_code=429,
+                headers={"Retry-After": "1"},
+            )
+        await asyncio.sleep(latency(rnd))
+        return prompt_chars, None
+
+    async def generate(request: Request):
+        stats["requests"] += 1
+        prompt_chars, error = await begin(request)
+        if error is not None:
+            return error
+        text = next_reply()
+        return JSONResponse({"candidates": [candidate(text)], "usageMetadata": usage(prompt_chars, text)})
+
+    async def stream(request: Request):
+        stats["streams"] += 1
+        prompt_chars, error = await begin(request)
+        if error is not None:
+            return error
+        text = next_reply()
+        size = max(1, args.chunk_chars)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+        async def body():
+            # The REST transport streams a JSON array, one GenerateContentResponse per element
+            yield "["
+            for i, piece in enumerate(pieces):
+                last = i == len(pieces) - 1
+                chunk = {"candidates": [candidate(piece, finish=last)]}
+                if last:
+                    chunk["usageMetadata"] = usage(prompt_chars, text)
+                yield ("" if i == 0 else ",\r\n") + json.dumps(chunk)
+                if not last:
+                    await asyncio.sleep(args.chunk_delay)
+            yield "]"
+
+        return StreamingResponse(body(), media_type="application/json")
+
+    async def model_call(request: Request):
+        # The path is /v1beta/models/{model}:{method}
+        method = request.path_params["call"].rpartition(":")[2]
+        if method == "generateContent":
+            return await generate(request)
+        if method == "streamGenerateContent":
+            return await stream(request)
+        return JSONResponse({"error": {"code": 404, "message": f"Unknown method {method}", "status": "NOT_FOUND"}}, 404)
+
+    async def read_stats(request: Request):
+        return JSONResponse(dict(stats))
+
+    return Starlette(routes=[
+        Route("/v1beta/models/{call}", model_call, methods=["POST"]),
+        Route("/stats", read_stats, methods=["GET"]),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("FAKE_GEMINI_PORT", "8765")))
+    parser.add_argument("--replies", help="JSONL of recorded replies ({\"text\": ...} or plan objects)")
+    parser.add_argument("--latency", default="lognormal:1.5:0.4")
+    parser.add_argument("--chunk-chars", type=int, default=200)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+End-to-end load test over real sockets, fully offline: starts the fake Gemini
+server (benchmarks/fake_gemini.py) and the API under uvicorn against a fresh
+SQLite database, then drives each scenario at a fixed concurrency:
+
+  login      POST /auth/login (bcrypt verify + token)
+  list       GET /builds/?limit=20 as the signed-in user
+  public     GET /builds/public (the feed cache's hot path)
+  generate   POST /builds/generate with unique prompts, through the SDK, the
+             upstream limiter and the model router to the fake
+  stl        POST /builds/{id}/cad with distinct build123d scripts (slow:
+             runs the CAD worker pool; not in the default set)
+
+For each scenario it reports throughput, p50/p95/p99 latency and status
+counts, plus the API process's memory, per-stage timings from /metrics and
+what the fake served. Results are written to
+benchmarks/results/load-<commit>.json so two commits can be compared:
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --scenarios generate --concurrency 50 --requests 500 --latency lognormal:2:0.5
+    python benchmarks/load_test.py --scenarios generate --malformed-rate 0.1 --rate-429 0.05
+    python benchmarks/load_test.py --scenarios public,stl --requests 40
+    python benchmarks/load_test.py --scenarios generate --env GEMINI_RPM=60 --env GEMINI_MAX_CONCURRENCY=16
+    python benchmarks/load_test.py --compare benchmarks/results/load-abc1234.json benchmarks/results/load-def5678.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+SCENARIOS = ("login", "list", "public", "generate", "stl")
+EMAIL, PASSWORD = "load@example.com", "load-test-password"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def commit_id() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def memory_kb(pid: int) -> dict:
+    """VmRSS / VmHWM of a process, and the summed RSS of its children (CAD workers)."""
+    fields = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                fields[key] = int(value.split()[0])
+    children_rss = 0
+    for task in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                child_pids = f.read().split()
+        except OSError:
+            continue
+        for child in child_pids:
+            try:
+                with open(f"/proc/{child}/status") as f:
+                    children_rss += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+            except (OSError, StopIteration):
+                pass
+    return {"rss_kb": fields.get("VmRSS"), "peak_rss_kb": fields.get("VmHWM"), "children_rss_kb": children_rss}
+
+
+def stage_summary(metrics_text: str) -> dict:
+    """Mean milliseconds and count per stage from prawler_stage_seconds."""
+    sums, counts = {}, {}
+    for name, stage, value in re.findall(r'^prawler_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$', metrics_text, re.M):
+        (sums if name == "sum" else counts)[stage] = float(value)
+    return {
+        stage: {"count": int(count), "mean_ms": round(sums.get(stage, 0) / count * 1000, 2)}
+        for stage, count in sorted(counts.items()) if count
+    }
+
+
+def start_process(args, cwd, env, log_path):
+    log = open(log_path, "w")
+    return subprocess.Popen(args, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_until_up(url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+async def drive(client, make_request, requests: int, concurrency: int) -> dict:
+    """Runs `requests` calls of make_request(i) with `concurrency` in flight; returns latency stats."""
+    latencies, statuses = [], Counter()
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await make_request(client, i)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    ms = lambda value: round(value * 1000, 1) if value is not None else None
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+        "statuses": dict(statuses),
+    }
+
+
+def cad_script(i: int) -> str:
+    # Distinct dimensions so every request is a new export rather than an artifact-store hit
+    return f"with BuildPart() as b:\n    Box({60 + i % 40}, {40 + i // 40 % 20}, 20)\nbody = b.part\n"
+
+
+async def run_scenarios(args, api_url: str):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=api_url, timeout=args.timeout, limits=limits) as client:
+        await client.post("/auth/signup", json={"email": EMAIL, "password": PASSWORD})
+        response = await client.post("/auth/login", data={"username": EMAIL, "password": PASSWORD})
+        response.raise_for_status()
+        auth = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        # Builds for list/public/stl to read; generated through the fake so they look like real ones
+        build_ids = []
+
+        async def seed_build(client, i):
+            response = await client.post("/builds/generate", json={"prompt": f"seed device {i}"}, headers=auth)
+            if response.status_code == 200:
+                build_ids.append(response.json()["id"])
+            return response
+
+        seeded = await drive(client, seed_build, args.seed_builds, args.concurrency)
+        if not build_ids and any(s in args.scenarios for s in ("list", "public", "stl")):
+            raise RuntimeError(f"Seeding builds failed: {seeded['statuses']}")
+
+        requests = {
+            "login": lambda c, i: c.post("/auth/login", data={"username": EMAIL, "password": PASSWORD}),
+            "list": lambda c, i: c.get("/builds/", params={"limit": 20}, headers=auth),
+            "public": lambda c, i: c.get("/builds/public"),
+            "generate": lambda c, i: c.post("/builds/generate", json={"prompt": f"load test device {i} {time.time_ns()}"}, headers=auth),
+            "stl": lambda c, i: c.post(f"/builds/{build_ids[i % len(build_ids)]}/cad", json={"script": cad_script(i)}, headers=auth),
+        }
+        results = {"seed": seeded}
+        for name in args.scenarios:
+            results[name] = await drive(client, requests[name], args.requests, args.concurrency)
+            print(f"{name}: {results[name]['rps']} req/s, p95 {results[name]['p95_ms']} ms", file=sys.stderr)
+        metrics_text = (await client.get("/metrics")).text
+    return results, metrics_text
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="prawler-load-")
+    fake_port, api_port = free_port(), free_port()
+    fake_url, api_url = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{api_port}"
+
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'load.db')}",
+        "GEMINI_API_KEY": "fake",
+        "GEMINI_API_ENDPOINT": fake_url,
+        # Every generate request should reach the model, not the plan cache
+        "PLAN_CACHE_ENABLED": "0",
+        "CAD_WORKERS": str(args.cad_workers if "stl" in args.scenarios else 0),
+        "LOG_DEBUG_SAMPLE_RATE": "0",
+        # The fake has no quota; measure the server, not GEMINI_RPM (pass --env GEMINI_RPM=60 to include it)
+        "GEMINI_RPM": "1000000",
+    })
+    env.update(item.split("=", 1) for item in args.env)
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=BACKEND_DIR, env=env, check=True,
+                   capture_output=True)
+
+    fake_args = [
+        sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "fake_gemini.py"), "--port", str(fake_port),
+        "--latency", args.latency, "--chunk-chars", str(args.chunk_chars), "--chunk-delay", str(args.chunk_delay),
+        "--malformed-rate", str(args.malformed_rate), "--rate-429", str(args.rate_429),
+    ]
+    if args.replies:
+        fake_args += ["--replies", os.path.abspath(args.replies)]
+    api_args = [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+                "--port", str(api_port), "--log-level", "warning", "--no-access-log"]
+
+    fake = start_process(fake_args, workdir, env, os.path.join(workdir, "fake.log"))
+    api = start_process(api_args, workdir, env, os.path.join(workdir, "api.log"))
+    try:
+        asyncio.run(wait_until_up(f"{fake_url}/stats"))
+        asyncio.run(wait_until_up(f"{api_url}/"))
+        results, metrics_text = asyncio.run(run_scenarios(args, api_url))
+        memory = memory_kb(api.pid)
+        fake_stats = httpx.get(f"{fake_url}/stats").json()
+    finally:
+        for process in (api, fake):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    return {
+        "commit": commit_id(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "config": {
+            "concurrency": args.concurrency, "requests": args.requests, "seed_builds": args.seed_builds,
+            "latency": args.latency, "chunk_chars": args.chunk_chars, "chunk_delay": args.chunk_delay,
+            "malformed_rate": args.malformed_rate, "rate_429": args.rate_429, "replies": args.replies,
+            "env": args.env,
+        },
+        "scenarios": results,
+        "memory": memory,
+        "stages": stage_summary(metrics_text),
+        "fake_gemini": fake_stats,
+        "logs_dir": workdir,
+    }
+
+
+def compare(old_path: str, new_path: str) -> dict:
+    """Relative change of every scenario's throughput and latency percentiles, new vs old."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    delta = lambda a, b: None if not a or b is None else f"{(b - a) / a * 100:+.1f}%"
+    report = {"old": old["commit"], "new": new["commit"], "scenarios": {}}
+    for name, after in new["scenarios"].items():
+        before = old["scenarios"].get(name)
+        if before:
+            report["scenarios"][name] = {
+                key: {"old": before.get(key), "new": after.get(key), "change": delta(before.get(key), after.get(key))}
+                for key in ("rps", "p50_ms", "p95_ms", "p99_ms")
+            }
+    report["peak_rss_kb"] = {
+        "old": old["memory"]["peak_rss_kb"], "new": new["memory"]["peak_rss_kb"],
+        "change": delta(old["memory"]["peak_rss_kb"], new["memory"]["peak_rss_kb"]),
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", default="login,list,public,generate",
+                        help=f"comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="per scenario")
+    parser.add_argument("--seed-builds", type=int, default=30)
+    parser.add_argument("--cad-workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the API, e.g. GEMINI_MAX_CONCURRENCY=32")
+    # Passed through to the fake Gemini server
+    parser.add_argument("--latency", default="lognormal:1.5:0.4")
+    parser.add_argument("--chunk-chars", type=int, default=200)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--replies")
+    parser.add_argument("--output", help="defaults to benchmarks/results/load-<commit>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        print(json.dumps(compare(*args.compare), indent=2))
+        return
+
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    result = run(args)
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{result['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
+    print(f"Wrote {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
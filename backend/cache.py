@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache with per-entry expiry and hit/miss counters.
+    Used for in-process caching where a plain dict would grow without bound.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one upstream call.
+    Every waiter receives the shared result (or exception). The upstream
+    call is only cancelled once all of its waiters have gone away.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> {"task": asyncio.Task, "waiters": int}
+        self.started = 0
+        self.deduplicated = 0
+
+    async def do(self, key, fn):
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(fn())
+            call = {"task": task, "waiters": 0}
+            self._calls[key] = call
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+            self.started += 1
+        else:
+            self.deduplicated += 1
+
+        call["waiters"] += 1
+        try:
+            # shield: one waiter being cancelled must not cancel the shared call
+            return await asyncio.shield(call["task"])
+        finally:
+            call["waiters"] -= 1
+            if call["waiters"] == 0 and not call["task"].done():
+                call["task"].cancel()
+                # Forget it now rather than when the cancellation lands, so a new caller starts afresh
+                self._forget(key, call["task"])
+
+    def _forget(self, key, task):
+        call = self._calls.get(key)
+        if call is not None and call["task"] is task:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "started": self.started,
+            "deduplicated": self.deduplicated,
+        }
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match check (weak comparison, so W/"x" matches "x")."""
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
@@ -1,9 +1,15 @@
 
+import builtins
 import os
 import uuid
 import logging
+import numpy as np
 import build123d as build123d_module
 from build123d import *
+from OCP.BRepTools import BRepTools
+
+from mesh_export import write_binary_stl, write_quantized_glb
+from precompress import write_sidecars
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -12,9 +18,83 @@ logger = logging.getLogger(__name__)
 STATIC_DIR = "static/stls"
 os.makedirs(STATIC_DIR, exist_ok=True)
 
-def generate_stl(script_content: str) -> dict:
+# Modules a CAD script may import. This and the trimmed builtins below only narrow what
+# a script can reach; in-process Python restrictions can be escaped, so they are not a
+# sandbox. The worker's timeout, rlimits and scrubbed environment (cad_pool.py) are the
+# actual containment.
+CAD_ALLOWED_IMPORTS = frozenset(
+    name.strip()
+    for name in os.getenv(
+        "CAD_ALLOWED_IMPORTS", "build123d,math,cmath,random,itertools,functools,collections,typing,copy,numpy"
+    ).split(",")
+    if name.strip()
+)
+_BLOCKED_BUILTINS = {
+    "open", "exec", "eval", "compile", "input", "breakpoint", "exit", "quit", "help",
+    "globals", "locals", "vars", "memoryview", "__import__", "__loader__", "__spec__",
+}
+
+def _script_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level != 0 or name.split(".")[0] not in CAD_ALLOWED_IMPORTS:
+        raise ImportError(f"Importing '{name}' is not allowed in CAD scripts.")
+    return builtins.__import__(name, globals, locals, fromlist, level)
+
+SCRIPT_BUILTINS = {name: value for name, value in vars(builtins).items() if name not in _BLOCKED_BUILTINS}
+SCRIPT_BUILTINS["__import__"] = _script_import
+
+# (name, tolerance, angular_tolerance); the default matches export_stl's tessellation
+DEFAULT_LODS = (("fine", 0.001, 0.1),)
+
+def _write_atomic(path: str, writer, *args) -> int:
+    # Content-addressed files can be rebuilt while being served; never expose a half-written one
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    size = writer(tmp_path, *args)
+    os.replace(tmp_path, path)
+    write_sidecars(path)
+    return size
+
+def tessellate(shape, tolerance: float, angular_tolerance: float):
+    """Returns (vertices float64 Nx3, triangles uint32 Mx3) for one level of detail."""
+    # OCP keeps the finest triangulation it has computed; drop it so coarse LODs are really coarse
+    BRepTools.Clean_s(shape.wrapped)
+    vertices, triangles = shape.tessellate(tolerance, angular_tolerance)
+    return (
+        np.array([(v.X, v.Y, v.Z) for v in vertices], dtype=np.float64).reshape(-1, 3),
+        np.array(triangles, dtype=np.uint32).reshape(-1, 3),
+    )
+
+def export_mesh_lods(shape, name: str, lods=DEFAULT_LODS) -> dict:
+    """
+    Tessellates `shape` once per level of detail and writes each mesh as a
+    binary STL and a quantized GLB. The finest STL is `{name}.stl` (the file
+    older clients load); the rest are `{name}.{lod}.stl` / `{name}.{lod}.glb`.
+    Returns {lod: {...urls and sizes}} ordered coarse to fine.
+    """
+    variants = {}
+    ordered = sorted(lods, key=lambda lod: -lod[1])
+    for index, (lod, tolerance, angular_tolerance) in enumerate(ordered):
+        vertices, triangles = tessellate(shape, tolerance, angular_tolerance)
+        if not len(triangles):
+            raise ValueError(f"'{name}' has no faces to export.")
+        stl_filename = f"{name}.stl" if index == len(ordered) - 1 else f"{name}.{lod}.stl"
+        glb_filename = f"{name}.{lod}.glb"
+        variants[lod] = {
+            "stl": f"/static/stls/{stl_filename}",
+            "glb": f"/static/stls/{glb_filename}",
+            "tolerance": tolerance,
+            "angular_tolerance": angular_tolerance,
+            "triangles": len(triangles),
+            "stl_bytes": _write_atomic(os.path.join(STATIC_DIR, stl_filename), write_binary_stl, vertices, triangles),
+            "glb_bytes": _write_atomic(os.path.join(STATIC_DIR, glb_filename), write_quantized_glb, vertices, triangles),
+        }
+    return variants
+
+def generate_stl(script_content: str, artifact_name: str = None, lods=DEFAULT_LODS) -> dict:
     """
-    Executes a build123d script and exports 'lid' and 'body' objects to STL.
+    Executes a build123d script and exports 'lid' and 'body' objects to STL,
+    plus binary STL/GLB meshes for every level of detail in `lods`.
+    Files are named after `artifact_name` (a content digest) when given,
+    otherwise after a random uuid.
     Returns a dictionary with URLs to the generated files.
     """
     try:
@@ -28,7 +108,7 @@ def generate_stl(script_content: str) -> dict:
         # Add extras
         exec_globals.update({
             "__name__": "__main__",
-            "__builtins__": __builtins__,
+            "__builtins__": SCRIPT_BUILTINS,
             "logging": logging,
         })
 
@@ -48,32 +128,34 @@ def generate_stl(script_content: str) -> dict:
              body = result
 
         output = {}
-        build_id = str(uuid.uuid4())
+        mesh_variants = {}
+        build_id = artifact_name or str(uuid.uuid4())
 
         # 4. Export Body
         if body:
             if isinstance(body, (Part, Compound)):
-                body_filename = f"body_{build_id}.stl"
-                body_path = os.path.join(STATIC_DIR, body_filename)
-                export_stl(body, body_path)
-                output["openscad_body"] = f"/static/stls/{body_filename}" # Keeping key name for compatibility for now, or change to stl_body_url
-                output["stl_body_url"] = f"/static/stls/{body_filename}"
+                variants = export_mesh_lods(body, f"body_{build_id}", lods)
+                body_url = list(variants.values())[-1]["stl"]
+                output["openscad_body"] = body_url # Keeping key name for compatibility for now, or change to stl_body_url
+                output["stl_body_url"] = body_url
+                mesh_variants["body"] = variants
             else:
                  logger.warning(f"Body variable found but is not a Part/Compound: {type(body)}")
 
         # 5. Export Lid
         if lid:
             if isinstance(lid, (Part, Compound)):
-                lid_filename = f"lid_{build_id}.stl"
-                lid_path = os.path.join(STATIC_DIR, lid_filename)
-                export_stl(lid, lid_path)
-                output["openscad_lid"] = f"/static/stls/{lid_filename}"
-                output["stl_lid_url"] = f"/static/stls/{lid_filename}"
+                variants = export_mesh_lods(lid, f"lid_{build_id}", lods)
+                lid_url = list(variants.values())[-1]["stl"]
+                output["openscad_lid"] = lid_url
+                output["stl_lid_url"] = lid_url
+                mesh_variants["lid"] = variants
             else:
                  logger.warning(f"Lid variable found but is not a Part/Compound: {type(lid)}")
         
         if not output:
             raise ValueError("Script executed but no 'lid', 'body', or 'result' variables containing 3D parts were found.")
+        output["mesh_variants"] = mesh_variants
 
         return output
 
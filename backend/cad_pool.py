@@ -0,0 +1,323 @@
+import asyncio
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits; the memory cap is enforced by polling RSS instead
+    resource = None
+
+import logs
+from metrics import STAGE_ERRORS, STAGE_SECONDS, span
+
+# Pool of pre-started worker processes that run cad_engine.generate_stl.
+# build123d/OCP is imported once per worker (not per job, and never in the API
+# process), and user scripts can no longer stall or crash the server.
+# Per API process: `uvicorn --workers N` runs N pools, so keep this small
+CAD_WORKERS = int(os.getenv("CAD_WORKERS", "2"))
+CAD_JOB_TIMEOUT_SECONDS = float(os.getenv("CAD_JOB_TIMEOUT_SECONDS", "60"))
+CAD_CPU_LIMIT_SECONDS = int(os.getenv("CAD_CPU_LIMIT_SECONDS", "60"))
+CAD_MEMORY_LIMIT_MB = int(os.getenv("CAD_MEMORY_LIMIT_MB", "2048"))
+# Levels of detail exported for every part, as name:tolerance:angular_tolerance (mm, radians)
+CAD_LODS = os.getenv("CAD_LODS", "preview:0.2:0.5,fine:0.001:0.1")
+# Where RLIMIT_AS is unavailable or unenforced (everything but Linux), workers poll their RSS this often
+CAD_MEMORY_POLL_SECONDS = float(os.getenv("CAD_MEMORY_POLL_SECONDS", "0.25"))
+
+_READY = "ready"
+_LINUX = sys.platform.startswith("linux")
+_WINDOWS = sys.platform == "win32"
+
+# The only environment workers (and the user scripts they run) inherit: SECRET_KEY,
+# GEMINI_API_KEY, DATABASE_URL and anything else not listed here are withheld
+_WORKER_ENV = {
+    "PATH", "HOME", "USER", "LANG", "LC_ALL", "LC_CTYPE", "TZ", "TMPDIR", "TEMP", "TMP", "LD_LIBRARY_PATH",
+    "VIRTUAL_ENV", "SYSTEMROOT", "SYSTEMDRIVE", "WINDIR", "COMSPEC", "PATHEXT", "USERPROFILE", "APPDATA",
+    "LOCALAPPDATA", "NUMBER_OF_PROCESSORS",
+}
+_WORKER_ENV_PREFIXES = ("PYTHON", "CAD_", "LOG_", "METRICS_", "ARTIFACT_", "CSF_", "OMP_", "OPENBLAS_", "MKL_")
+
+
+def parse_lods(spec: str) -> tuple:
+    lods = []
+    for item in spec.split(","):
+        name, tolerance, angular_tolerance = item.strip().split(":")
+        lods.append((name, float(tolerance), float(angular_tolerance)))
+    if not lods:
+        raise ValueError("CAD_LODS must name at least one level of detail")
+    return tuple(lods)
+
+
+def _address_space_in_use() -> int:
+    """Linux only."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[0]) * resource.getpagesize()
+
+
+def _resident_bytes() -> int:
+    """This process's RSS; on macOS/BSD the peak, which is what getrusage offers."""
+    if _WINDOWS:
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage",
+                )
+            ]
+
+        counters = Counters(cb=ctypes.sizeof(Counters))
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb
+        )
+        return counters.WorkingSetSize
+    if _LINUX:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def _watch_memory(limit: int) -> None:
+    """Exits the worker once its RSS passes limit; the parent sees a crash, as with RLIMIT_AS."""
+    def watch():
+        while _resident_bytes() <= limit:
+            time.sleep(CAD_MEMORY_POLL_SECONDS)
+        os._exit(1)
+
+    threading.Thread(target=watch, name="cad-memory-watch", daemon=True).start()
+
+
+def _worker_may_see(name: str) -> bool:
+    name = name.upper()
+    return name in _WORKER_ENV or name.startswith(_WORKER_ENV_PREFIXES)
+
+
+@contextmanager
+def _worker_environment():
+    """
+    Withholds every variable _worker_may_see rejects while a worker is
+    spawned; the child copies the environment at exec. On POSIX only the C
+    environ changes, so threads reading os.environ meanwhile are unaffected;
+    Windows spawn copies os.environ itself when run from a venv.
+    """
+    withheld = {name: value for name, value in os.environ.items() if not _worker_may_see(name)}
+    for name in withheld:
+        if _WINDOWS:
+            del os.environ[name]
+        else:
+            os.unsetenv(name)
+    try:
+        yield
+    finally:
+        for name, value in withheld.items():
+            if _WINDOWS:
+                os.environ[name] = value
+            else:
+                os.putenv(name, value)
+
+
+def _worker_main(conn, cpu_limit_seconds: int, memory_limit_mb: int, lods: tuple) -> None:
+    """Entry point of a worker process: warm up, then serve scripts until the pipe closes."""
+    import cad_engine  # the expensive build123d import happens here, once
+
+    # Cap memory relative to the warmed-up footprint; OCP maps a lot of address space on import
+    if memory_limit_mb > 0:
+        if _LINUX:
+            limit = _address_space_in_use() + memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        else:
+            _watch_memory(_resident_bytes() + memory_limit_mb * 1024 * 1024)
+
+    conn.send(_READY)
+    while True:
+        try:
+            script, artifact_name = conn.recv()
+        except EOFError:
+            return
+
+        # CPU budget per job: exceeding the soft limit delivers SIGXCPU, which kills the worker.
+        # Windows has no equivalent; the parent's wall-clock timeout still applies there.
+        if cpu_limit_seconds > 0 and resource is not None:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            used = int(usage.ru_utime + usage.ru_stime) + 1
+            resource.setrlimit(resource.RLIMIT_CPU, (used + cpu_limit_seconds, resource.RLIM_INFINITY))
+
+        conn.send(cad_engine.generate_stl(script, artifact_name, lods))
+
+
+class _Worker:
+    def __init__(self, ctx, cpu_limit_seconds: int, memory_limit_mb: int, lods: tuple):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, cpu_limit_seconds, memory_limit_mb, lods),
+            daemon=True,
+        )
+        with _worker_environment():
+            self.process.start()
+        child_conn.close()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+async def _wait_readable(conn, timeout: float) -> None:
+    """
+    Waits for data on a worker pipe without tying up a thread. Windows pipes
+    can't be watched by the event loop, so there a thread polls instead.
+    """
+    loop = asyncio.get_running_loop()
+    if _WINDOWS:
+        if not await loop.run_in_executor(None, conn.poll, timeout):
+            raise asyncio.TimeoutError
+        return
+    ready = loop.create_future()
+    fd = conn.fileno()
+    loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+    try:
+        await asyncio.wait_for(ready, timeout)
+    finally:
+        loop.remove_reader(fd)
+
+
+class CadWorkerPool:
+    def __init__(self, size: int, timeout_seconds: float, cpu_limit_seconds: int, memory_limit_mb: int, lods: tuple):
+        self.size = size
+        self.timeout_seconds = timeout_seconds
+        self.cpu_limit_seconds = cpu_limit_seconds
+        self.memory_limit_mb = memory_limit_mb
+        self.lods = lods
+        # spawn, not fork: the API process has an event loop and threads running
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = None
+        self._workers = set()
+        self._starting = set()
+        self.busy = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.crashes = 0
+
+    async def start(self) -> None:
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._spawn()
+
+    async def stop(self) -> None:
+        for task in list(self._starting):
+            task.cancel()
+        for worker in list(self._workers):
+            worker.kill()
+        self._workers.clear()
+        self._idle = None
+
+    async def generate_stl(self, script_content: str, artifact_name: str = None) -> dict:
+        """
+        Runs cad_engine.generate_stl in a worker process and returns its result
+        dict. Timeouts and worker crashes come back as {"error": ...}.
+        """
+        if self.size <= 0:
+            return {"error": "CAD generation is disabled (CAD_WORKERS=0)."}
+        await self.start()
+        with span("cad_queue"):
+            worker = await self._idle.get()
+        self.busy += 1
+        started = time.monotonic()
+        try:
+            worker.conn.send((script_content, artifact_name))
+            await _wait_readable(worker.conn, self.timeout_seconds)
+            result = worker.conn.recv()
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            STAGE_ERRORS.labels("cad_export").inc()
+            self._replace(worker)
+            worker = None
+            return {"error": f"CAD script timed out after {self.timeout_seconds:.0f}s.", "script": script_content}
+        except (EOFError, OSError):
+            # The worker died mid-job: CPU/memory limit hit, or a crash inside OCP
+            self.crashes += 1
+            STAGE_ERRORS.labels("cad_export").inc()
+            self._replace(worker)
+            worker = None
+            return {"error": "CAD worker crashed while running the script (resource limit or native crash).", "script": script_content}
+        except asyncio.CancelledError:
+            # The caller went away; the worker's pipe state is unknown, so recycle it
+            self._replace(worker)
+            worker = None
+            raise
+        finally:
+            self.busy -= 1
+            STAGE_SECONDS.labels("cad_export").observe(time.monotonic() - started)
+            if worker is not None:
+                self._idle.put_nowait(worker)
+
+        self.completed += 1
+        result.setdefault("elapsed_seconds", round(time.monotonic() - started, 3))
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "alive": sum(1 for w in self._workers if w.process.is_alive()),
+            "starting": len(self._starting),
+            "busy": self.busy,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "crashes": self.crashes,
+        }
+
+    def _spawn(self) -> None:
+        task = asyncio.create_task(self._start_worker())
+        self._starting.add(task)
+        task.add_done_callback(self._starting.discard)
+
+    def _replace(self, worker: _Worker) -> None:
+        self._workers.discard(worker)
+        worker.kill()
+        if self._idle is not None:
+            self._spawn()
+
+    async def _start_worker(self) -> None:
+        worker = _Worker(self._ctx, self.cpu_limit_seconds, self.memory_limit_mb, self.lods)
+        self._workers.add(worker)
+        try:
+            # The worker reports ready once build123d is imported
+            await _wait_readable(worker.conn, max(self.timeout_seconds, 120))
+            if worker.conn.recv() != _READY:
+                raise EOFError
+        except (asyncio.TimeoutError, EOFError, OSError):
+            logs.warning("cad_worker_start_failed")
+            self._workers.discard(worker)
+            worker.kill()
+            await asyncio.sleep(1)
+            if self._idle is not None:
+                self._spawn()
+            return
+        except asyncio.CancelledError:
+            self._workers.discard(worker)
+            worker.kill()
+            raise
+        if self._idle is None:
+            # The pool was stopped while this worker was warming up
+            worker.kill()
+            return
+        self._idle.put_nowait(worker)
+
+
+cad_pool = CadWorkerPool(
+    size=CAD_WORKERS,
+    timeout_seconds=CAD_JOB_TIMEOUT_SECONDS,
+    cpu_limit_seconds=CAD_CPU_LIMIT_SECONDS,
+    memory_limit_mb=CAD_MEMORY_LIMIT_MB,
+    lods=parse_lods(CAD_LODS),
+)
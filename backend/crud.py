@@ -0,0 +1,106 @@
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+import hashlib
+
+from database import AsyncSessionLocal
+from feed_cache import feed_cache
+from metrics import span
+from models import Build
+from parts_catalog import index_build, index_builds
+from schemas import BuildResponse
+from validation_engine import BatchReport, validate_batch
+
+
+def set_document(build: Build) -> None:
+    """
+    Stores `build`'s GET /builds/{id} body (BuildResponse as JSON) and its
+    strong ETag on the row, so reads send bytes instead of revalidating and
+    re-encoding the JSON columns. Call after any change to a build's fields,
+    once it has an id.
+    """
+    build.document = BuildResponse.model_validate(build).model_dump_json().encode()
+    build.document_etag = f'"{hashlib.sha256(build.document).hexdigest()[:32]}"'
+
+
+async def add_build(db, build: Build) -> Build:
+    """
+    Adds a new Build, its serialized document and its parts catalog links to
+    `db`'s transaction; the caller commits, then calls feed_cache.invalidate().
+    Every code path that creates builds goes through here or add_builds.
+    """
+    db.add(build)
+    await db.flush()
+    set_document(build)
+    await index_build(db, build)
+    return build
+
+
+async def add_builds(db, builds: List[Build]) -> List[Build]:
+    """
+    add_build for many builds at once: one multi-row INSERT and one catalog
+    pass instead of a flush per build. The caller commits and invalidates.
+    """
+    if not builds:
+        return builds
+    db.add_all(builds)
+    await db.flush()
+    for build in builds:
+        set_document(build)
+    await index_builds(db, [(build.id, build.parts_json, build.created_at) for build in builds])
+    return builds
+
+
+async def save_build_from_plan(user_id: int, prompt: str, plan_data: dict) -> int:
+    """
+    Persists a generated plan as a new Build using its own session and returns the id.
+    For code paths that outlive the request-scoped session (streams, background jobs).
+    """
+    async with AsyncSessionLocal() as db:
+        with span("db_commit"):
+            new_build = await add_build(db, Build.from_plan(user_id, prompt, plan_data))
+            await db.commit()
+    feed_cache.invalidate()
+    return new_build.id
+
+
+async def revalidate_builds(batch_size: int = 500, report: Optional[BatchReport] = None) -> BatchReport:
+    """
+    Runs the validation rules over every stored build's parts_json, reading
+    keyset pages of `batch_size` rows (only id + parts) so memory stays flat.
+    """
+    report = report or BatchReport()
+    last_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Build.id, Build.parts_json).where(Build.id > last_id).order_by(Build.id).limit(batch_size)
+            )).all()
+        if not rows:
+            return report
+        # CPU-bound; keep the event loop free when this runs inside the server
+        await run_in_threadpool(validate_batch, rows, report)
+        last_id = rows[-1][0]
+
+
+async def backfill_build_parts(batch_size: int = 500) -> dict:
+    """
+    (Re)links every stored build to the parts catalog, streaming keyset pages
+    of `batch_size` builds (id, parts, created_at) with one commit per page.
+    Safe to re-run: each page's links are replaced, not appended.
+    """
+    stats = {"builds": 0, "links": 0, "batches": 0}
+    last_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Build.id, Build.parts_json, Build.created_at)
+                .where(Build.id > last_id).order_by(Build.id).limit(batch_size)
+            )).all()
+            if not rows:
+                return stats
+            stats["links"] += await index_builds(db, rows)
+            await db.commit()
+        stats["builds"] += len(rows)
+        stats["batches"] += 1
+        last_id = rows[-1][0]
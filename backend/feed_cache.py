@@ -0,0 +1,279 @@
+import asyncio
+import glob
+import hashlib
+import os
+import time
+from typing import Awaitable, Callable, Hashable, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from cache import SingleFlight, TTLCache, etag_matches
+import logs
+
+# Serialized pages of the public gallery (GET /builds/public), kept as the
+# exact response bytes plus a strong ETag. Entries are fresh for
+# FEED_CACHE_TTL_SECONDS, then served stale for up to
+# FEED_CACHE_STALE_SECONDS more while one background refresh runs.
+# Writes that change the feed call invalidate(), which bumps a generation:
+# entries from an older generation are never served.
+#
+# With FEED_CACHE_DIR set (e.g. a directory in /dev/shm), every worker on the
+# host shares the pages as files and a generation file whose mtime is bumped
+# on invalidation, so a build saved through one worker evicts the feed in all
+# of them and a page rendered by one worker is served by the others.
+FEED_CACHE_ENABLED = os.getenv("FEED_CACHE_ENABLED", "1") == "1"
+FEED_CACHE_TTL_SECONDS = float(os.getenv("FEED_CACHE_TTL_SECONDS", "5"))
+FEED_CACHE_STALE_SECONDS = float(os.getenv("FEED_CACHE_STALE_SECONDS", "60"))
+FEED_CACHE_MAX_ENTRIES = int(os.getenv("FEED_CACHE_MAX_ENTRIES", "64"))
+FEED_CACHE_DIR = os.getenv("FEED_CACHE_DIR", "")
+
+PUBLIC_FEED_PATHS = ("/builds/public", "/builds/public/")
+PUBLIC_FEED_DEFAULT_LIMIT = 20
+PUBLIC_FEED_MAX_LIMIT = 100
+CACHE_CONTROL = "public, no-cache"  # clients revalidate every time; unchanged pages cost a 304
+
+
+class FeedPage:
+    __slots__ = ("body", "etag", "next_cursor", "generation", "created_at")
+
+    def __init__(self, body: bytes, next_cursor: Optional[str], generation, created_at: float):
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.next_cursor = next_cursor
+        self.generation = generation
+        self.created_at = created_at  # time.time(), comparable across workers
+
+
+Render = Callable[[], Awaitable[Tuple[bytes, Optional[str]]]]
+
+
+class FeedCache:
+    def __init__(self, ttl_seconds: float, stale_seconds: float, max_entries: int, shared_dir: str = ""):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds + stale_seconds)
+        self.shared_dir = shared_dir
+        self._generation = 0
+        self._flights = SingleFlight()
+        self._refreshing = {}  # (key, generation) -> background revalidation task
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.shared_hits = 0
+        self.renders = 0
+        self.invalidations = 0
+        if shared_dir:
+            os.makedirs(shared_dir, exist_ok=True)
+
+    # --- generations ----------------------------------------------------------
+
+    def _generation_path(self) -> str:
+        return os.path.join(self.shared_dir, "generation")
+
+    def generation(self):
+        if not self.shared_dir:
+            return self._generation
+        try:
+            return os.stat(self._generation_path()).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def invalidate(self) -> None:
+        """Drops every cached page, here and (with FEED_CACHE_DIR) in every worker. Call after committing."""
+        self.invalidations += 1
+        self._generation += 1
+        self.memory.clear()
+        if not self.shared_dir:
+            return
+        path = self._generation_path()
+        try:
+            with open(path, "a"):
+                pass
+            # Strictly newer than the previous stamp, even within one clock tick
+            previous = self.generation()
+            now = max(time.time_ns(), previous + 1)
+            os.utime(path, ns=(now, now))
+            for stale in glob.glob(os.path.join(self.shared_dir, "page-*")):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass  # another worker invalidated at the same time
+        except OSError as e:
+            logs.warning("feed_cache_invalidation_failed", error=str(e))
+
+    # --- lookups --------------------------------------------------------------
+
+    def peek(self, key: Hashable) -> Optional[FeedPage]:
+        """The page for `key` if it is in memory, current and fresh; never renders."""
+        page = self.memory.get(key)
+        if page is None or page.generation != self.generation() or time.time() - page.created_at >= self.ttl_seconds:
+            return None
+        self.fresh_hits += 1
+        return page
+
+    async def get(self, key: Hashable, render: Render) -> Tuple[FeedPage, str]:
+        """
+        The page for `key` and how it was served ("hit", "stale", "shared"
+        or "miss"). `render` produces (body bytes, next cursor) from the
+        database; concurrent misses for one page share a single render.
+        """
+        generation = self.generation()
+        page = self.memory.get(key)
+        if page is not None and page.generation == generation:
+            age = time.time() - page.created_at
+            if age < self.ttl_seconds:
+                self.fresh_hits += 1
+                return page, "hit"
+            self.stale_hits += 1
+            self._revalidate(key, generation, render)
+            return page, "stale"
+
+        page = self._read_shared(key, generation)
+        if page is not None:
+            self.shared_hits += 1
+            self.memory.set(key, page)
+            return page, "shared"
+
+        page = await self._flights.do((key, generation), lambda: self._render(key, generation, render))
+        return page, "miss"
+
+    def _revalidate(self, key, generation, render: Render) -> None:
+        flight = (key, generation)
+        if flight in self._refreshing:
+            return
+        task = asyncio.ensure_future(self._flights.do(flight, lambda: self._render(key, generation, render)))
+        self._refreshing[flight] = task
+        task.add_done_callback(lambda t: self._refresh_done(flight, t))
+
+    def _refresh_done(self, flight, task: asyncio.Task) -> None:
+        self._refreshing.pop(flight, None)
+        if not task.cancelled() and task.exception() is not None:
+            # Keep serving the stale page; the next request past its TTL tries again
+            logs.warning("feed_cache_refresh_failed", error=str(task.exception()))
+
+    async def _render(self, key, generation, render: Render) -> FeedPage:
+        self.renders += 1
+        body, next_cursor = await render()
+        page = FeedPage(body, next_cursor, generation, time.time())
+        # A write that landed while rendering bumped the generation; don't cache a page that may predate it
+        if self.generation() == generation:
+            self.memory.set(key, page)
+            self._write_shared(key, page)
+        return page
+
+    # --- shared tier ----------------------------------------------------------
+
+    def _shared_path(self, key, generation) -> str:
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()[:16]
+        return os.path.join(self.shared_dir, f"page-{generation}-{digest}")
+
+    def _read_shared(self, key, generation) -> Optional[FeedPage]:
+        if not self.shared_dir:
+            return None
+        path = self._shared_path(key, generation)
+        try:
+            created_at = os.stat(path).st_mtime
+            if time.time() - created_at >= self.ttl_seconds:
+                return None
+            with open(path, "rb") as f:
+                cursor, _, body = f.read().partition(b"\n")
+        except OSError:
+            return None
+        return FeedPage(body, cursor.decode() or None, generation, created_at)
+
+    def _write_shared(self, key, page: FeedPage) -> None:
+        if not self.shared_dir:
+            return
+        path = self._shared_path(key, page.generation)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write((page.next_cursor or "").encode() + b"\n" + page.body)
+            os.replace(tmp, path)
+        except OSError as e:
+            logs.warning("feed_cache_write_failed", error=str(e))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": FEED_CACHE_ENABLED,
+            "shared_dir": self.shared_dir or None,
+            "memory": self.memory.stats(),
+            "fresh_hits": self.fresh_hits,
+            "stale_hits": self.stale_hits,
+            "refreshing": len(self._refreshing),
+            "shared_hits": self.shared_hits,
+            "renders": self.renders,
+            "invalidations": self.invalidations,
+            "single_flight": self._flights.stats(),
+        }
+
+
+def public_feed_key(limit: int, cursor: Optional[str]) -> tuple:
+    return ("public", limit, cursor)
+
+
+def page_headers(page: FeedPage, source: str) -> dict:
+    headers = {"ETag": page.etag, "Cache-Control": CACHE_CONTROL, "X-Cache": source}
+    if page.next_cursor:
+        headers["X-Next-Cursor"] = page.next_cursor
+    return headers
+
+
+def _feed_key_from_query(query_string: bytes) -> Optional[tuple]:
+    """The cache key for an unfiltered /builds/public request, or None (let the route handle it)."""
+    limit, cursor = PUBLIC_FEED_DEFAULT_LIMIT, None
+    seen = set()
+    for name, value in parse_qsl(query_string.decode("latin-1"), keep_blank_values=True):
+        if name in seen:
+            return None
+        seen.add(name)
+        if name == "limit" and value.isdigit() and 1 <= int(value) <= PUBLIC_FEED_MAX_LIMIT:
+            limit = int(value)
+        elif name == "cursor" and value:
+            cursor = value
+        else:
+            return None
+    return public_feed_key(limit, cursor)
+
+
+class FeedCacheMiddleware:
+    """
+    Answers GET /builds/public from fresh in-memory pages before FastAPI
+    routes the request. Stale pages, misses and filtered requests go on to
+    the route, which renders and revalidates.
+    """
+
+    def __init__(self, app, cache: "FeedCache"):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in PUBLIC_FEED_PATHS:
+            return await self.app(scope, receive, send)
+        key = _feed_key_from_query(scope["query_string"])
+        page = self.cache.peek(key) if key is not None and FEED_CACHE_ENABLED else None
+        if page is None:
+            return await self.app(scope, receive, send)
+        scope["route_template"] = "/builds/public"
+
+        if_none_match = None
+        for name, value in scope["headers"]:
+            if name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+                break
+        not_modified = if_none_match is not None and etag_matches(if_none_match, page.etag)
+        headers = [(name.lower().encode(), value.encode("latin-1")) for name, value in page_headers(page, "hit").items()]
+        if not_modified:
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers.append((b"content-type", b"application/json"))
+        headers.append((b"content-length", str(len(page.body)).encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": page.body})
+
+
+feed_cache = FeedCache(
+    ttl_seconds=FEED_CACHE_TTL_SECONDS,
+    stale_seconds=FEED_CACHE_STALE_SECONDS,
+    max_entries=FEED_CACHE_MAX_ENTRIES,
+    shared_dir=FEED_CACHE_DIR,
+)
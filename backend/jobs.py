@@ -0,0 +1,259 @@
+import asyncio
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+from ai_engine import generate_build_plan
+from validation_engine import validate_build
+from crud import save_build_from_plan
+import logs
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_QUEUE_DEPTH = int(os.getenv("JOB_MAX_QUEUE_DEPTH", "100"))
+JOB_MAX_PER_USER = int(os.getenv("JOB_MAX_PER_USER", "5"))
+JOB_RESULT_TTL_SECONDS = int(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+
+class QueueFull(Exception):
+    """Raised when a job cannot be accepted; the router turns it into a 429."""
+
+
+@dataclass
+class Job:
+    id: str
+    user_id: int
+    prompt: str
+    status: str = QUEUED
+    build_id: Optional[int] = None
+    error: Optional[str] = None
+    warnings: List[str] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # Batch items: the plan is handed back in plan_data and the batch saves it
+    plan_only: bool = False
+    plan_data: Optional[dict] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Job":
+        return cls(**data)
+
+
+class JobBackend(ABC):
+    """
+    Storage and ordering for generation jobs. Everything goes through plain
+    dicts (Job.to_dict / from_dict) so an out-of-process backend such as a
+    Redis-compatible store can implement the same interface.
+    """
+
+    @abstractmethod
+    async def enqueue(self, job: Job) -> None:
+        ...
+
+    @abstractmethod
+    async def dequeue(self) -> Job:
+        """Blocks until a job is available and returns it."""
+        ...
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Job]:
+        ...
+
+    @abstractmethod
+    async def update(self, job: Job) -> None:
+        ...
+
+    @abstractmethod
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """Waits up to `timeout` seconds for the job to change state."""
+        ...
+
+    @abstractmethod
+    async def stats(self) -> dict:
+        ...
+
+
+class InMemoryJobBackend(JobBackend):
+    """
+    Single-process backend. Queued jobs are kept in one deque per user and
+    dequeued round-robin across users, so one user submitting a large burst
+    cannot starve everyone else.
+    """
+
+    def __init__(self, max_depth: int, max_per_user: int, result_ttl_seconds: int):
+        self.max_depth = max_depth
+        self.max_per_user = max_per_user
+        self.result_ttl_seconds = result_ttl_seconds
+        self._jobs = {}
+        self._queues: "OrderedDict[int, deque]" = OrderedDict()
+        self._depth = 0
+        self._changed = None
+
+    def _condition(self) -> asyncio.Condition:
+        # Created lazily so it binds to the running event loop
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    async def enqueue(self, job: Job) -> None:
+        if self._depth >= self.max_depth:
+            raise QueueFull("Generation queue is full, try again shortly.")
+        user_queue = self._queues.get(job.user_id)
+        if user_queue is not None and len(user_queue) >= self.max_per_user:
+            raise QueueFull(f"You already have {self.max_per_user} generations queued.")
+
+        self._prune()
+        self._jobs[job.id] = job.to_dict()
+        self._queues.setdefault(job.user_id, deque()).append(job.id)
+        self._depth += 1
+        async with self._condition():
+            self._condition().notify_all()
+
+    async def dequeue(self) -> Job:
+        async with self._condition():
+            await self._condition().wait_for(lambda: self._depth > 0)
+            # Round-robin: take from the first user, then move them to the back
+            user_id, user_queue = next(iter(self._queues.items()))
+            job_id = user_queue.popleft()
+            self._queues.pop(user_id)
+            if user_queue:
+                self._queues[user_id] = user_queue
+            self._depth -= 1
+            return Job.from_dict(self._jobs[job_id])
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        data = self._jobs.get(job_id)
+        return Job.from_dict(data) if data else None
+
+    async def update(self, job: Job) -> None:
+        self._jobs[job.id] = job.to_dict()
+        async with self._condition():
+            self._condition().notify_all()
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        initial = self._jobs.get(job_id, {}).get("status")
+        try:
+            async with self._condition():
+                await asyncio.wait_for(
+                    self._condition().wait_for(lambda: self._jobs.get(job_id, {}).get("status") != initial),
+                    timeout,
+                )
+        except asyncio.TimeoutError:
+            pass
+        return await self.get(job_id)
+
+    async def stats(self) -> dict:
+        return {
+            "queued": self._depth,
+            "max_depth": self.max_depth,
+            "users_waiting": len(self._queues),
+            "tracked_jobs": len(self._jobs),
+        }
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.result_ttl_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] in FINISHED_STATES and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class JobQueue:
+    """Accepts generation jobs and runs them on a fixed pool of async workers."""
+
+    def __init__(self, backend: JobBackend, workers: int):
+        self.backend = backend
+        self.workers = workers
+        self._tasks = []
+        self.running = 0
+
+    async def submit(self, user_id: int, prompt: str, plan_only: bool = False) -> Job:
+        job = Job(id=uuid.uuid4().hex, user_id=user_id, prompt=prompt, plan_only=plan_only)
+        await self.backend.enqueue(job)
+        return job
+
+    async def result(self, job_id: str) -> Job:
+        """Waits for the job to succeed or fail and returns it."""
+        job = await self.backend.get(job_id)
+        while job.status not in FINISHED_STATES:
+            job = await self.backend.wait(job_id, 30)
+        return job
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def stats(self) -> dict:
+        stats = await self.backend.stats()
+        stats.update({"workers": self.workers, "running": self.running})
+        return stats
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self.backend.dequeue()
+            self.running += 1
+            try:
+                await self._run(job)
+            finally:
+                self.running -= 1
+
+    async def _run(self, job: Job) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        await self.backend.update(job)
+
+        try:
+            plan_data = await generate_build_plan(job.prompt)
+            if "error" in plan_data:
+                job.status = FAILED
+                job.error = plan_data["error"]
+            elif job.plan_only:
+                job.plan_data = plan_data
+                job.status = SUCCEEDED
+            else:
+                job.warnings = validate_build(plan_data.get("parts", []), wiring=plan_data.get("wiring_diagram"))
+                job.build_id = await save_build_from_plan(job.user_id, job.prompt, plan_data)
+                job.status = SUCCEEDED
+        except asyncio.CancelledError:
+            job.status = FAILED
+            job.error = "Job cancelled during shutdown."
+            raise
+        except Exception as e:
+            logs.error("generation_job_failed", job_id=job.id, error=str(e))
+            job.status = FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            await self.backend.update(job)
+
+
+job_queue = JobQueue(
+    InMemoryJobBackend(
+        max_depth=JOB_MAX_QUEUE_DEPTH,
+        max_per_user=JOB_MAX_PER_USER,
+        result_ttl_seconds=JOB_RESULT_TTL_SECONDS,
+    ),
+    workers=JOB_WORKERS,
+)
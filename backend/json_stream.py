@@ -0,0 +1,445 @@
+import json
+import re
+from collections import Counter
+from json.decoder import scanstring
+
+# Tolerant parser for the JSON object inside model output, in one pass over
+# the text and without copying it. It can be fed chunks as they stream in.
+# Repairs are applied in place of failing and reported in `repairs`:
+#   skipped_prefix         prose / ```json fences before the object
+#   ignored_trailing_text  anything after the object closes
+#   control_character      raw control characters in strings (newline/tab/CR escaped, others dropped)
+#   invalid_escape         a backslash that doesn't start a JSON escape (kept literally)
+#   trailing_comma         ",}" / ",]" outside strings
+#   extra_comma            ",," or a comma right after "{" / "["
+#   missing_comma          two members / elements with nothing between them
+#   unquoted_key           {device_name: ...}
+#   python_literal         True / False / None
+#   comment                // and /* */ comments between tokens
+# Truncated output is an error, not repaired: a half plan shouldn't pass as a whole one.
+
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+_STRING_RUN = re.compile(r'[^"\\\x00-\x1f]*')
+_NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?")
+_NUMBER_RUN = re.compile(r"[-+0-9.eE]*")
+_BAREWORD = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*")
+_HEX4 = re.compile(r"[0-9a-fA-F]{4}")
+_ESCAPES = frozenset('"\\/bfnrt')
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_LITERALS = {"true": True, "false": False, "null": None}
+_PYTHON_LITERALS = {"True": True, "False": False, "None": None}
+_VALUE_START = frozenset('{["-0123456789') | frozenset("tfnTFN")
+
+# Containers this shallow are first handed to the C decoder whole; only the
+# ones it rejects (or that aren't complete yet) are walked token by token
+FAST_PATH_DEPTH = 3
+
+# Syntax errors before anything has been emitted restart the
+# search for '{' after the error, so braces in leading prose don't sink the parse
+MAX_RESTARTS = 16
+
+_KEY, _COLON, _VALUE, _NEXT = range(4)
+_decoder = json.JSONDecoder()
+
+
+class JSONRepairError(ValueError):
+    def __init__(self, message: str, pos: int):
+        super().__init__(f"{message} at offset {pos}")
+        self.pos = pos
+
+
+class _Truncated(JSONRepairError):
+    pass
+
+
+class _Frame:
+    __slots__ = ("container", "is_dict", "key", "expect", "comma")
+
+    def __init__(self, container):
+        self.container = container
+        self.is_dict = isinstance(container, dict)
+        self.key = None
+        self.expect = _KEY if self.is_dict else _VALUE
+        self.comma = False
+
+
+class IncrementalJSONParser:
+    """
+    Incremental, tolerant parser for a single top-level JSON object.
+
+    feed() returns the events that became complete with the new text:
+      ("value", key, value)        a top-level member finished
+      ("item", key, index, value)  an element of a top-level array finished
+
+    finish() returns the parsed object once the input is complete, or
+    raises JSONRepairError. `repairs` lists (action, offset) pairs.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.done = False
+        self.value = None
+        self.repairs = []
+        self.error = None
+        self._first_error = None
+        self._pos = 0
+        self._stack = []
+        self._root_start = None
+        self._root_end = None
+        self._emitted = 0
+        self._restarts = 0
+        # Open string: index of its quote, where to resume scanning, splices to apply
+        self._string_start = None
+        self._string_scan = 0
+        self._string_fixes = None
+        self._string_is_key = False
+
+    def feed(self, chunk: str) -> list:
+        self.buffer += chunk
+        return self._run(final=False)
+
+    def finish(self):
+        self._run(final=True)
+        if self.error is not None:
+            raise self.error
+        if not self.done:
+            if self._root_start is None:
+                raise self._first_error or JSONRepairError("no JSON object found", len(self.buffer))
+            raise JSONRepairError(f"truncated: {len(self._stack)} unclosed containers", len(self.buffer))
+        tail = _WHITESPACE.match(self.buffer, self._root_end).end()
+        if tail < len(self.buffer) and ("ignored_trailing_text", self._root_end) not in self.repairs:
+            self.repairs.append(("ignored_trailing_text", self._root_end))
+        return self.value
+
+    def repair_counts(self) -> dict:
+        return dict(Counter(action for action, _ in self.repairs))
+
+    def _run(self, final: bool) -> list:
+        events = []
+        while not self.done and self.error is None:
+            try:
+                self._scan(events, final)
+                return events
+            except JSONRepairError as e:
+                if isinstance(e, _Truncated) or self._emitted or self._restarts >= MAX_RESTARTS:
+                    self.error = e
+                    return events
+                self._first_error = self._first_error or e
+                # Not the object we're after (e.g. "{braces}" in prose): look again past the error
+                self._restarts += 1
+                self._stack = []
+                self._string_start = None
+                self.repairs = []
+                self._pos = max(e.pos, self._root_start + 1)
+                self._root_start = None
+        return events
+
+    def _repair(self, action: str, pos: int) -> None:
+        self.repairs.append((action, pos))
+
+    def _scan(self, events: list, final: bool) -> None:
+        buf = self.buffer
+        n = len(buf)
+        i = self._pos
+        stack = self._stack
+
+        while i < n:
+            if self._string_start is not None:
+                i = self._scan_string(events, buf, final)
+                if self._string_start is not None:
+                    break
+                continue
+
+            if not stack:
+                start = buf.find("{", i)
+                if start < 0:
+                    i = n
+                    break
+                self._root_start = start
+                if _WHITESPACE.match(buf, 0).end() < start:
+                    self._repair("skipped_prefix", 0)
+                try:
+                    value, end = _decoder.raw_decode(buf, start)
+                except ValueError:
+                    stack.append(_Frame({}))
+                    i = start + 1
+                    continue
+                # Well-formed and complete already: emit what a walk would have
+                for key, member in value.items():
+                    if isinstance(member, list):
+                        events.extend(("item", key, index, item) for index, item in enumerate(member))
+                    events.append(("value", key, member))
+                self.value = value
+                self.done = True
+                self._root_end = end
+                i = end
+                break
+
+            ch = buf[i]
+            if ch in " \t\r\n":
+                i = _WHITESPACE.match(buf, i).end()
+                continue
+            if ch == "/":
+                end = self._skip_comment(buf, i, final)
+                if end is None:
+                    break
+                i = end
+                continue
+
+            frame = stack[-1]
+            if frame.is_dict:
+                if frame.expect == _KEY:
+                    if ch == '"':
+                        self._open_string(i, is_key=True)
+                        i += 1
+                    elif ch == "}":
+                        if frame.comma:
+                            self._repair("trailing_comma", i)
+                        i = self._close(events, i)
+                    elif ch == ",":
+                        self._repair("extra_comma", i)
+                        i += 1
+                    else:
+                        match = _BAREWORD.match(buf, i)
+                        if match is None:
+                            raise JSONRepairError(f"unexpected {ch!r} where a key belongs", i)
+                        if match.end() == n and not final:
+                            break
+                        self._repair("unquoted_key", i)
+                        frame.key = match.group()
+                        frame.expect = _COLON
+                        i = match.end()
+                elif frame.expect == _COLON:
+                    if ch != ":":
+                        raise JSONRepairError(f"expected ':' after key, got {ch!r}", i)
+                    frame.expect = _VALUE
+                    i += 1
+                elif frame.expect == _VALUE:
+                    end = self._begin_value(events, buf, i, final)
+                    if end is None:
+                        break
+                    i = end
+                else:
+                    if ch == ",":
+                        frame.expect = _KEY
+                        frame.comma = True
+                        i += 1
+                    elif ch == "}":
+                        i = self._close(events, i)
+                    elif ch == '"':
+                        self._repair("missing_comma", i)
+                        frame.expect = _KEY
+                    else:
+                        raise JSONRepairError(f"expected ',' or '}}', got {ch!r}", i)
+            else:
+                if frame.expect == _VALUE:
+                    if ch == "]":
+                        if frame.comma:
+                            self._repair("trailing_comma", i)
+                        i = self._close(events, i)
+                    elif ch == ",":
+                        self._repair("extra_comma", i)
+                        i += 1
+                    else:
+                        end = self._begin_value(events, buf, i, final)
+                        if end is None:
+                            break
+                        i = end
+                else:
+                    if ch == ",":
+                        frame.expect = _VALUE
+                        frame.comma = True
+                        i += 1
+                    elif ch == "]":
+                        i = self._close(events, i)
+                    elif ch in _VALUE_START or ch == '"':
+                        self._repair("missing_comma", i)
+                        frame.expect = _VALUE
+                    else:
+                        raise JSONRepairError(f"expected ',' or ']', got {ch!r}", i)
+
+            if self.done:
+                break
+
+        self._pos = i
+        if final and self._string_start is not None:
+            raise _Truncated("unterminated string", self._string_start)
+
+    def _skip_comment(self, buf: str, i: int, final: bool):
+        """End of the comment at i, None to wait for more text."""
+        n = len(buf)
+        if i + 1 >= n:
+            if final:
+                raise JSONRepairError("unexpected '/'", i)
+            return None
+        kind = buf[i + 1]
+        if kind == "/":
+            end = buf.find("\n", i + 2)
+            if end < 0:
+                if not final:
+                    return None
+                end = n
+        elif kind == "*":
+            end = buf.find("*/", i + 2)
+            if end < 0:
+                if final:
+                    raise _Truncated("unterminated comment", i)
+                return None
+            end += 2
+        else:
+            raise JSONRepairError("unexpected '/'", i)
+        self._repair("comment", i)
+        return end
+
+    def _begin_value(self, events: list, buf: str, i: int, final: bool):
+        """Position after the value starting at i (or inside it), None to wait for more text."""
+        ch = buf[i]
+        if ch in "{[":
+            if len(self._stack) <= FAST_PATH_DEPTH:
+                try:
+                    value, end = _decoder.raw_decode(buf, i)
+                except ValueError:
+                    pass
+                else:
+                    if ch == "[" and len(self._stack) == 1:
+                        key = self._stack[0].key
+                        for index, item in enumerate(value):
+                            events.append(("item", key, index, item))
+                        self._emitted += len(value)
+                    self._complete(events, value)
+                    return end
+            self._stack.append(_Frame({} if ch == "{" else []))
+            return i + 1
+        if ch == '"':
+            self._open_string(i, is_key=False)
+            return i + 1
+
+        n = len(buf)
+        # "1" may become "1.5" with the next chunk
+        if not final and _NUMBER_RUN.match(buf, i).end() == n:
+            return None
+        match = _NUMBER.match(buf, i)
+        if match is not None:
+            text = match.group()
+            self._complete(events, float(text) if any(c in text for c in ".eE") else int(text))
+            return match.end()
+
+        match = _BAREWORD.match(buf, i)
+        if match is None:
+            raise JSONRepairError(f"unexpected {ch!r} where a value belongs", i)
+        if match.end() == n and not final:
+            return None
+        word = match.group()
+        if word in _LITERALS:
+            value = _LITERALS[word]
+        elif word in _PYTHON_LITERALS:
+            self._repair("python_literal", i)
+            value = _PYTHON_LITERALS[word]
+        else:
+            raise JSONRepairError(f"unexpected {word!r} where a value belongs", i)
+        self._complete(events, value)
+        return match.end()
+
+    def _open_string(self, i: int, is_key: bool) -> None:
+        self._string_start = i
+        self._string_scan = i + 1
+        self._string_fixes = []
+        self._string_is_key = is_key
+
+    def _scan_string(self, events: list, buf: str, final: bool) -> int:
+        n = len(buf)
+        fixes = self._string_fixes
+        j = self._string_scan
+        while True:
+            j = _STRING_RUN.match(buf, j).end()
+            if j >= n:
+                break
+            c = buf[j]
+            if c == '"':
+                return self._close_string(events, buf, j)
+            if c == "\\":
+                if j + 1 >= n:
+                    break
+                escape = buf[j + 1]
+                if escape in _ESCAPES:
+                    j += 2
+                    continue
+                if escape == "u":
+                    if j + 6 > n and not final:
+                        break
+                    if _HEX4.match(buf, j + 2):
+                        j += 6
+                        continue
+                self._repair("invalid_escape", j)
+                fixes.append((j, 1, "\\\\"))
+                j += 1
+            else:
+                self._repair("control_character", j)
+                fixes.append((j, 1, _CONTROL_ESCAPES.get(c, "")))
+                j += 1
+
+        if final:
+            raise _Truncated("unterminated string", self._string_start)
+        self._string_scan = j
+        return n
+
+    def _close_string(self, events: list, buf: str, end: int) -> int:
+        start = self._string_start
+        fixes = self._string_fixes
+        if fixes:
+            pieces = []
+            last = start
+            for pos, length, replacement in fixes:
+                pieces.append(buf[last:pos])
+                pieces.append(replacement)
+                last = pos + length
+            pieces.append(buf[last:end + 1])
+            value = scanstring("".join(pieces), 1, True)[0]
+        else:
+            value = scanstring(buf, start + 1, True)[0]
+        self._string_start = None
+        self._string_fixes = None
+        if self._string_is_key:
+            frame = self._stack[-1]
+            frame.key = value
+            frame.expect = _COLON
+        else:
+            self._complete(events, value)
+        return end + 1
+
+    def _close(self, events: list, i: int) -> int:
+        frame = self._stack.pop()
+        if not self._stack:
+            self.value = frame.container
+            self.done = True
+            self._root_end = i + 1
+        else:
+            self._complete(events, frame.container)
+        return i + 1
+
+    def _complete(self, events: list, value) -> None:
+        frame = self._stack[-1]
+        if frame.is_dict:
+            frame.container[frame.key] = value
+        else:
+            frame.container.append(value)
+        frame.expect = _NEXT
+        frame.comma = False
+
+        depth = len(self._stack)
+        if depth == 1:
+            events.append(("value", frame.key, value))
+            self._emitted += 1
+        elif depth == 2 and not frame.is_dict:
+            events.append(("item", self._stack[0].key, len(frame.container) - 1, value))
+            self._emitted += 1
+
+
+def parse(text: str):
+    """
+    One-shot parse: (object, repairs). Well-formed input goes straight
+    through the C decoder. Raises JSONRepairError.
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return parser.finish(), parser.repairs
@@ -0,0 +1,42 @@
+import json
+import os
+import random
+import sys
+from datetime import datetime
+
+# One JSON object per line on stdout: {"ts", "level", "event", ...fields}.
+# Warnings and errors are always written. Debug events fire on every request
+# (plan generated, JSON repaired, fallback wiring), so only a sample of
+# LOG_DEBUG_SAMPLE_RATE is written, tagged with the rate so counts can be
+# scaled back up; the exact numbers are in /metrics.
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "2000"))
+
+
+def _field(value):
+    if isinstance(value, str) and len(value) > LOG_MAX_FIELD_CHARS:
+        return value[:LOG_MAX_FIELD_CHARS] + f"… ({len(value)} chars)"
+    return value
+
+
+def log(level: str, event: str, **fields) -> None:
+    sampled = level == "debug" and LOG_DEBUG_SAMPLE_RATE < 1
+    if sampled and random.random() >= LOG_DEBUG_SAMPLE_RATE:
+        return
+    record = {"ts": datetime.utcnow().isoformat(timespec="milliseconds") + "Z", "level": level, "event": event}
+    if sampled:
+        record["sample_rate"] = LOG_DEBUG_SAMPLE_RATE
+    record.update((key, _field(value)) for key, value in fields.items())
+    sys.stdout.write(json.dumps(record, default=str) + "\n")
+
+
+def debug(event: str, **fields) -> None:
+    log("debug", event, **fields)
+
+
+def warning(event: str, **fields) -> None:
+    log("warning", event, **fields)
+
+
+def error(event: str, **fields) -> None:
+    log("error", event, **fields)
@@ -1,18 +1,64 @@
+from dotenv import load_dotenv
+
+# Before the app's modules are imported: they read their settings from the environment at import time
+load_dotenv()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import os
 
-from database import engine, Base
-import models # Explicit import to register models
-from routers import auth, builds
+from database import async_engine
+from routers import artifacts, auth, builds, parts
+from plan_cache import plan_cache
+from ai_engine import GEMINI_API_KEY, generation_flights, model_router
+from model_router import gemini_sdk
+from jobs import job_queue
+from auth import pwd_context, user_cache
+from cad_pool import cad_pool
+from artifact_store import ARTIFACT_GC_INTERVAL_SECONDS, artifact_store
+from upstream import gemini_limiter
+from feed_cache import FeedCacheMiddleware, feed_cache
+import metrics
 
-load_dotenv()
+# Pay for the Gemini SDK import, bcrypt and a first DB connection during startup, so the
+# worker only reports ready (and takes traffic) once the first generation won't stall on them
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "0") == "1"
 
-# Create tables (simple migration)
-Base.metadata.create_all(bind=engine)
+# Schema is managed by Alembic (`alembic upgrade head`), not at startup
 
-app = FastAPI(title="Prawler API", description="Modo Clone Backend API")
+async def warm_up():
+    if GEMINI_API_KEY:
+        await run_in_threadpool(gemini_sdk)
+    await run_in_threadpool(lambda: pwd_context().handler("bcrypt").get_backend())
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    os.makedirs("static", exist_ok=True)
+    await job_queue.start()
+    # Warm CAD workers in the background; the first jobs wait for them if needed
+    if cad_pool.size > 0:
+        await cad_pool.start()
+    if STARTUP_WARMUP:
+        await warm_up()
+    sweeper = asyncio.create_task(artifact_store.run_sweeper()) if ARTIFACT_GC_INTERVAL_SECONDS > 0 else None
+    yield
+    if sweeper is not None:
+        sweeper.cancel()
+    await job_queue.stop()
+    await cad_pool.stop()
+    await async_engine.dispose()
+
+app = FastAPI(title="Prawler API", description="Modo Clone Backend API", lifespan=lifespan)
+
+# Added before CORS so CORS (the outer middleware) still decorates cached feed responses
+app.add_middleware(FeedCacheMiddleware, cache=feed_cache)
 
 # CORS Setup - ALLOW ALL for debugging
 origins = ["*"]
@@ -23,17 +69,36 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Content-Range", "X-Cache", "X-Batch-Id", "X-Search-Truncated"],
 )
 
-from fastapi.staticfiles import StaticFiles
-import os
-if not os.path.exists("static"):
-    os.makedirs("static")
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Outermost, so in-flight counts and latencies cover everything above
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(builds.router)
+app.include_router(artifacts.router)
+app.include_router(parts.router)
 
 @app.get("/")
 def read_root():
     return {"message": "Prawler API is running"}
+
+@app.get("/stats")
+async def read_stats():
+    return {
+        "plan_cache": plan_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "single_flight": generation_flights.stats(),
+        "jobs": await job_queue.stats(),
+        "cad_pool": cad_pool.stats(),
+        "cad_artifacts": artifact_store.stats(),
+        "upstream": gemini_limiter.stats(),
+        "model_router": model_router.stats(),
+        "feed_cache": feed_cache.stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """Prometheus text format: stage latencies, upstream tokens, DB pool, HTTP requests."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,123 @@
+import json
+import struct
+
+import numpy as np
+
+# Writers for meshes that were tessellated once and are saved in several
+# formats. Only imported inside CAD worker processes (via cad_engine).
+
+_STL_RECORD = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (3, 3)),
+    ("attr", "<u2"),
+])
+
+_GLB_MAGIC = 0x46546C67  # "glTF"
+_CHUNK_JSON = 0x4E4F534A
+_CHUNK_BIN = 0x004E4942
+
+# glTF component types
+_INT8 = 5120
+_UINT16 = 5123
+_UINT32 = 5125
+
+
+def face_normals(vertices: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """Unnormalized (area-weighted) normal of every triangle."""
+    corners = vertices[triangles]
+    return np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    lengths = np.linalg.norm(vectors, axis=1, keepdims=True)
+    lengths[lengths == 0] = 1
+    return vectors / lengths
+
+
+def write_binary_stl(path: str, vertices: np.ndarray, triangles: np.ndarray) -> int:
+    """Writes a binary STL and returns its size in bytes."""
+    records = np.zeros(len(triangles), dtype=_STL_RECORD)
+    records["normal"] = _normalize(face_normals(vertices, triangles))
+    records["vertices"] = vertices[triangles]
+    with open(path, "wb") as f:
+        f.write(b"prawler binary STL".ljust(80, b"\0"))
+        f.write(struct.pack("<I", len(triangles)))
+        f.write(records.tobytes())
+    return 84 + records.nbytes
+
+
+def _pad4(data: bytes, fill: bytes = b"\0") -> bytes:
+    return data + fill * (-len(data) % 4)
+
+
+def write_quantized_glb(path: str, vertices: np.ndarray, triangles: np.ndarray) -> int:
+    """
+    Writes a single-mesh GLB using KHR_mesh_quantization and returns its size
+    in bytes. Positions are stored as uint16 on the mesh's bounding box, with
+    the node's scale/translation mapping them back to millimetres; normals
+    are int8. About 12 bytes per vertex plus 6 (or 12) per triangle,
+    versus 50 per triangle for binary STL.
+    """
+    lo = vertices.min(axis=0)
+    extent = vertices.max(axis=0) - lo
+    extent[extent == 0] = 1
+    scale = extent / 65535.0
+    positions = np.zeros((len(vertices), 4), dtype="<u2")  # xyz + pad, 8-byte stride
+    positions[:, :3] = np.rint((vertices - lo) / scale)
+
+    # Area-weighted vertex normals; OCP emits separate vertices per face, so edges stay sharp
+    vertex_normals = np.zeros_like(vertices)
+    per_face = face_normals(vertices, triangles)
+    for corner in range(3):
+        np.add.at(vertex_normals, triangles[:, corner], per_face)
+    normals = np.zeros((len(vertices), 4), dtype="i1")  # xyz + pad, 4-byte stride
+    normals[:, :3] = np.rint(_normalize(vertex_normals) * 127)
+
+    index_type, index_dtype = (_UINT16, "<u2") if len(vertices) < 65536 else (_UINT32, "<u4")
+    indices = triangles.astype(index_dtype).ravel()
+
+    views = []
+    binary = b""
+    for data, stride, target in (
+        (positions.tobytes(), 8, 34962),
+        (normals.tobytes(), 4, 34962),
+        (indices.tobytes(), None, 34963),
+    ):
+        view = {"buffer": 0, "byteOffset": len(binary), "byteLength": len(data), "target": target}
+        if stride:
+            view["byteStride"] = stride
+        views.append(view)
+        binary += _pad4(data)
+
+    document = {
+        "asset": {"version": "2.0", "generator": "prawler"},
+        "extensionsUsed": ["KHR_mesh_quantization"],
+        "extensionsRequired": ["KHR_mesh_quantization"],
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0, "translation": lo.tolist(), "scale": scale.tolist()}],
+        "meshes": [{"primitives": [{
+            "attributes": {"POSITION": 0, "NORMAL": 1},
+            "indices": 2,
+            "mode": 4,
+        }]}],
+        "accessors": [
+            {
+                "bufferView": 0, "componentType": _UINT16, "count": len(vertices), "type": "VEC3",
+                "min": positions[:, :3].min(axis=0).tolist(), "max": positions[:, :3].max(axis=0).tolist(),
+            },
+            {"bufferView": 1, "componentType": _INT8, "normalized": True, "count": len(vertices), "type": "VEC3"},
+            {"bufferView": 2, "componentType": index_type, "count": len(indices), "type": "SCALAR"},
+        ],
+        "bufferViews": views,
+        "buffers": [{"byteLength": len(binary)}],
+    }
+    json_chunk = _pad4(json.dumps(document, separators=(",", ":")).encode("utf-8"), b" ")
+    total = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<III", _GLB_MAGIC, 2, total))
+        f.write(struct.pack("<II", len(json_chunk), _CHUNK_JSON))
+        f.write(json_chunk)
+        f.write(struct.pack("<II", len(binary), _CHUNK_BIN))
+        f.write(binary)
+    return total
@@ -0,0 +1,266 @@
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# In-process metrics in the Prometheus text format (GET /metrics), without a
+# client library: counters, gauges and fixed-bucket histograms, optionally
+# with labels. Recording is a dict lookup plus a bisect, so spans can wrap
+# per-request work; rendering only happens on scrape.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Seconds; covers a cached validate (~30 µs) up to a slow model call or CAD export
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+_registry: List["Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children: Dict[Tuple, object] = {}
+        _registry.append(self)
+
+    def labels(self, *values):
+        """The child for these label values (created on first use); call sites may keep it."""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items(), key=lambda item: tuple(map(str, item[0]))):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_label_text(self.label_names, values)} {_number(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    """A value that goes up and down. With `collect`, read at scrape time instead."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), collect: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def render(self) -> List[str]:
+        if self.collect is not None:
+            try:
+                self.set(self.collect())
+            except Exception:
+                pass
+        return super().render()
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _render_child(self, values, child) -> List[str]:
+        lines = []
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            running += count
+            labels = _label_text(self.label_names, values, f'le="{_number(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {running}")
+        labels = _label_text(self.label_names, values)
+        lines.append(f"{self.name}_sum{labels} {_number(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- generation pipeline -----------------------------------------------------
+
+STAGE_SECONDS = Histogram(
+    "prawler_stage_seconds", "Time spent per generation pipeline stage.", ["stage"]
+)
+STAGE_ERRORS = Counter(
+    "prawler_stage_errors_total", "Stages that ended with an exception.", ["stage"]
+)
+UPSTREAM_TOKENS = Counter(
+    "prawler_upstream_tokens_total", "Model tokens per direction (estimated at ~4 chars/token when the reply has no usage).",
+    ["model", "direction"],
+)
+UPSTREAM_RESPONSE_BYTES = Histogram(
+    "prawler_upstream_response_bytes", "Size of raw model replies.", ["model"], buckets=SIZE_BUCKETS
+)
+JSON_REPAIRS = Counter(
+    "prawler_json_repairs_total", "Repairs applied to model JSON, per repair action.", ["action"]
+)
+
+
+class span:
+    """
+    Times a block into prawler_stage_seconds{stage=...}; exceptions also
+    count in prawler_stage_errors_total. A class rather than a
+    @contextmanager, which costs twice as much per use.
+    """
+
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not METRICS_ENABLED:
+            return
+        STAGE_SECONDS.labels(self.stage).observe(time.perf_counter() - self.started)
+        # Not CancelledError: a cancelled hedge or a client that went away isn't a failing stage
+        if exc_type is not None and issubclass(exc_type, Exception):
+            STAGE_ERRORS.labels(self.stage).inc()
+
+
+def record_upstream(model: str, prompt: str, reply: str, usage=None) -> None:
+    """Token counts and reply size for one model call; `usage` is the SDK's usage_metadata when it has one."""
+    if not METRICS_ENABLED:
+        return
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or len(prompt) // 4
+    output_tokens = getattr(usage, "candidates_token_count", None) or len(reply) // 4
+    UPSTREAM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+    UPSTREAM_TOKENS.labels(model, "output").inc(output_tokens)
+    UPSTREAM_RESPONSE_BYTES.labels(model).observe(len(reply.encode("utf-8")))
+
+
+# --- HTTP ----------------------------------------------------------------------
+
+REQUESTS_IN_FLIGHT = Gauge("prawler_http_requests_in_flight", "HTTP requests being served.")
+REQUEST_SECONDS = Histogram(
+    "prawler_http_request_seconds", "HTTP request latency (until the last body chunk is sent).",
+    ["method", "route", "status"],
+)
+
+
+class MetricsMiddleware:
+    """
+    Counts in-flight requests and times each one by route template
+    (/builds/{build_id}, not /builds/42) so label cardinality stays bounded.
+    Middleware that answers before routing (FeedCacheMiddleware) names its
+    route in scope["route_template"].
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+        in_flight = REQUESTS_IN_FLIGHT.labels()
+        in_flight.inc()
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            template = getattr(scope.get("route"), "path", None) or scope.get("route_template", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], template, status).observe(time.perf_counter() - started)
@@ -0,0 +1,59 @@
+"""initial schema (users, builds) as previously created by create_all
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("email", sa.String(), nullable=True),
+        sa.Column("password_hash", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+    op.create_index("ix_users_id", "users", ["id"], unique=False)
+
+    op.create_table(
+        "builds",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("prompt", sa.String(), nullable=True),
+        sa.Column("device_name", sa.String(), nullable=True),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("parts_json", sa.JSON(), nullable=True),
+        sa.Column("wiring_json", sa.JSON(), nullable=True),
+        sa.Column("firmware_code", sa.Text(), nullable=True),
+        sa.Column("enclosure_md", sa.Text(), nullable=True),
+        sa.Column("openscad_code", sa.String(), nullable=True),
+        sa.Column("cad_script", sa.String(), nullable=True),
+        sa.Column("openscad_lid", sa.String(), nullable=True),
+        sa.Column("openscad_body", sa.String(), nullable=True),
+        sa.Column("stl_lid_url", sa.String(), nullable=True),
+        sa.Column("stl_body_url", sa.String(), nullable=True),
+        sa.Column("analysis", sa.String(), nullable=True),
+        sa.Column("steps_json", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_builds_id", "builds", ["id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_builds_id", table_name="builds")
+    op.drop_table("builds")
+    op.drop_index("ix_users_id", table_name="users")
+    op.drop_index("ix_users_email", table_name="users")
+    op.drop_table("users")
@@ -0,0 +1,35 @@
+"""plan_cache table for cached generation results
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Databases that ran the app before migrations existed already have it (create_all)
+    if sa.inspect(op.get_bind()).has_table("plan_cache"):
+        return
+    op.create_table(
+        "plan_cache",
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("model_name", sa.String(), nullable=True),
+        sa.Column("prompt", sa.String(), nullable=True),
+        sa.Column("plan_json", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("key"),
+    )
+    op.create_index("ix_plan_cache_created_at", "plan_cache", ["created_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_plan_cache_created_at", table_name="plan_cache")
+    op.drop_table("plan_cache")
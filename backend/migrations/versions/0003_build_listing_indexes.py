@@ -0,0 +1,36 @@
+"""indexes for the per-user and public build listings
+
+Both listings page by (created_at, id) newest first:
+  WHERE user_id = ? ORDER BY created_at DESC, id DESC
+  ORDER BY created_at DESC, id DESC LIMIT ?
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_builds_user_id_created_at",
+        "builds",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+    )
+    op.create_index(
+        "ix_builds_created_at",
+        "builds",
+        [sa.text("created_at DESC"), sa.text("id DESC")],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_builds_created_at", table_name="builds")
+    op.drop_index("ix_builds_user_id_created_at", table_name="builds")
@@ -0,0 +1,39 @@
+"""content-addressed CAD artifacts shared between builds
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cad_artifacts",
+        sa.Column("digest", sa.String(length=64), nullable=False),
+        sa.Column("body_url", sa.String(), nullable=True),
+        sa.Column("lid_url", sa.String(), nullable=True),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("digest"),
+    )
+    # Existing builds keep their per-build uuid files and no digest
+    with op.batch_alter_table("builds") as batch_op:
+        batch_op.add_column(sa.Column("cad_digest", sa.String(length=64), nullable=True))
+        batch_op.create_index("ix_builds_cad_digest", ["cad_digest"], unique=False)
+        batch_op.create_foreign_key("fk_builds_cad_digest", "cad_artifacts", ["cad_digest"], ["digest"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("builds") as batch_op:
+        batch_op.drop_constraint("fk_builds_cad_digest", type_="foreignkey")
+        batch_op.drop_index("ix_builds_cad_digest")
+        batch_op.drop_column("cad_digest")
+    op.drop_table("cad_artifacts")
@@ -0,0 +1,28 @@
+"""levels of detail exported for a build's CAD parts
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("builds") as batch_op:
+        batch_op.add_column(sa.Column("mesh_variants", sa.JSON(), nullable=True))
+    with op.batch_alter_table("cad_artifacts") as batch_op:
+        batch_op.add_column(sa.Column("mesh_variants", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("cad_artifacts") as batch_op:
+        batch_op.drop_column("mesh_variants")
+    with op.batch_alter_table("builds") as batch_op:
+        batch_op.drop_column("mesh_variants")
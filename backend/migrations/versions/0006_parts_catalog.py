@@ -0,0 +1,49 @@
+"""normalized parts catalog and build -> part links
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "parts",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("canonical_name", sa.String(length=200), nullable=False),
+        sa.Column("type", sa.String(length=50), nullable=False),
+        sa.Column("name", sa.String(length=200), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("canonical_name", "type", name="uq_parts_canonical_name_type"),
+    )
+    op.create_index("ix_parts_type", "parts", ["type"])
+    op.create_table(
+        "build_parts",
+        sa.Column("build_id", sa.Integer(), nullable=False),
+        sa.Column("part_id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False, server_default="1"),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["build_id"], ["builds.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["part_id"], ["parts.id"]),
+        sa.PrimaryKeyConstraint("build_id", "part_id"),
+    )
+    op.create_index("ix_build_parts_part_id_build_id", "build_parts", ["part_id", "build_id"])
+    op.create_index("ix_build_parts_created_at_part_id", "build_parts", ["created_at", "part_id", "quantity"])
+    # Existing builds are linked by `python backfill_parts.py`
+
+
+def downgrade() -> None:
+    op.drop_index("ix_build_parts_created_at_part_id", table_name="build_parts")
+    op.drop_index("ix_build_parts_part_id_build_id", table_name="build_parts")
+    op.drop_table("build_parts")
+    op.drop_index("ix_parts_type", table_name="parts")
+    op.drop_table("parts")
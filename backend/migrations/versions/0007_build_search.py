@@ -0,0 +1,81 @@
+"""full-text search over builds
+
+SQLite: an FTS5 table (rowid = builds.id) kept in sync by triggers.
+Postgres: a generated, GIN-indexed tsvector column on builds.
+Both index device_name, prompt, description and the part names in
+parts_json; see search.py for the queries.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+# Space-separated part names of a parts_json list (non-objects and invalid JSON are skipped)
+SQLITE_PART_NAMES = """(
+    SELECT group_concat(json_extract(value, '$.name'), ' ')
+    FROM json_each(CASE WHEN json_valid({row}.parts_json) THEN {row}.parts_json ELSE '[]' END)
+    WHERE type = 'object'
+)"""
+
+SQLITE_INSERT = """
+    INSERT INTO builds_fts(rowid, device_name, prompt, description, parts)
+    VALUES (new.id, new.device_name, new.prompt, new.description, {parts});
+""".format(parts=SQLITE_PART_NAMES.format(row="new"))
+
+POSTGRES_VECTOR = """
+    setweight(to_tsvector('english', coalesce(device_name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(jsonb_path_query_array(parts_json::jsonb, '$[*].name')::text, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(prompt, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'C')
+"""
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute("""
+            CREATE VIRTUAL TABLE builds_fts USING fts5(
+                device_name, prompt, description, parts,
+                tokenize = 'porter unicode61 remove_diacritics 2'
+            )
+        """)
+        # Column weights for ORDER BY rank: a hit in the name counts most, the description least
+        op.execute("INSERT INTO builds_fts(builds_fts, rank) VALUES ('rank', 'bm25(10.0, 3.0, 2.0, 4.0)')")
+        op.execute(f"""
+            INSERT INTO builds_fts(rowid, device_name, prompt, description, parts)
+            SELECT id, device_name, prompt, description, {SQLITE_PART_NAMES.format(row="builds")} FROM builds
+        """)
+        op.execute(f"CREATE TRIGGER builds_fts_insert AFTER INSERT ON builds BEGIN {SQLITE_INSERT} END")
+        op.execute(f"""
+            CREATE TRIGGER builds_fts_update AFTER UPDATE OF device_name, prompt, description, parts_json ON builds
+            BEGIN
+                DELETE FROM builds_fts WHERE rowid = old.id;
+                {SQLITE_INSERT}
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER builds_fts_delete AFTER DELETE ON builds BEGIN
+                DELETE FROM builds_fts WHERE rowid = old.id;
+            END
+        """)
+    elif dialect == "postgresql":
+        op.execute(f"ALTER TABLE builds ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({POSTGRES_VECTOR}) STORED")
+        op.execute("CREATE INDEX ix_builds_search_vector ON builds USING GIN (search_vector)")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for trigger in ("builds_fts_insert", "builds_fts_update", "builds_fts_delete"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS builds_fts")
+    elif dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_builds_search_vector")
+        op.execute("ALTER TABLE builds DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,47 @@
+"""batch generation requests and their per-prompt items
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "batches",
+        sa.Column("id", sa.String(length=32), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_batches_user_id", "batches", ["user_id"])
+    op.create_table(
+        "batch_items",
+        sa.Column("batch_id", sa.String(length=32), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("prompt", sa.String(), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("build_id", sa.Integer(), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("warnings", sa.JSON(), nullable=True),
+        sa.ForeignKeyConstraint(["batch_id"], ["batches.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["build_id"], ["builds.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("batch_id", "position"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("batch_items")
+    op.drop_index("ix_batches_user_id", table_name="batches")
+    op.drop_table("batches")
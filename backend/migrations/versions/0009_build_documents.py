@@ -0,0 +1,27 @@
+"""serialized GET /builds/{id} documents stored with each build
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing rows keep NULL and get their document on first read
+    with op.batch_alter_table("builds") as batch_op:
+        batch_op.add_column(sa.Column("document", sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column("document_etag", sa.String(34), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("builds") as batch_op:
+        batch_op.drop_column("document_etag")
+        batch_op.drop_column("document")
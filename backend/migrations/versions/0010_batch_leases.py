@@ -0,0 +1,26 @@
+"""lease columns so one worker at a time runs a batch
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("batches") as batch_op:
+        batch_op.add_column(sa.Column("lease_owner", sa.String(32), nullable=True))
+        batch_op.add_column(sa.Column("lease_until", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("batches") as batch_op:
+        batch_op.drop_column("lease_until")
+        batch_op.drop_column("lease_owner")
@@ -0,0 +1,309 @@
+import asyncio
+import bisect
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional
+
+from upstream import gemini_limiter, UpstreamUnavailable
+from metrics import record_upstream, span
+import logs
+
+# Routes plan generation over an ordered list of model backends. The first
+# backend gets every request; if it hasn't answered by its own recent latency
+# percentile, a hedged request goes to the next backend (or the same one
+# again) and whichever reply parses first wins. A reply that fails to parse
+# falls through to the next backend.
+GEMINI_MODELS = [m.strip() for m in os.getenv("GEMINI_MODELS", "gemini-flash-latest").split(",") if m.strip()]
+MODEL_HEDGE_ENABLED = os.getenv("MODEL_HEDGE_ENABLED", "1") == "1"
+MODEL_HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", "0.9"))
+MODEL_HEDGE_MIN_SAMPLES = int(os.getenv("MODEL_HEDGE_MIN_SAMPLES", "20"))
+MODEL_HEDGE_DEFAULT_SECONDS = float(os.getenv("MODEL_HEDGE_DEFAULT_SECONDS", "20"))
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Base URL of a Gemini-compatible REST API, e.g. the local fake in benchmarks/fake_gemini.py
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+_genai = None
+
+
+def gemini_sdk():
+    """
+    google.generativeai, imported and configured on first use. The import is
+    ~0.6 s, most of the API's cold start; STARTUP_WARMUP pays it before the
+    worker reports ready instead of on the first generation.
+    """
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+
+        if GEMINI_API_KEY:
+            genai.configure(
+                api_key=GEMINI_API_KEY,
+                transport="rest",
+                client_options={"api_endpoint": GEMINI_API_ENDPOINT} if GEMINI_API_ENDPOINT else None,
+            )
+        _genai = genai
+    return _genai
+
+
+def supported_generation_config(config: Optional[dict]) -> Optional[dict]:
+    """
+    `config` without the fields the installed SDK doesn't know. JSON mode
+    (response_mime_type) needs a newer SDK than the pinned 0.3.2; without it,
+    parse_plan_text strips fences and prose around the plan.
+    """
+    fields = getattr(gemini_sdk().types.GenerationConfig, "__dataclass_fields__", None)
+    if not config or fields is None:
+        return config
+    return {key: value for key, value in config.items() if key in fields} or None
+
+
+class BlockedResponse(Exception):
+    """The backend answered, but with no content (safety filters)."""
+
+
+class PlanParseError(Exception):
+    """The backend's reply could not be repaired into a plan; `error` is parse_plan_text's error dict."""
+
+    def __init__(self, error: dict):
+        super().__init__(error.get("error", "Failed to parse plan"))
+        self.error = error
+
+
+class LatencyHistogram:
+    """
+    Log-spaced latency buckets (50 ms to ~5 min). Counts are halved every
+    `decay_every` observations so percentiles follow recent behaviour.
+    """
+
+    BOUNDS = [0.05 * 1.25 ** i for i in range(40)]
+
+    def __init__(self, decay_every: int = 500):
+        self.decay_every = decay_every
+        self.counts = [0.0] * (len(self.BOUNDS) + 1)
+        self.total = 0.0
+        self.observations = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.total += 1
+        self.observations += 1
+        if self.observations % self.decay_every == 0:
+            self.counts = [c / 2 for c in self.counts]
+            self.total /= 2
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper bound of the bucket holding the p-quantile, or None with no data."""
+        if not self.total:
+            return None
+        target = p * self.total
+        running = 0.0
+        for i, count in enumerate(self.counts):
+            running += count
+            if running >= target and count:
+                return self.BOUNDS[i] if i < len(self.BOUNDS) else self.BOUNDS[-1]
+        return self.BOUNDS[-1]
+
+
+class ModelBackend(ABC):
+    """One model endpoint. generate() returns the raw reply text."""
+
+    name = "backend"
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.calls = 0
+        self.wins = 0
+        self.failures = 0
+
+    @abstractmethod
+    async def generate(self, full_prompt: str) -> str:
+        ...
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "wins": self.wins,
+            "failures": self.failures,
+            "p50_seconds": self.latency.percentile(0.5),
+            "p90_seconds": self.latency.percentile(0.9),
+            "p99_seconds": self.latency.percentile(0.99),
+        }
+
+
+class GeminiBackend(ModelBackend):
+    def __init__(self, model_name: str, safety_settings: list, generation_config: dict, expected_output_tokens: int):
+        super().__init__()
+        self.name = model_name
+        self.model_name = model_name
+        self.safety_settings = safety_settings
+        self.generation_config = generation_config
+        self.expected_output_tokens = expected_output_tokens
+
+    async def generate(self, full_prompt: str) -> str:
+        model = gemini_sdk().GenerativeModel(self.model_name)
+        # Sync SDK call in a thread, behind the concurrency/rate limiter with retries
+        response = await gemini_limiter.call(
+            model.generate_content,
+            full_prompt,
+            safety_settings=self.safety_settings,
+            generation_config=supported_generation_config(self.generation_config),
+            tokens=len(full_prompt) // 4 + self.expected_output_tokens,
+        )
+        if not response.parts:
+            logs.warning("model_response_blocked", model=self.model_name, feedback=str(response.prompt_feedback))
+            raise BlockedResponse(str(response.prompt_feedback))
+        text = response.text
+        gemini_limiter.tpm.adjust(len(text) // 4 - self.expected_output_tokens)
+        record_upstream(self.model_name, full_prompt, text, getattr(response, "usage_metadata", None))
+        return text
+
+
+class FakeBackend(ModelBackend):
+    """
+    In-process backend for tests and benchmarks. `reply` is the text to
+    return (or an exception to raise), or a callable producing either;
+    `latency` is seconds or a callable returning seconds.
+    """
+
+    def __init__(self, name: str, reply="{}", latency=0.0):
+        super().__init__()
+        self.name = name
+        self.reply = reply
+        self.latency_source = latency
+
+    async def generate(self, full_prompt: str) -> str:
+        delay = self.latency_source() if callable(self.latency_source) else self.latency_source
+        await asyncio.sleep(delay)
+        reply = self.reply(full_prompt) if callable(self.reply) else self.reply
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        backends: List[ModelBackend],
+        hedge_enabled: bool = True,
+        hedge_percentile: float = 0.9,
+        hedge_min_samples: int = 20,
+        hedge_default_seconds: float = 20,
+    ):
+        if not backends:
+            raise ValueError("ModelRouter needs at least one backend")
+        self.backends = backends
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_default_seconds = hedge_default_seconds
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+
+    @property
+    def name(self) -> str:
+        """Identifies the routing setup; part of the plan cache key."""
+        return "+".join(backend.name for backend in self.backends)
+
+    def hedge_delay(self, backend: ModelBackend) -> float:
+        if backend.latency.total < self.hedge_min_samples:
+            return self.hedge_default_seconds
+        return backend.latency.percentile(self.hedge_percentile)
+
+    async def generate(self, full_prompt: str, parse: Callable[[str], dict]):
+        """
+        Returns (parsed_plan, backend_name). `parse` is the JSON repair
+        pipeline; a reply it rejects counts as a failure of that backend.
+        Raises the last failure if no backend produced a plan.
+        """
+        self.requests += 1
+        pending = {}  # task -> backend
+        queue = list(self.backends)
+        primary = queue.pop(0)
+        hedge_task = None
+        hedge_at = None
+        last_error = None
+
+        def launch(backend):
+            backend.calls += 1
+            task = asyncio.ensure_future(self._attempt(backend, full_prompt, parse))
+            pending[task] = backend
+            return task
+
+        try:
+            launch(primary)
+            if self.hedge_enabled:
+                hedge_at = time.monotonic() + self.hedge_delay(primary)
+
+            while pending:
+                timeout = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # The primary is slower than its recent percentile: hedge once
+                    hedge_at = None
+                    self.hedges += 1
+                    hedge_task = launch(queue.pop(0) if queue else primary)
+                    continue
+
+                for task in done:
+                    backend = pending.pop(task)
+                    try:
+                        data = task.result()
+                    except Exception as e:
+                        backend.failures += 1
+                        last_error = e
+                        continue
+                    backend.wins += 1
+                    if task is hedge_task:
+                        self.hedge_wins += 1
+                    return data, backend.name
+
+                if not pending and queue:
+                    # Everything in flight failed; fall back to the next backend without hedging
+                    self.fallbacks += 1
+                    hedge_at = None
+                    launch(queue.pop(0))
+        finally:
+            for task in pending:
+                task.cancel()
+                # A cancelled thread-backed call only finishes later; don't leave its outcome unretrieved
+                task.add_done_callback(_consume)
+
+        raise last_error
+
+    async def _attempt(self, backend: ModelBackend, full_prompt: str, parse: Callable[[str], dict]) -> dict:
+        started = time.monotonic()
+        try:
+            with span("model_call"):
+                text = await backend.generate(full_prompt)
+        except asyncio.CancelledError:
+            # Not a latency sample: cancelled calls (mostly hedge losers) would skew the hedge threshold
+            raise
+        except UpstreamUnavailable:
+            raise
+        except Exception:
+            backend.latency.observe(time.monotonic() - started)
+            raise
+        backend.latency.observe(time.monotonic() - started)
+        data = parse(text)
+        if "error" in data:
+            raise PlanParseError(data)
+        return data
+
+    def stats(self) -> dict:
+        return {
+            "backends": {backend.name: dict(backend.stats(), hedge_after_seconds=self.hedge_delay(backend)) for backend in self.backends},
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+        }
+
+
+def _consume(task: asyncio.Task) -> None:
+    if not task.cancelled():
+        task.exception()
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, JSON, Index, LargeBinary, UniqueConstraint
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 from database import Base
 
@@ -34,7 +34,110 @@ class Build(Base):
     stl_body_url = Column(String, nullable=True)
     analysis = Column(String, nullable=True) # Analysis of the design
     steps_json = Column(JSON)      # Assembly steps
+    cad_digest = Column(String(64), ForeignKey("cad_artifacts.digest"), nullable=True, index=True) # Shared STL artifact
+    mesh_variants = Column(JSON, nullable=True) # {"body"|"lid": {lod: {stl, glb, sizes}}}, coarse to fine
+    # The GET /builds/{id} body, serialized on every write (crud.set_document); NULL on rows
+    # older than migration 0009 until their first read
+    document = deferred(Column(LargeBinary, nullable=True))
+    document_etag = Column(String(34), nullable=True)
     
     created_at = Column(DateTime, default=datetime.utcnow)
     
     owner = relationship("User", back_populates="builds")
+
+    # Serve the keyset-paginated listings (see migrations 0003)
+    __table_args__ = (
+        Index("ix_builds_user_id_created_at", user_id, created_at.desc(), id.desc()),
+        Index("ix_builds_created_at", created_at.desc(), id.desc()),
+    )
+
+    @classmethod
+    def from_plan(cls, user_id: int, prompt: str, build_data: dict) -> "Build":
+        """Maps a post-processed plan from ai_engine onto a new (unsaved) Build row."""
+        return cls(
+            user_id=user_id,
+            prompt=prompt,
+            device_name=build_data.get("device_name", "Untitled Device"),
+            description=build_data.get("description", ""),
+            parts_json=build_data.get("parts", []),
+            wiring_json=build_data.get("wiring_diagram") if build_data.get("wiring_diagram") else build_data.get("wiring_text", ""),
+            firmware_code=build_data.get("firmware", ""),
+            enclosure_md=build_data.get("enclosure", ""),
+            analysis=build_data.get("analysis", ""),
+            steps_json=build_data.get("steps", []),
+        )
+
+class PlanCacheEntry(Base):
+    __tablename__ = "plan_cache"
+
+    # sha256 of normalized prompt + model + system prompt hash
+    key = Column(String(64), primary_key=True)
+    model_name = Column(String)
+    prompt = Column(String)
+    plan_json = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class CadArtifact(Base):
+    __tablename__ = "cad_artifacts"
+
+    # sha256 of the normalized build123d script + build123d version
+    digest = Column(String(64), primary_key=True)
+    body_url = Column(String, nullable=True)
+    lid_url = Column(String, nullable=True)
+    mesh_variants = Column(JSON, nullable=True)
+    # Number of builds pointing at this artifact; files are removed when it drops to zero
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class CatalogPart(Base):
+    __tablename__ = "parts"
+
+    # One row per distinct part across all builds (see parts_catalog.py)
+    id = Column(Integer, primary_key=True)
+    canonical_name = Column(String(200), nullable=False) # lowercased, whitespace-collapsed name
+    type = Column(String(50), nullable=False)
+    name = Column(String(200)) # display name as first seen
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("canonical_name", "type", name="uq_parts_canonical_name_type"),
+        Index("ix_parts_type", "type"),
+    )
+
+class BuildPart(Base):
+    __tablename__ = "build_parts"
+
+    build_id = Column(Integer, ForeignKey("builds.id", ondelete="CASCADE"), primary_key=True)
+    part_id = Column(Integer, ForeignKey("parts.id"), primary_key=True)
+    quantity = Column(Integer, nullable=False, default=1)
+    # Copy of builds.created_at, so popularity over a time window never reads builds
+    created_at = Column(DateTime, nullable=False)
+
+    # Builds using a part; parts used in a time window (see migrations 0006)
+    __table_args__ = (
+        Index("ix_build_parts_part_id_build_id", part_id, build_id),
+        Index("ix_build_parts_created_at_part_id", created_at, part_id, quantity),
+    )
+
+class Batch(Base):
+    __tablename__ = "batches"
+
+    # POST /builds/batch; its items can be resumed by id (see batches.py)
+    id = Column(String(32), primary_key=True) # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    total = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True) # last run that got through every item
+    lease_owner = Column(String(32), nullable=True) # token of the run holding the batch
+    lease_until = Column(DateTime, nullable=True) # the batch is running until then unless renewed
+
+class BatchItem(Base):
+    __tablename__ = "batch_items"
+
+    batch_id = Column(String(32), ForeignKey("batches.id", ondelete="CASCADE"), primary_key=True)
+    position = Column(Integer, primary_key=True) # index of the prompt in the request
+    prompt = Column(String, nullable=False)
+    status = Column(String(16), nullable=False, default="pending") # pending | succeeded | failed
+    build_id = Column(Integer, ForeignKey("builds.id", ondelete="SET NULL"), nullable=True)
+    error = Column(String, nullable=True)
+    warnings = Column(JSON, nullable=True)
@@ -0,0 +1,258 @@
+import functools
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Plan wiring as a graph: every "Part (Pin)" endpoint is interned to a small
+# int, parts are indexed by name and type, and wires merge pins into nets
+# with union-find. Everything here is a single pass over parts and wires.
+
+# Mechanical parts: never wired by the fallback and never reported as unpowered
+STRUCTURAL_TYPES = frozenset({"frame", "enclosure", "wheel", "propeller"})
+CONTROLLER_TYPES = frozenset({"microcontroller", "camera"})
+POWER_SOURCE_TYPES = frozenset({"battery"})
+
+# Pin names are split on "/" first, so "5V/VCC" and "3V3/5V" count as supply pins
+GROUND_PIN = re.compile(r"(?:gnd\w*|ground|vss|0v|v-|-|neg(?:ative)?)", re.IGNORECASE)
+SUPPLY_PIN = re.compile(r"(?:vcc|vin|vdd|vbat|vbus|vsys|v\+|\+|\d+(?:\.\d+)?v\d*|pwr|power|bat\+?)", re.IGNORECASE)
+_PIN_ALIASES = re.compile(r"\s*/\s*")
+
+_ENDS = (("from", "from_part", "from_pin"), ("to", "to_part", "to_pin"))
+
+
+@functools.lru_cache(maxsize=8192)
+def parse_endpoint(text: str) -> Tuple[str, Optional[str]]:
+    """'ESP32 (GND)' -> ('ESP32', 'GND'); the pin is None when there are no parentheses."""
+    if "(" not in text:
+        return text, None
+    cut = text.rfind(" (")
+    rest = text[cut + 2:] if cut >= 0 else text[text.rfind("(") + 1:]
+    part = text[:cut] if cut >= 0 else text[:text.rfind("(")]
+    return part.strip(), rest.replace(")", "").strip()
+
+
+def normalize_wire(wire: dict) -> dict:
+    # The frontend expects {from_part, from_pin, to_part, to_pin}
+    # The AI (and fallback) generates {from: "Part (Pin)", to: "Part (Pin)"}
+    new_wire = wire.copy()
+    for end, part_key, pin_key in _ENDS:
+        text = wire.get(end)
+        if isinstance(text, str) and "(" in text:
+            new_wire[part_key], new_wire[pin_key] = parse_endpoint(text)
+        elif part_key not in wire:
+            # Fallback if no parens
+            new_wire[part_key] = wire.get(end, "Unknown")
+            new_wire[pin_key] = "Pin"
+    return new_wire
+
+
+def normalize_wiring(wires: list) -> list:
+    """normalize_wire over a plan's wiring_diagram, dropping entries that aren't objects (strings, nulls)."""
+    return [normalize_wire(wire) for wire in wires if isinstance(wire, dict)]
+
+
+def generate_fallback_wiring(parts: list) -> list:
+    """
+    Power (and, with a battery, signal) wires from every non-structural part
+    to the first controller, and from the controller to the first battery.
+    """
+    battery = controller = None
+    for index, part in enumerate(parts):
+        if not isinstance(part, dict):
+            continue
+        kind = part.get("type")
+        if battery is None and kind in POWER_SOURCE_TYPES:
+            battery = index
+        elif controller is None and kind in CONTROLLER_TYPES:
+            controller = index
+    if controller is None:
+        return []
+
+    mcu = parts[controller].get("name", "Unknown")
+    wiring = []
+    if battery is not None:
+        bat = parts[battery].get("name", "Unknown")
+        wiring.append({"from": f"{mcu} (5V/VCC)", "to": f"{bat} (VCC)", "label": "Power", "wire_color": "Red"})
+        wiring.append({"from": f"{mcu} (GND)", "to": f"{bat} (GND)", "label": "GND", "wire_color": "Black"})
+
+    for index, part in enumerate(parts):
+        if index == controller or index == battery or not isinstance(part, dict):
+            continue
+        if part.get("type") in STRUCTURAL_TYPES:
+            continue
+        name = part.get("name", "Unknown")
+        if battery is not None:
+            wiring.append({"from": f"{name} (VCC)", "to": f"{mcu} (3V3/5V)", "label": "Power", "wire_color": "Red"})
+            wiring.append({"from": f"{name} (GND)", "to": f"{mcu} (GND)", "label": "GND", "wire_color": "Black"})
+            wiring.append({"from": f"{name} (Data)", "to": f"{mcu} (GPIO)", "label": "Signal", "wire_color": "Yellow"})
+        else:
+            # USB-powered controller
+            wiring.append({"from": f"{name} (VCC)", "to": f"{mcu} (3V3)", "label": "Power", "wire_color": "Red"})
+            wiring.append({"from": f"{name} (GND)", "to": f"{mcu} (GND)", "label": "GND", "wire_color": "Black"})
+    return wiring
+
+
+@functools.lru_cache(maxsize=8192)
+def name_key(name: str) -> str:
+    """Case and whitespace-insensitive part/pin lookup key."""
+    return " ".join(name.lower().split())
+
+
+def _pin_matches(pattern: re.Pattern, pin: str) -> bool:
+    return any(pattern.fullmatch(alias) for alias in _PIN_ALIASES.split(pin))
+
+
+class Netlist:
+    """
+    Indexed view of a plan's parts and wires.
+
+    Parts and pins are interned to consecutive ints (ids index the parallel
+    lists below); a wire to a part missing from `parts` still gets an id and
+    is recorded in `dangling`. Nets are the connected components of pins.
+    """
+
+    def __init__(self, parts: list, wires: list):
+        self.part_names: List[str] = []
+        self.part_types: List[Optional[str]] = []
+        self.part_defined: List[bool] = []
+        self.by_type: Dict[str, List[int]] = {}
+        self._part_ids: Dict[str, int] = {}
+
+        self.pin_part: List[int] = []
+        self.pin_names: List[str] = []
+        self._pin_ids: Dict[Tuple[int, str], int] = {}
+        self._parent: List[int] = []
+
+        self.edges: List[Tuple[int, int]] = []
+        self.dangling: List[dict] = []
+
+        for part in parts:
+            if isinstance(part, dict) and isinstance(part.get("name"), str):
+                self._add_part(part["name"], part.get("type"))
+
+        for index, wire in enumerate(wires):
+            if not isinstance(wire, dict):
+                continue
+            ends = []
+            for end, part_key, pin_key in _ENDS:
+                if isinstance(wire.get(part_key), str):
+                    part, pin = wire[part_key], wire.get(pin_key)
+                elif isinstance(wire.get(end), str):
+                    part, pin = parse_endpoint(wire[end])
+                else:
+                    break
+                part_id = self._part_ids.get(name_key(part))
+                if part_id is None:
+                    part_id = self._add_part(part, None, defined=False)
+                if not self.part_defined[part_id]:
+                    self.dangling.append({"wire": index, "end": end, "part": part})
+                ends.append(self._pin(part_id, pin if isinstance(pin, str) and pin else "Pin"))
+            if len(ends) == 2:
+                self.edges.append((ends[0], ends[1]))
+                self._union(ends[0], ends[1])
+
+    @classmethod
+    def from_plan(cls, plan: dict) -> "Netlist":
+        return cls(plan.get("parts") or [], plan.get("wiring_diagram") or [])
+
+    def _add_part(self, name: str, kind: Optional[str], defined: bool = True) -> int:
+        key = name_key(name)
+        part_id = self._part_ids.get(key)
+        if part_id is not None:
+            return part_id  # duplicate names share one part
+        part_id = len(self.part_names)
+        self._part_ids[key] = part_id
+        self.part_names.append(name)
+        self.part_types.append(kind)
+        self.part_defined.append(defined)
+        if kind is not None:
+            self.by_type.setdefault(kind, []).append(part_id)
+        return part_id
+
+    def _pin(self, part_id: int, pin: str) -> int:
+        key = (part_id, name_key(pin))
+        pin_id = self._pin_ids.get(key)
+        if pin_id is None:
+            pin_id = len(self.pin_names)
+            self._pin_ids[key] = pin_id
+            self.pin_part.append(part_id)
+            self.pin_names.append(pin)
+            self._parent.append(pin_id)
+        return pin_id
+
+    def _find(self, pin_id: int) -> int:
+        parent = self._parent
+        while parent[pin_id] != pin_id:
+            parent[pin_id] = parent[parent[pin_id]]  # path halving
+            pin_id = parent[pin_id]
+        return pin_id
+
+    def _union(self, a: int, b: int) -> None:
+        a, b = self._find(a), self._find(b)
+        if a != b:
+            # Attach to the smaller id so a net's root is its first-seen pin
+            if a < b:
+                self._parent[b] = a
+            else:
+                self._parent[a] = b
+
+    # --- queries ------------------------------------------------------------
+
+    def part_id(self, name: str) -> Optional[int]:
+        return self._part_ids.get(name_key(name))
+
+    def label(self, pin_id: int) -> str:
+        return f"{self.part_names[self.pin_part[pin_id]]} ({self.pin_names[pin_id]})"
+
+    def _components(self) -> Dict[int, List[int]]:
+        components: Dict[int, List[int]] = {}
+        for pin_id in range(len(self.pin_names)):
+            components.setdefault(self._find(pin_id), []).append(pin_id)
+        return components
+
+    def nets(self) -> List[List[str]]:
+        """Every net with at least two pins, as 'Part (Pin)' labels."""
+        return [[self.label(p) for p in pins] for pins in self._components().values() if len(pins) > 1]
+
+    def net_of(self, part: str, pin: str) -> List[str]:
+        """Labels of every pin connected to part/pin (empty if it isn't wired)."""
+        part_id = self.part_id(part)
+        pin_id = None if part_id is None else self._pin_ids.get((part_id, name_key(pin)))
+        if pin_id is None:
+            return []
+        root = self._find(pin_id)
+        return [self.label(p) for p in range(len(self.pin_names)) if self._find(p) == root]
+
+    def ground_pins(self) -> List[str]:
+        """Pins on any net that includes a ground pin (GND, VSS, -, ...)."""
+        ground_roots = {self._find(p) for p, name in enumerate(self.pin_names) if _pin_matches(GROUND_PIN, name)}
+        return [self.label(p) for p in range(len(self.pin_names)) if self._find(p) in ground_roots]
+
+    def unpowered_parts(self) -> List[str]:
+        """
+        Defined, non-structural parts none of whose supply pins (VCC, 5V,
+        3V3, ...) share a net with another part's supply pin. Batteries
+        power themselves.
+        """
+        supply_pins = [p for p, name in enumerate(self.pin_names) if _pin_matches(SUPPLY_PIN, name)]
+        suppliers: Dict[int, set] = {}
+        for pin_id in supply_pins:
+            suppliers.setdefault(self._find(pin_id), set()).add(self.pin_part[pin_id])
+        powered = {self.pin_part[p] for p in supply_pins if len(suppliers[self._find(p)]) > 1}
+
+        return [
+            name
+            for part_id, name in enumerate(self.part_names)
+            if self.part_defined[part_id]
+            and part_id not in powered
+            and self.part_types[part_id] not in STRUCTURAL_TYPES
+            and self.part_types[part_id] not in POWER_SOURCE_TYPES
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "parts": sum(self.part_defined),
+            "pins": len(self.pin_names),
+            "wires": len(self.edges),
+            "nets": sum(1 for pins in self._components().values() if len(pins) > 1),
+            "dangling": len(self.dangling),
+        }
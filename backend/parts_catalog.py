@@ -0,0 +1,179 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import BuildPart, CatalogPart
+
+# Normalized view of Build.parts_json. Every distinct (canonical name, type)
+# is one `parts` row and `build_parts` links a build to its parts with a
+# quantity. Links are written in the same transaction as the build (and by
+# backfill_parts.py for older rows), so "builds that use an L298N" or "most
+# used microcontrollers this week" are index lookups, not JSON scans.
+
+UNKNOWN_TYPE = "other"
+MAX_NAME_LENGTH = 200
+MAX_TYPE_LENGTH = 50
+# Names per IN (...) lookup; stays under SQLite's bound-parameter limit
+LOOKUP_CHUNK = 400
+
+PartKey = Tuple[str, str]
+
+
+def canonical_part_name(name: Any) -> str:
+    """'  L298N  Motor Driver ' -> 'l298n motor driver'."""
+    if not isinstance(name, str):
+        return ""
+    return " ".join(name.lower().split()).strip(" -,.;:*")[:MAX_NAME_LENGTH]
+
+
+def canonical_part_type(kind: Any) -> str:
+    if not isinstance(kind, str) or not kind.strip():
+        return UNKNOWN_TYPE
+    return " ".join(kind.lower().split())[:MAX_TYPE_LENGTH]
+
+
+def extract_catalog_parts(parts: Any) -> Dict[PartKey, dict]:
+    """
+    (canonical name, type) -> {"name": display name, "quantity": total} for
+    one build's parts_json. Repeated parts are merged and their quantities added.
+    """
+    found: Dict[PartKey, dict] = {}
+    if not isinstance(parts, list):
+        return found
+    for part in parts:
+        if not isinstance(part, dict):
+            continue
+        canonical = canonical_part_name(part.get("name"))
+        if not canonical:
+            continue
+        try:
+            quantity = max(1, int(part.get("quantity") or 1))
+        except (TypeError, ValueError):
+            quantity = 1
+        key = (canonical, canonical_part_type(part.get("type")))
+        if key in found:
+            found[key]["quantity"] += quantity
+        else:
+            found[key] = {"name": " ".join(part["name"].split())[:MAX_NAME_LENGTH], "quantity": quantity}
+    return found
+
+
+def _insert_ignoring_duplicates(db):
+    # Two writers may add the same new part at once; the unique constraint decides
+    dialect = db.bind.dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(CatalogPart).on_conflict_do_nothing()
+    if dialect == "postgresql":
+        return postgresql.insert(CatalogPart).on_conflict_do_nothing()
+    return insert(CatalogPart)
+
+
+async def _lookup(db, keys: Sequence[PartKey]) -> Dict[PartKey, int]:
+    wanted = set(keys)
+    names = sorted({name for name, _ in keys})
+    ids: Dict[PartKey, int] = {}
+    for start in range(0, len(names), LOOKUP_CHUNK):
+        rows = await db.execute(
+            select(CatalogPart.id, CatalogPart.canonical_name, CatalogPart.type)
+            .where(CatalogPart.canonical_name.in_(names[start:start + LOOKUP_CHUNK]))
+        )
+        for part_id, name, kind in rows:
+            if (name, kind) in wanted:
+                ids[(name, kind)] = part_id
+    return ids
+
+
+async def catalog_ids(db, found: Dict[PartKey, dict]) -> Dict[PartKey, int]:
+    """Catalog ids for `found` (from extract_catalog_parts), adding the parts not seen before."""
+    keys = list(found)
+    ids = await _lookup(db, keys)
+    missing = [key for key in keys if key not in ids]
+    if missing:
+        now = datetime.utcnow()
+        await db.execute(
+            _insert_ignoring_duplicates(db),
+            [{"canonical_name": name, "type": kind, "name": found[(name, kind)]["name"], "created_at": now}
+             for name, kind in missing],
+        )
+        ids.update(await _lookup(db, missing))
+    return ids
+
+
+async def index_builds(db, rows: Sequence[Tuple[int, Any, Optional[datetime]]]) -> int:
+    """
+    Replaces the build_parts links of every (build_id, parts_json, created_at)
+    in `rows` inside `db`'s transaction; the caller commits. Returns the
+    number of links written.
+    """
+    per_build = [(build_id, extract_catalog_parts(parts), created_at) for build_id, parts, created_at in rows]
+    found: Dict[PartKey, dict] = {}
+    for _, parts, _ in per_build:
+        for key, entry in parts.items():
+            found.setdefault(key, entry)
+
+    await db.execute(delete(BuildPart).where(BuildPart.build_id.in_([build_id for build_id, _, _ in rows])))
+    if not found:
+        return 0
+    ids = await catalog_ids(db, found)
+    links = [
+        {"build_id": build_id, "part_id": ids[key], "quantity": entry["quantity"],
+         "created_at": created_at or datetime.utcnow()}
+        for build_id, parts, created_at in per_build
+        for key, entry in parts.items()
+    ]
+    await db.execute(insert(BuildPart), links)
+    return len(links)
+
+
+async def index_build(db, build) -> int:
+    """Links a flushed Build (it needs its id) to the catalog; the caller commits."""
+    return await index_builds(db, [(build.id, build.parts_json, build.created_at)])
+
+
+async def unindex_build(db, build_id: int) -> None:
+    # SQLite doesn't enforce ON DELETE CASCADE unless foreign keys are switched on
+    await db.execute(delete(BuildPart).where(BuildPart.build_id == build_id))
+
+
+def builds_using(part_ids) -> Any:
+    """Subquery of build ids that use any of `part_ids` (an id list or a select of ids)."""
+    return select(BuildPart.build_id).where(BuildPart.part_id.in_(part_ids))
+
+
+def parts_matching(name: str, kind: Optional[str] = None) -> Any:
+    """Select of catalog ids whose canonical name contains `name` ('l298n' matches 'l298n motor driver')."""
+    query = select(CatalogPart.id).where(CatalogPart.canonical_name.contains(canonical_part_name(name), autoescape=True))
+    if kind:
+        query = query.where(CatalogPart.type == canonical_part_type(kind))
+    return query
+
+
+async def popular_parts(
+    db, kind: Optional[str] = None, since: Optional[datetime] = None, name: Optional[str] = None, limit: int = 20
+) -> List[dict]:
+    """
+    Parts ranked by how many builds use them; optionally only one type, names
+    containing `name`, and uses in builds created since `since`.
+    """
+    uses = func.count(BuildPart.build_id).label("builds")
+    query = (
+        select(CatalogPart.id, CatalogPart.name, CatalogPart.type, uses, func.sum(BuildPart.quantity).label("quantity"))
+        .select_from(BuildPart)
+        .join(CatalogPart, CatalogPart.id == BuildPart.part_id)
+        .group_by(CatalogPart.id, CatalogPart.name, CatalogPart.type)
+        .order_by(uses.desc(), CatalogPart.id)
+        .limit(limit)
+    )
+    if kind:
+        query = query.where(CatalogPart.type == canonical_part_type(kind))
+    if name:
+        query = query.where(CatalogPart.id.in_(parts_matching(name)))
+    if since is not None:
+        query = query.where(BuildPart.created_at >= since)
+    rows = await db.execute(query)
+    return [
+        {"id": part_id, "name": name, "type": part_type, "builds": builds, "quantity": quantity or 0}
+        for part_id, name, part_type, builds, quantity in rows
+    ]
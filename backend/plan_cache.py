@@ -0,0 +1,138 @@
+import copy
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, select
+
+from cache import TTLCache
+from database import AsyncSessionLocal
+import logs
+from models import PlanCacheEntry
+
+# Two tiers: an in-process LRU in front of a table shared by every worker.
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE_ENABLED", "1") == "1"
+PLAN_CACHE_TTL_SECONDS = int(os.getenv("PLAN_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "512"))
+PLAN_CACHE_DB_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_DB_MAX_ENTRIES", "10000"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse case and whitespace so trivially different prompts share a cache entry."""
+    return " ".join(prompt.lower().split())
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_key(prompt: str, model_name: str, system_prompt_hash: str) -> str:
+    raw = f"{model_name}\x00{system_prompt_hash}\x00{normalize_prompt(prompt)}"
+    return hash_text(raw)
+
+
+class PlanCache:
+    def __init__(self, max_entries: int, ttl_seconds: int, db_max_entries: int):
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.db_max_entries = db_max_entries
+        self.db_hits = 0
+        self.db_misses = 0
+        self.db_errors = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        if not PLAN_CACHE_ENABLED:
+            return None
+        plan = self.memory.get(key)
+        if plan is None:
+            found = await self._db_get(key)
+            if found is None:
+                return None
+            plan, ttl_left = found
+            # Expire from memory when the row expires, not a full TTL after this read
+            self.memory.set(key, plan, ttl_seconds=ttl_left)
+        return copy.deepcopy(plan)
+
+    async def set(self, key: str, plan: dict, model_name: str = "", prompt: str = "") -> None:
+        if not PLAN_CACHE_ENABLED:
+            return
+        plan = copy.deepcopy(plan)
+        self.memory.set(key, plan)
+        await self._db_set(key, plan, model_name, prompt)
+
+    async def clear(self) -> None:
+        self.memory.clear()
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(PlanCacheEntry))
+            await db.commit()
+
+    def stats(self) -> dict:
+        memory = self.memory.stats()
+        return {
+            "enabled": PLAN_CACHE_ENABLED,
+            "memory": memory,
+            "db_hits": self.db_hits,
+            "db_misses": self.db_misses,
+            "db_errors": self.db_errors,
+            "hits": memory["hits"] + self.db_hits,
+            "misses": self.db_misses,
+        }
+
+    async def _db_get(self, key: str) -> Optional[Tuple[dict, float]]:
+        """The row's plan and the seconds it has left, or None if it is missing or expired."""
+        try:
+            async with AsyncSessionLocal() as db:
+                entry = await db.get(PlanCacheEntry, key)
+                if entry is None:
+                    self.db_misses += 1
+                    return None
+                ttl_left = self.ttl_seconds - (datetime.utcnow() - entry.created_at).total_seconds()
+                if ttl_left < 0:
+                    await db.delete(entry)
+                    await db.commit()
+                    self.db_misses += 1
+                    return None
+                self.db_hits += 1
+                return entry.plan_json, ttl_left
+        except Exception as e:
+            # The cache must never take generation down with it
+            self.db_errors += 1
+            logs.warning("plan_cache_read_failed", error=str(e))
+            return None
+
+    async def _db_set(self, key: str, plan: dict, model_name: str, prompt: str) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.merge(PlanCacheEntry(
+                    key=key,
+                    model_name=model_name,
+                    prompt=prompt,
+                    plan_json=plan,
+                    created_at=datetime.utcnow(),
+                ))
+                await db.commit()
+                await self._db_evict(db)
+        except Exception as e:
+            self.db_errors += 1
+            logs.warning("plan_cache_write_failed", error=str(e))
+
+    async def _db_evict(self, db) -> None:
+        # Drop expired rows, then the oldest rows beyond the size bound
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+        await db.execute(delete(PlanCacheEntry).where(PlanCacheEntry.created_at < cutoff))
+        overflow = (
+            select(PlanCacheEntry.key)
+            .order_by(PlanCacheEntry.created_at.desc())
+            .offset(self.db_max_entries)
+            .scalar_subquery()
+        )
+        await db.execute(delete(PlanCacheEntry).where(PlanCacheEntry.key.in_(overflow)))
+        await db.commit()
+
+
+plan_cache = PlanCache(
+    max_entries=PLAN_CACHE_MAX_ENTRIES,
+    ttl_seconds=PLAN_CACHE_TTL_SECONDS,
+    db_max_entries=PLAN_CACHE_DB_MAX_ENTRIES,
+)
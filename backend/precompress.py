@@ -0,0 +1,41 @@
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # gzip-only when the optional brotli wheel isn't installed
+    brotli = None
+
+# Compressed copies of generated artifacts are written next to them once,
+# when the artifact is created, so serving never compresses on the fly.
+# (content-coding, file suffix), in the order the server prefers them.
+ENCODINGS = ([("br", ".br")] if brotli else []) + [("gzip", ".gz")]
+
+# 11 is ~25% smaller again but takes seconds per mesh; runs once per artifact
+BROTLI_QUALITY = int(os.getenv("ARTIFACT_BROTLI_QUALITY", "9"))
+# Sidecars that don't save at least this fraction of the original aren't kept
+MIN_SAVINGS = 0.05
+
+
+def _compress(encoding: str, data: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output deterministic for identical inputs
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def write_sidecars(path: str) -> dict:
+    """Writes `path.br` / `path.gz` next to `path`; returns {encoding: size} for the ones kept."""
+    with open(path, "rb") as f:
+        data = f.read()
+    sizes = {}
+    for encoding, suffix in ENCODINGS:
+        compressed = _compress(encoding, data)
+        if len(compressed) > len(data) * (1 - MIN_SAVINGS):
+            continue
+        tmp_path = f"{path}{suffix}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp_path, path + suffix)
+        sizes[encoding] = len(compressed)
+    return sizes
@@ -0,0 +1,36 @@
+"""
+Re-runs the validation rules over every stored build and prints, as JSON,
+how many builds each rule flags and the time spent per rule. Run it after
+changing the rules in validation_engine to see how they land on existing builds.
+
+    python revalidate_builds.py
+    python revalidate_builds.py --batch-size 1000 --show 20
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from crud import revalidate_builds
+from database import async_engine
+from validation_engine import BatchReport
+
+
+async def main(args):
+    report = BatchReport(keep_warnings=args.show > 0)
+    started = time.perf_counter()
+    try:
+        await revalidate_builds(batch_size=args.batch_size, report=report)
+    finally:
+        await async_engine.dispose()
+    result = report.to_dict()
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    result["sample"] = {str(build_id): warnings for build_id, warnings in list(report.warnings.items())[:args.show]}
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--show", type=int, default=5, help="builds whose warnings are printed")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,162 @@
+from fastapi import APIRouter, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, Response, StreamingResponse
+import hashlib
+import mimetypes
+import os
+import re
+
+from cache import TTLCache, etag_matches
+from precompress import ENCODINGS
+
+# Serves generated files under /static (replacing a plain StaticFiles mount):
+# precompressed .br/.gz sidecars chosen by Accept-Encoding, strong ETags,
+# immutable caching for content-addressed names and single Range requests.
+STATIC_ROOT = os.path.realpath("static")
+ARTIFACT_META_CACHE_MAX_ENTRIES = int(os.getenv("ARTIFACT_META_CACHE_MAX_ENTRIES", "4096"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+CONTENT_ADDRESSED = re.compile(r"[0-9a-f]{64}")
+MEDIA_TYPES = {".stl": "model/stl", ".glb": "model/gltf-binary"}
+CHUNK_SIZE = 64 * 1024
+
+router = APIRouter(
+    prefix="/static",
+    tags=["artifacts"],
+)
+
+# (path, mtime_ns, size) -> sha256-based ETags and the sidecars present; a rewrite changes the key
+_meta_cache = TTLCache(max_entries=ARTIFACT_META_CACHE_MAX_ENTRIES, ttl_seconds=3600)
+
+
+def _resolve(path: str) -> str:
+    file_path = os.path.realpath(os.path.join(STATIC_ROOT, path))
+    if not file_path.startswith(STATIC_ROOT + os.sep) or file_path.endswith(".tmp") or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return file_path
+
+
+def _describe(file_path: str, size: int) -> dict:
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    etag = sha.hexdigest()[:32]
+    representations = {None: {"path": file_path, "size": size, "etag": f'"{etag}"'}}
+    for encoding, suffix in ENCODINGS:
+        try:
+            sidecar_size = os.stat(file_path + suffix).st_size
+        except OSError:
+            continue
+        # Each encoding is a different byte sequence, so it gets its own strong ETag
+        representations[encoding] = {"path": file_path + suffix, "size": sidecar_size, "etag": f'"{etag}-{encoding}"'}
+    return representations
+
+
+async def _representations(file_path: str) -> dict:
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime_ns, stat.st_size)
+    representations = _meta_cache.get(key)
+    if representations is None:
+        representations = await run_in_threadpool(_describe, file_path, stat.st_size)
+        _meta_cache.set(key, representations)
+    return representations
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.add(coding)
+    if "*" in accepted:
+        accepted.update(encoding for encoding, _ in ENCODINGS)
+    return accepted
+
+
+def _parse_range(header: str, size: int):
+    """Returns (start, end) inclusive, None to ignore the header, or False if unsatisfiable."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None  # multipart ranges aren't supported; a full 200 is a valid answer
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            length = int(last)
+            if length <= 0:
+                return False
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _read_range(file_path: str, start: int, end: int):
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+@router.api_route("/{path:path}", methods=["GET", "HEAD"])
+async def serve_artifact(path: str, request: Request):
+    file_path = _resolve(path)
+    representations = await _representations(file_path)
+    media_type = MEDIA_TYPES.get(os.path.splitext(file_path)[1]) or mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    headers = {
+        "Cache-Control": IMMUTABLE if CONTENT_ADDRESSED.search(os.path.basename(file_path)) else REVALIDATE,
+        "Vary": "Accept-Encoding",
+        "Accept-Ranges": "bytes",
+    }
+
+    # Byte ranges are only served from the uncompressed file
+    range_header = request.headers.get("range")
+    encoding = None
+    if range_header is None:
+        accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next((e for e, _ in ENCODINGS if e in accepted and e in representations), None)
+    representation = representations[encoding]
+    headers["ETag"] = representation["etag"]
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, representation["etag"]):
+        return Response(status_code=304, headers=headers)
+
+    if_range = request.headers.get("if-range")
+    if range_header is not None and (if_range is None or if_range.strip() == representation["etag"]):
+        size = representation["size"]
+        byte_range = _parse_range(range_header, size)
+        if byte_range is False:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            if request.method == "HEAD":
+                return Response(status_code=206, headers=headers, media_type=media_type)
+            return StreamingResponse(_read_range(file_path, start, end), status_code=206, headers=headers, media_type=media_type)
+
+    return FileResponse(representation["path"], headers=headers, media_type=media_type)
@@ -1,93 +1,426 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from pydantic import TypeAdapter
+from datetime import datetime
 from typing import List, Optional
+import base64
+import json
 
-from database import get_db
-from models import User, Build
-from schemas import BuildCreateRequest, BuildResponse
-from auth import get_current_user
-from ai_engine import generate_build_plan
+from database import AsyncSessionLocal, get_async_db
+from models import Build
+from schemas import (
+    BatchCreateRequest, BatchResponse, BuildCreateRequest, BuildResponse, BuildSearchResult, BuildSummary, CadRequest,
+    JobResponse,
+)
+from auth import CurrentUser, get_current_user
+from ai_engine import generate_build_plan, stream_build_plan
 from validation_engine import validate_build
+from crud import add_build, save_build_from_plan, set_document
+from jobs import job_queue, QueueFull
+from artifact_store import artifact_store
+from parts_catalog import builds_using, parts_matching, unindex_build
+from search import search_builds, search_truncated
+from feed_cache import FEED_CACHE_ENABLED, feed_cache, page_headers, public_feed_key
+from cache import etag_matches
+from metrics import span
+import logs
+from batches import BATCH_MAX_PROMPTS, BatchRunning, batch_summary, create_batch, get_batch, run_batch
 
 router = APIRouter(
     prefix="/builds",
     tags=["builds"],
 )
 
+# Builds change when CAD is re-exported, so clients revalidate against the ETag
+DOCUMENT_CACHE_CONTROL = "public, no-cache"
+
+def _document_response(document: bytes, etag: str, if_none_match: Optional[str] = None) -> Response:
+    """A build's stored document as the response body, bypassing response_model serialization."""
+    headers = {"ETag": etag, "Cache-Control": DOCUMENT_CACHE_CONTROL}
+    if if_none_match is not None and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=document, media_type="application/json", headers=headers)
+
 @router.post("/generate", response_model=BuildResponse)
 async def generate_build(
     request: BuildCreateRequest, 
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # 1. Generate plan using Gemini
-    plan_data = await generate_build_plan(request.prompt)
+    with span("plan"):
+        plan_data = await generate_build_plan(request.prompt)
     
     if "error" in plan_data:
-         raise HTTPException(status_code=500, detail=plan_data["error"])
+        if "retry_after" in plan_data:
+            raise HTTPException(
+                status_code=plan_data["status_code"],
+                detail=plan_data["error"],
+                headers={"Retry-After": str(plan_data["retry_after"])},
+            )
+        raise HTTPException(status_code=500, detail=plan_data["error"])
 
     # 2. Validate
-    warnings = validate_build(plan_data.get("parts", []))
+    warnings = validate_build(plan_data.get("parts", []), wiring=plan_data.get("wiring_diagram"))
     # We could store warnings, for now we just verify it runs.
     
     # 2. Extract Data
     build_data = plan_data 
-    print(f"DEBUG: AI Response Keys: {list(build_data.keys())}")
+    logs.debug("plan_received", keys=list(build_data.keys()))
     
     # 3. (Optional) Validation Layer
     # validation = await validation_engine.validate_build_plan(plan)
     # plan["validation"] = validation
 
     # 4. Save to DB
-    new_build = Build(
-        user_id=current_user.id,
-        prompt=request.prompt,
-        device_name=build_data.get("device_name", "Untitled Device"),
-        description=build_data.get("description", ""),
-        parts_json=build_data.get("parts", []),
-        wiring_json=build_data.get("wiring_diagram") if build_data.get("wiring_diagram") else build_data.get("wiring_text", ""),
-        firmware_code=build_data.get("firmware", ""),
-        enclosure_md=build_data.get("enclosure", ""),
-        analysis=build_data.get("analysis", ""),
-        steps_json=build_data.get("steps", []),
+    with span("db_commit"):
+        new_build = await add_build(db, Build.from_plan(current_user.id, request.prompt, build_data))
+        await db.commit()
+    feed_cache.invalidate()
+    return _document_response(new_build.document, new_build.document_etag)
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/generate/stream")
+async def generate_build_stream(
+    request: BuildCreateRequest,
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Same as /generate, but streams the plan as Server-Sent Events while the
+    model is still writing it. The Build row is saved once the stream completes
+    and announced with a final "done" event carrying its id.
+    """
+    user_id = current_user.id
+
+    async def event_stream():
+        plan_data = None
+        async for event, payload in stream_build_plan(request.prompt):
+            if event == "error":
+                yield _sse("error", payload)
+                return
+            if event == "plan":
+                plan_data = payload
+                continue
+            yield _sse(event, payload)
+
+        warnings = validate_build(plan_data.get("parts", []), wiring=plan_data.get("wiring_diagram"))
+        # The request-scoped session is already closed while the response streams
+        build_id = await save_build_from_plan(user_id, request.prompt, plan_data)
+        yield _sse("done", {"build_id": build_id, "warnings": warnings})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    
-    db.add(new_build)
-    db.commit()
-    db.refresh(new_build)
-    return new_build
-
-@router.get("/", response_model=List[BuildResponse])
-def get_my_builds(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+
+@router.post("/jobs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_generation_job(
+    request: BuildCreateRequest,
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Queues a generation and returns immediately. Poll GET /builds/jobs/{id}
+    until the job has succeeded (build_id is set) or failed.
+    """
+    try:
+        job = await job_queue.submit(current_user.id, request.prompt)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "10"})
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_generation_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30, description="Long-poll: seconds to wait for a status change"),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    job = await job_queue.backend.get(job_id)
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if wait and job.status in ("queued", "running"):
+        job = await job_queue.backend.wait(job_id, wait)
+    return job.to_dict()
+
+async def _batch_stream(batch_id: str, user_id: int) -> StreamingResponse:
+    results = run_batch(batch_id, user_id)
+    try:
+        # Its header line comes first; getting it here turns a batch that is already running into a 409
+        # and a full job queue into a 429 (the batch is kept; resume it by id)
+        header = await results.__anext__()
+    except BatchRunning as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "10", "X-Batch-Id": batch_id})
+
+    async def lines():
+        yield json.dumps(header) + "\n"
+        async for result in results:
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Id": batch_id, "Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/batch")
+async def generate_batch(
+    request: BatchCreateRequest,
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Generates a build for every prompt and streams NDJSON: a header line
+    {"batch_id", "total", "running"}, then one line per prompt as soon as its
+    build is saved, in completion order: {"position", "status": "succeeded",
+    "warnings", "build"} or {"position", "status": "failed", "error"}. If the
+    stream is cut off, POST /builds/batch/{batch_id}/resume runs what is left.
+    """
+    if len(request.prompts) > BATCH_MAX_PROMPTS:
+        raise HTTPException(status_code=422, detail=f"A batch holds at most {BATCH_MAX_PROMPTS} prompts.")
+    batch_id = await create_batch(current_user.id, request.prompts)
+    return await _batch_stream(batch_id, current_user.id)
+
+@router.get("/batch/{batch_id}", response_model=BatchResponse)
+async def get_generation_batch(
+    batch_id: str,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    found = await get_batch(db, batch_id, current_user.id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch_summary(*found)
+
+@router.post("/batch/{batch_id}/resume")
+async def resume_generation_batch(
+    batch_id: str,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Runs the batch's pending and failed items again and streams them like
+    POST /builds/batch. Items that already succeeded are not repeated;
+    GET /builds/batch/{batch_id} lists their build ids.
+    """
+    if await get_batch(db, batch_id, current_user.id) is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return await _batch_stream(batch_id, current_user.id)
+
+# Columns needed for BuildSummary; everything else (firmware, analysis, JSON blobs) stays unloaded
+SUMMARY_COLUMNS = load_only(
+    Build.id, Build.user_id, Build.prompt, Build.device_name, Build.description, Build.created_at
+)
+
+def _encode_cursor(build: Build) -> str:
+    raw = f"{build.created_at.isoformat()}|{build.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, build_id = base64.urlsafe_b64decode(padded).decode().rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(build_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def _summary_page(db: AsyncSession, query, response: Response, limit: int, cursor: Optional[str]):
+    """
+    Keyset pagination on (created_at, id), newest first. The cursor for the
+    next page is returned in the X-Next-Cursor header so the body stays a
+    plain list.
+    """
+    if cursor:
+        created_at, build_id = _decode_cursor(cursor)
+        query = query.where(or_(
+            Build.created_at < created_at,
+            and_(Build.created_at == created_at, Build.id < build_id),
+        ))
+    query = query.options(SUMMARY_COLUMNS).order_by(Build.created_at.desc(), Build.id.desc()).limit(limit + 1)
+    builds = (await db.execute(query)).scalars().all()
+
+    if len(builds) > limit:
+        builds = builds[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(builds[-1])
+    return builds
+
+def _filter_by_part(query, part: Optional[str], part_id: Optional[int]):
+    """Only builds using catalog part `part_id`, or any part whose name contains `part` (see GET /parts/)."""
+    if part_id is not None:
+        query = query.where(Build.id.in_(builds_using([part_id])))
+    if part:
+        query = query.where(Build.id.in_(builds_using(parts_matching(part))))
+    return query
+
+@router.get("/", response_model=List[BuildSummary])
+async def get_my_builds(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    part: Optional[str] = Query(None, max_length=200, description="Only builds using a part whose name contains this"),
+    part_id: Optional[int] = Query(None, description="Only builds using this catalog part"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    query = _filter_by_part(select(Build).where(Build.user_id == current_user.id), part, part_id)
+    return await _summary_page(db, query, response, limit, cursor)
+
+_summary_list = TypeAdapter(List[BuildSummary])
+
+async def _render_public_page(limit: int, cursor: Optional[str]):
+    async with AsyncSessionLocal() as db:
+        response = Response()
+        builds = await _summary_page(db, select(Build), response, limit, cursor)
+        # Validated from the ORM rows, as response_model would, before serializing
+        summaries = _summary_list.validate_python(builds, from_attributes=True)
+    return _summary_list.dump_json(summaries), response.headers.get("X-Next-Cursor")
+
+@router.get("/public", response_model=List[BuildSummary])
+async def get_public_builds(
+    request: Request,
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    part: Optional[str] = Query(None, max_length=200, description="Only builds using a part whose name contains this"),
+    part_id: Optional[int] = Query(None, description="Only builds using this catalog part"),
 ):
-    return db.query(Build).filter(Build.user_id == current_user.id).order_by(Build.created_at.desc()).all()
+    """
+    The gallery feed. Unfiltered pages come from feed_cache as pre-serialized
+    JSON with a strong ETag (If-None-Match -> 304); any write to builds
+    invalidates them.
+    """
+    if part or part_id is not None or not FEED_CACHE_ENABLED:
+        # In a real app we might have a 'public' flag. For now, show all (or just limit).
+        async with AsyncSessionLocal() as db:
+            return await _summary_page(db, _filter_by_part(select(Build), part, part_id), response, limit, cursor)
 
-@router.get("/public", response_model=List[BuildResponse])
-def get_public_builds(db: Session = Depends(get_db)):
-    # In a real app we might have a 'public' flag. For now, show all (or just limit).
-    return db.query(Build).order_by(Build.created_at.desc()).limit(20).all()
+    # Fresh pages are usually answered by FeedCacheMiddleware before reaching here
+    page, source = await feed_cache.get(public_feed_key(limit, cursor), lambda: _render_public_page(limit, cursor))
+    headers = page_headers(page, source)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, page.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=page.body, media_type="application/json", headers=headers)
+
+def _encode_search_cursor(result: dict) -> str:
+    raw = f"{result['score']!r}|{result['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_search_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, build_id = base64.urlsafe_b64decode(padded).decode().rsplit("|", 1)
+        return float(score), int(build_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Declared before /{build_id} so "search" isn't taken for an id
+@router.get("/search", response_model=List[BuildSearchResult])
+async def search_public_builds(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Full-text search over device names, prompts, descriptions and part
+    names, best match first. Paged like the listings: pass X-Next-Cursor back as `cursor`.
+    Only the newest SEARCH_CANDIDATES matches are ranked; X-Search-Truncated: 1
+    says older ones were left out.
+    """
+    after = _decode_search_cursor(cursor) if cursor else None
+    try:
+        results = await search_builds(db, q, limit=limit + 1, after=after)
+        truncated = await search_truncated(db, q)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    if len(results) > limit:
+        results = results[:limit]
+        response.headers["X-Next-Cursor"] = _encode_search_cursor(results[-1])
+    response.headers["X-Search-Truncated"] = "1" if truncated else "0"
+    return results
 
 @router.get("/{build_id}", response_model=BuildResponse)
-def get_build(build_id: int, db: Session = Depends(get_db)):
-    build = db.query(Build).filter(Build.id == build_id).first()
+async def get_build(build_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Sends the document serialized when the build was last written, without
+    loading its JSON columns; If-None-Match with its ETag gets a 304.
+    """
+    row = (await db.execute(select(Build.document, Build.document_etag).where(Build.id == build_id))).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Build not found")
+    document, etag = row
+    if document is None:
+        # Written before documents were stored: render it from the columns once and keep it
+        build = await db.get(Build, build_id)
+        set_document(build)
+        await db.commit()
+        document, etag = build.document, build.document_etag
+    return _document_response(document, etag, request.headers.get("if-none-match"))
+
+@router.post("/{build_id}/cad", response_model=BuildResponse)
+async def generate_build_cad(
+    build_id: int,
+    request: CadRequest,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Attaches the STL files for a build123d script to the build. Scripts that
+    were exported before are served from the artifact store; new ones run in
+    the CAD worker pool.
+    """
+    build = await db.get(Build, build_id)
     if not build:
         raise HTTPException(status_code=404, detail="Build not found")
-    return build
+    if build.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to modify this build")
+
+    script = request.script or build.cad_script
+    if not script:
+        raise HTTPException(status_code=400, detail="No CAD script provided or stored for this build")
+    # Don't hold a pooled connection while the script runs
+    await db.commit()
+
+    result = await artifact_store.acquire(db, script)
+    if "error" in result:
+        await db.rollback()
+        raise HTTPException(status_code=422, detail=result["error"])
+
+    previous_digest = build.cad_digest
+    await artifact_store.release(db, previous_digest)
+    build.cad_script = script
+    for key in ("cad_digest", "mesh_variants", "stl_body_url", "stl_lid_url", "openscad_body", "openscad_lid"):
+        setattr(build, key, result.get(key))
+    set_document(build)
+    await db.commit()
+    if previous_digest != build.cad_digest:
+        await artifact_store.collect(previous_digest)
+    return _document_response(build.document, build.document_etag)
 
 @router.delete("/{build_id}")
-def delete_build(
+async def delete_build(
     build_id: int, 
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    build = db.query(Build).filter(Build.id == build_id).first()
+    build = await db.get(Build, build_id)
     if not build:
         raise HTTPException(status_code=404, detail="Build not found")
     if build.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this build")
-        
-    db.delete(build)
-    db.commit()
+
+    digest = build.cad_digest
+    await artifact_store.release(db, digest)
+    await unindex_build(db, build.id)
+    await db.delete(build)
+    await db.commit()
+    feed_cache.invalidate()
+    await artifact_store.collect(digest)
     return {"message": "Build deleted"}
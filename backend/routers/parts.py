@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from database import get_async_db
+from schemas import PartResponse
+from parts_catalog import popular_parts
+
+# Aggregates over the parts catalog. Builds using a part are listed by
+# GET /builds/public?part_id=... (or ?part=l298n).
+router = APIRouter(
+    prefix="/parts",
+    tags=["parts"],
+)
+
+@router.get("/popular", response_model=List[PartResponse])
+async def get_popular_parts(
+    type: Optional[str] = Query(None, max_length=50, description="Only parts of this type, e.g. microcontroller"),
+    days: int = Query(7, ge=0, le=3650, description="Count builds from the last N days; 0 for all time"),
+    q: Optional[str] = Query(None, max_length=200, description="Only parts whose name contains this"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    return await popular_parts(db, kind=type, since=since, name=q, limit=limit)
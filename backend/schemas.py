@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional, Any
+from pydantic import BaseModel, EmailStr, Field
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 class UserCreate(BaseModel):
@@ -26,6 +26,13 @@ class TokenData(BaseModel):
 class BuildCreateRequest(BaseModel):
     prompt: str
 
+class BatchCreateRequest(BaseModel):
+    prompts: List[str] = Field(..., min_length=1)
+
+class CadRequest(BaseModel):
+    # build123d script; defaults to the build's stored cad_script
+    script: Optional[str] = None
+
 class BuildResponse(BaseModel):
     id: int
     user_id: int
@@ -43,9 +50,68 @@ class BuildResponse(BaseModel):
     openscad_body: Optional[str] = None
     stl_lid_url: Optional[str] = None
     stl_body_url: Optional[str] = None
+    mesh_variants: Optional[Dict[str, Any]] = None
     analysis: Optional[str] = None
     steps_json: List[Any] | Any
     created_at: datetime
 
     class Config:
         from_attributes = True
+
+class BuildSummary(BaseModel):
+    """List-view projection of a Build; the full document comes from GET /builds/{id}."""
+    id: int
+    user_id: int
+    prompt: str
+    device_name: str
+    description: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class BuildSearchResult(BuildSummary):
+    # Lower is a better match; `snippet` is HTML-escaped with matches in <mark>
+    score: float
+    snippet: str
+
+class PartResponse(BaseModel):
+    """A catalog part; `builds`/`quantity` count its uses (within the requested window for /parts/popular)."""
+    id: int
+    name: str
+    type: str
+    builds: int
+    quantity: int
+
+class JobResponse(BaseModel):
+    id: str
+    status: str
+    prompt: str
+    build_id: Optional[int] = None
+    error: Optional[str] = None
+    warnings: List[str] = []
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class BatchItemResponse(BaseModel):
+    position: int
+    prompt: str
+    status: str
+    build_id: Optional[int] = None
+    error: Optional[str] = None
+    warnings: List[str] = []
+
+    class Config:
+        from_attributes = True
+
+class BatchResponse(BaseModel):
+    id: str
+    status: str  # running | interrupted | partial | completed
+    total: int
+    succeeded: int
+    failed: int
+    pending: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    items: List[BatchItemResponse]
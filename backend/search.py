@@ -0,0 +1,164 @@
+import html
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.orm import load_only
+
+from models import Build
+
+# Ranked full-text search over builds (device name, prompt, description and
+# part names). SQLite queries the FTS5 table from migration 0007, Postgres
+# the GIN-indexed search_vector column. Results are ordered by (score, id),
+# lower score = better match, so a page can resume after its last row.
+#
+# Only the newest SEARCH_CANDIDATES matches are ranked: scoring every match
+# of a common term ("esp32") grows with the gallery, while walking the index
+# newest-first and stopping after N rows does not.
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "2000"))
+
+MAX_QUERY_TERMS = 12
+SNIPPET_WORDS = 16
+
+# Highlight markers are control characters in SQL, swapped for <mark> after escaping the text
+_OPEN, _CLOSE = "\x02", "\x03"
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+Cursor = Tuple[float, int]
+
+# FTS5 computes rank lazily, so only the candidate rows are scored
+_SQLITE_PAGE = text("""
+    SELECT id, score FROM (
+        SELECT rowid AS id, rank AS score FROM builds_fts
+        WHERE builds_fts MATCH :query
+        ORDER BY rowid DESC
+        LIMIT :candidates
+    )
+    WHERE :score IS NULL OR score > :score OR (score = :score AND id > :after_id)
+    ORDER BY score, id
+    LIMIT :limit
+""")
+
+_SQLITE_SNIPPETS = text(f"""
+    SELECT rowid, snippet(builds_fts, -1, char(2), char(3), '…', {SNIPPET_WORDS}) FROM builds_fts
+    WHERE builds_fts MATCH :query AND rowid IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+_POSTGRES_PAGE = text("""
+    SELECT id, score FROM (
+        SELECT c.id, -ts_rank_cd(c.search_vector, q.query) AS score
+        FROM (
+            SELECT b.id, b.search_vector FROM builds b
+            WHERE b.search_vector @@ websearch_to_tsquery('english', :query)
+            ORDER BY b.id DESC
+            LIMIT :candidates
+        ) c, websearch_to_tsquery('english', :query) AS q(query)
+    ) ranked
+    WHERE CAST(:score AS double precision) IS NULL OR score > :score OR (score = :score AND id > :after_id)
+    ORDER BY score, id
+    LIMIT :limit
+""")
+
+_POSTGRES_SNIPPETS = text("""
+    SELECT b.id, ts_headline(
+        'english',
+        concat_ws(' — ', b.device_name, b.description, b.prompt),
+        websearch_to_tsquery('english', :query),
+        :options
+    )
+    FROM builds b WHERE b.id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+# Whether a match exists past the candidate window, i.e. older matches went unranked
+_SQLITE_TRUNCATED = text("""
+    SELECT 1 FROM builds_fts WHERE builds_fts MATCH :query
+    ORDER BY rowid DESC LIMIT 1 OFFSET :candidates
+""")
+
+_POSTGRES_TRUNCATED = text("""
+    SELECT 1 FROM builds b WHERE b.search_vector @@ websearch_to_tsquery('english', :query)
+    ORDER BY b.id DESC LIMIT 1 OFFSET :candidates
+""")
+
+_POSTGRES_HEADLINE = f"StartSel={_OPEN}, StopSel={_CLOSE}, MaxWords={SNIPPET_WORDS}, MinWords=6, MaxFragments=1"
+
+
+def fts5_query(q: str) -> str:
+    """User text -> an FTS5 query: every word must match, as a quoted term, so operators and syntax errors can't leak in."""
+    return " ".join(f'"{term}"' for term in _TERM.findall(q)[:MAX_QUERY_TERMS])
+
+
+def highlight(snippet: Optional[str]) -> str:
+    """Escapes a raw snippet for HTML and turns the match markers into <mark> tags."""
+    if not snippet:
+        return ""
+    return html.escape(snippet).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def _dialect(db) -> str:
+    dialect = db.bind.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        raise NotImplementedError(f"Build search is not available on {dialect}")
+    return dialect
+
+
+async def search_builds(db, q: str, limit: int = 20, after: Optional[Cursor] = None) -> List[dict]:
+    """
+    One page of builds matching `q`, best first, as dicts with the
+    BuildSummary fields plus `score` and an HTML `snippet`. `after` is the
+    (score, id) of the previous page's last result. Ranks the newest
+    SEARCH_CANDIDATES matches. Raises NotImplementedError on other databases.
+    """
+    score, after_id = after if after else (None, 0)
+    if _dialect(db) == "sqlite":
+        query = fts5_query(q)
+        if not query:
+            return []
+        page_sql, snippet_sql, extra = _SQLITE_PAGE, _SQLITE_SNIPPETS, {}
+    else:
+        query = q
+        page_sql, snippet_sql, extra = _POSTGRES_PAGE, _POSTGRES_SNIPPETS, {"options": _POSTGRES_HEADLINE}
+
+    page = (await db.execute(
+        page_sql,
+        {"query": query, "score": score, "after_id": after_id, "limit": limit, "candidates": SEARCH_CANDIDATES},
+    )).all()
+    if not page:
+        return []
+    ids = [build_id for build_id, _ in page]
+
+    # Snippets and summary columns only for the rows on this page
+    snippets: Dict[int, str] = dict((await db.execute(snippet_sql, {"query": query, "ids": ids, **extra})).all())
+    builds = (await db.execute(
+        select(Build).where(Build.id.in_(ids)).options(
+            load_only(Build.id, Build.user_id, Build.prompt, Build.device_name, Build.description, Build.created_at)
+        )
+    )).scalars().all()
+    by_id = {build.id: build for build in builds}
+
+    return [
+        {
+            "id": build_id,
+            "user_id": by_id[build_id].user_id,
+            "prompt": by_id[build_id].prompt,
+            "device_name": by_id[build_id].device_name,
+            "description": by_id[build_id].description,
+            "created_at": by_id[build_id].created_at,
+            "score": row_score,
+            "snippet": highlight(snippets.get(build_id)),
+        }
+        for build_id, row_score in page
+        if build_id in by_id
+    ]
+
+
+async def search_truncated(db, q: str) -> bool:
+    """True when `q` matches more than SEARCH_CANDIDATES builds, so the older ones were not ranked."""
+    if _dialect(db) == "sqlite":
+        query, probe = fts5_query(q), _SQLITE_TRUNCATED
+        if not query:
+            return False
+    else:
+        query, probe = q, _POSTGRES_TRUNCATED
+    return (await db.execute(probe, {"query": query, "candidates": SEARCH_CANDIDATES})).first() is not None
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Tests import the backend's flat modules the way main.py does
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# A throwaway database and static dir; set before any backend module reads its settings
+_WORKDIR = tempfile.mkdtemp(prefix="prawler-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_WORKDIR, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["CAD_WORKERS"] = "0"
+os.environ["LOG_DEBUG_SAMPLE_RATE"] = "0"
+os.chdir(_WORKDIR)
+
+
+@pytest.fixture
+def database():
+    """A fresh schema for the test."""
+    import models  # noqa: F401  (registers the tables)
+    from database import Base, engine
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+
+
+@pytest.fixture
+def migrated_database():
+    """A fresh schema built by the Alembic migrations, for what create_all doesn't make (the search index)."""
+    from alembic import command
+    from alembic.config import Config
+    import models  # noqa: F401
+    from database import Base, engine
+
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        for table in ("builds_fts", "alembic_version"):
+            conn.exec_driver_sql(f"DROP TABLE IF EXISTS {table}")
+    command.upgrade(Config(os.path.join(BACKEND_DIR, "alembic.ini")), "head")
+    yield engine
+
+
+@pytest.fixture
+def run():
+    """asyncio.run that also closes pooled async connections, which belong to the loop that opened them."""
+    from database import async_engine
+
+    def run(coro):
+        async def main():
+            try:
+                return await coro
+            finally:
+                await async_engine.dispose()
+
+        return asyncio.run(main())
+
+    return run
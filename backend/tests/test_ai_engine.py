@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+import ai_engine
+import plan_cache
+from model_router import FakeBackend, ModelRouter
+
+PLAN = {
+    "device_name": "Desk Lamp",
+    "parts": [
+        {"name": "ESP32", "type": "microcontroller", "quantity": 1},
+        {"name": "LED Strip", "type": "led", "quantity": 1},
+    ],
+}
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Routes generation to a FakeBackend; set `.reply` to the model's text. The plan cache is off."""
+    backend = FakeBackend("fake")
+    monkeypatch.setattr(ai_engine, "GEMINI_API_KEY", "test")
+    monkeypatch.setattr(ai_engine, "model_router", ModelRouter([backend], hedge_enabled=False))
+    monkeypatch.setattr(plan_cache, "PLAN_CACHE_ENABLED", False)
+    return backend
+
+
+def test_wires_that_are_not_objects_are_dropped(model, run):
+    model.reply = json.dumps(dict(PLAN, wiring_diagram=[
+        "ESP32 (GPIO4) -> LED Strip (DIN)", None, 7, {"from": "LED Strip (DIN)", "to": "ESP32 (GPIO4)"},
+    ]))
+    plan = run(ai_engine.generate_build_plan("a desk lamp"))
+    assert "error" not in plan
+    assert plan["wiring_diagram"] == [{
+        "from": "LED Strip (DIN)", "to": "ESP32 (GPIO4)",
+        "from_part": "LED Strip", "from_pin": "DIN", "to_part": "ESP32", "to_pin": "GPIO4",
+    }]
+
+
+@pytest.mark.parametrize("wiring", [["just", "strings"], [None], "ESP32 to LED", {"from": "ESP32"}])
+def test_unusable_wiring_falls_back_to_generated_wiring(model, run, wiring):
+    model.reply = json.dumps(dict(PLAN, wiring_diagram=wiring))
+    plan = run(ai_engine.generate_build_plan("a desk lamp"))
+    assert "error" not in plan
+    assert plan["wiring_diagram"]
+    assert all(wire["to_part"] == "ESP32" for wire in plan["wiring_diagram"])
+
+
+def test_postprocessing_failures_come_back_as_an_error_dict(model, run, monkeypatch):
+    def broken(data):
+        raise ValueError("bad plan")
+
+    monkeypatch.setattr(ai_engine, "postprocess_plan", broken)
+    model.reply = json.dumps(PLAN)
+    plan = run(ai_engine.generate_build_plan("a desk lamp"))
+    assert plan["error"] == "bad plan"
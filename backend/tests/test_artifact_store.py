@@ -0,0 +1,140 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import artifact_store as store_module
+from artifact_store import STATIC_DIR, ArtifactStore, script_digest
+from database import AsyncSessionLocal
+from models import CadArtifact
+
+
+@pytest.fixture
+def exports(monkeypatch, database):
+    """Stands in for the CAD pool: writes one body file per digest and counts runs."""
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    calls = []
+
+    async def generate_stl(script, digest):
+        calls.append(digest)
+        path = os.path.join(STATIC_DIR, f"body_{digest}.stl")
+        with open(path, "w") as f:
+            f.write(script)
+        return {"stl_body_url": f"/static/stls/body_{digest}.stl", "mesh_variants": None}
+
+    monkeypatch.setattr(store_module.cad_pool, "generate_stl", generate_stl)
+    return calls
+
+
+def _body_path(digest):
+    return os.path.join(STATIC_DIR, f"body_{digest}.stl")
+
+
+async def _row(digest):
+    async with AsyncSessionLocal() as db:
+        return await db.get(CadArtifact, digest)
+
+
+async def _acquire(store, script):
+    async with AsyncSessionLocal() as db:
+        result = await store.acquire(db, script)
+        await db.commit()
+    return result
+
+
+async def _release(store, digest):
+    async with AsyncSessionLocal() as db:
+        await store.release(db, digest)
+        await db.commit()
+    return await store.collect(digest)
+
+
+def test_identical_scripts_share_one_artifact_until_the_last_release(exports, run):
+    store = ArtifactStore()
+
+    async def scenario():
+        first = await _acquire(store, "box = Box(1, 1, 1)\n")
+        second = await _acquire(store, "box = Box(1, 1, 1)   \r\n\n")
+        digest = first["cad_digest"]
+        assert second["cad_digest"] == digest
+        assert (await _row(digest)).ref_count == 2
+
+        assert not await _release(store, digest)
+        assert os.path.exists(_body_path(digest))
+        assert await _release(store, digest)
+        return digest, await _row(digest)
+
+    digest, row = run(scenario())
+    assert exports == [digest]
+    assert row is None
+    assert not os.path.exists(_body_path(digest))
+    assert store.stats()["collected"] == 1
+
+
+def test_sweep_removes_old_unreferenced_artifacts_only(exports, run):
+    store = ArtifactStore()
+
+    async def scenario():
+        # An export nobody acquired (e.g. the request was aborted), one in use, and one just written
+        orphan = (await store.get_or_create("orphan = Box(1, 1, 1)"))["cad_digest"]
+        in_use = (await _acquire(store, "used = Box(2, 2, 2)"))["cad_digest"]
+        fresh = (await store.get_or_create("fresh = Box(3, 3, 3)"))["cad_digest"]
+        async with AsyncSessionLocal() as db:
+            for digest in (orphan, in_use):
+                (await db.get(CadArtifact, digest)).created_at = datetime.utcnow() - timedelta(hours=2)
+            await db.commit()
+
+        swept = await store.sweep(grace_seconds=3600)
+        return swept, orphan, in_use, fresh, [await _row(d) for d in (orphan, in_use, fresh)]
+
+    swept, orphan, in_use, fresh, rows = run(scenario())
+    assert swept == 1
+    assert rows[0] is None and not os.path.exists(_body_path(orphan))
+    assert rows[1] is not None and os.path.exists(_body_path(in_use))
+    assert rows[2] is not None and os.path.exists(_body_path(fresh))
+
+
+def test_collect_waits_for_an_export_of_the_same_digest(monkeypatch, exports, run):
+    store = ArtifactStore()
+    script = "box = Box(1, 1, 1)"
+    digest = script_digest(script)
+    events = []
+
+    async def scenario():
+        # An unreferenced row whose files are gone, so the next lookup exports again
+        async with AsyncSessionLocal() as db:
+            db.add(CadArtifact(digest=digest, body_url=f"/static/stls/body_{digest}.stl", ref_count=0))
+            await db.commit()
+
+        release = asyncio.Event()
+        write = store_module.cad_pool.generate_stl
+
+        async def slow_generate(script, name):
+            await release.wait()
+            result = await write(script, name)
+            events.append("exported")
+            return result
+
+        monkeypatch.setattr(store_module.cad_pool, "generate_stl", slow_generate)
+        create = asyncio.create_task(store.get_or_create(script))
+        await asyncio.sleep(0.01)
+
+        async def collect():
+            collected = await store.collect(digest)
+            events.append("collected")
+            return collected
+
+        collecting = asyncio.create_task(collect())
+        await asyncio.sleep(0.01)
+        assert events == []
+        release.set()
+        await create
+        assert await collecting
+        return await _row(digest)
+
+    row = run(scenario())
+    assert events == ["exported", "collected"]
+    # Row and files went together rather than leaving a row pointing at deleted files
+    assert row is None and not os.path.exists(_body_path(digest))
+    assert store._locks == {}
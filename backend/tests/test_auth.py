@@ -0,0 +1,93 @@
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+import auth
+from auth import CurrentUser, UserIdentityCache, create_access_token, get_current_user
+from database import AsyncSessionLocal
+from models import User
+
+ALICE = CurrentUser(id=1, email="alice@example.com")
+
+
+def test_identity_cache_hits_until_the_user_is_invalidated():
+    cache = UserIdentityCache(max_entries=8, ttl_seconds=60)
+    cache.set("token", ALICE, expires_at=None)
+
+    assert cache.get("token") == ALICE
+    cache.invalidate("bob@example.com")
+    assert cache.get("token") == ALICE
+    cache.invalidate(ALICE.email)
+    assert cache.get("token") is None
+    # Identities cached after the invalidation are good again
+    cache.set("token", ALICE, expires_at=None)
+    assert cache.get("token") == ALICE
+    assert cache.stats()["hits"] == 3 and cache.stats()["invalidations"] == 2
+
+
+def test_identity_cache_never_outlives_the_token():
+    cache = UserIdentityCache(max_entries=8, ttl_seconds=3600)
+
+    cache.set("expired", ALICE, expires_at=time.time() - 1)
+    assert cache.get("expired") is None
+
+    cache.set("short", ALICE, expires_at=time.time() + 0.05)
+    assert cache.get("short") == ALICE
+    time.sleep(0.06)
+    assert cache.get("short") is None
+
+
+@pytest.fixture
+def user_cache(monkeypatch):
+    cache = UserIdentityCache(max_entries=8, ttl_seconds=60)
+    monkeypatch.setattr(auth, "user_cache", cache)
+    return cache
+
+
+def test_get_current_user_skips_the_database_on_a_hit(database, run, user_cache):
+    token = create_access_token({"sub": ALICE.email}, timedelta(minutes=5))
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            db.add(User(email=ALICE.email, password_hash="x"))
+            await db.commit()
+            first = await get_current_user(token, db)
+        # No session at all: the cached identity is returned before any query
+        second = await get_current_user(token, None)
+        return first, second
+
+    first, second = run(scenario())
+    assert first == second and first.email == ALICE.email
+    assert user_cache.stats()["hits"] == 1
+
+
+def test_a_password_change_revokes_cached_sessions(database, run, user_cache):
+    token = create_access_token({"sub": ALICE.email}, timedelta(minutes=5))
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            db.add(User(email=ALICE.email, password_hash="x"))
+            await db.commit()
+            await get_current_user(token, db)
+            user = (await db.execute(select(User).where(User.email == ALICE.email))).scalar_one()
+            user.password_hash = "y"
+            await db.commit()
+        return user_cache.get(token)
+
+    assert run(scenario()) is None
+
+
+def test_unknown_users_are_rejected_and_not_cached(database, run, user_cache):
+    token = create_access_token({"sub": "nobody@example.com"}, timedelta(minutes=5))
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            with pytest.raises(HTTPException) as raised:
+                await get_current_user(token, db)
+        return raised.value.status_code
+
+    assert run(scenario()) == 401
+    assert user_cache.stats()["entries"] == 0
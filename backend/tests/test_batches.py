@@ -0,0 +1,107 @@
+import copy
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import batches
+import jobs
+from ai_engine import MOCK_PLAN
+from batches import BatchRunning, batch_summary, create_batch, get_batch, run_batch
+from database import AsyncSessionLocal
+from models import Batch, User
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Plans come back mocked; while `flaky` is set, prompts containing "fail" fail."""
+    model = SimpleNamespace(flaky=True)
+
+    async def generate_build_plan(prompt):
+        if model.flaky and "fail" in prompt:
+            return {"error": "model unavailable"}
+        return copy.deepcopy(MOCK_PLAN)
+
+    monkeypatch.setattr(jobs, "generate_build_plan", generate_build_plan)
+    return model
+
+
+@pytest.fixture
+def job_queue(monkeypatch, model):
+    queue = jobs.JobQueue(jobs.InMemoryJobBackend(max_depth=100, max_per_user=10, result_ttl_seconds=60), workers=2)
+    monkeypatch.setattr(batches, "job_queue", queue)
+    return queue
+
+
+async def _user() -> int:
+    async with AsyncSessionLocal() as db:
+        user = User(email="batch@example.com", password_hash="x")
+        db.add(user)
+        await db.commit()
+        return user.id
+
+
+async def _summary(batch_id, user_id):
+    async with AsyncSessionLocal() as db:
+        return batch_summary(*await get_batch(db, batch_id, user_id))
+
+
+async def _set_lease_until(batch_id, until):
+    async with AsyncSessionLocal() as db:
+        (await db.get(Batch, batch_id)).lease_until = until
+        await db.commit()
+
+
+def test_a_batch_runs_once_at_a_time_until_its_lease_expires(database, run):
+    async def scenario():
+        user_id = await _user()
+        batch_id = await create_batch(user_id, ["a weather station"])
+        owner = await batches._claim(batch_id)
+        assert owner is not None
+        assert await batches._claim(batch_id) is None
+        assert (await _summary(batch_id, user_id))["status"] == "running"
+        with pytest.raises(BatchRunning):
+            await run_batch(batch_id, user_id).__anext__()
+
+        # A run that died stops holding the batch once its lease runs out
+        await _set_lease_until(batch_id, datetime.utcnow() - timedelta(seconds=1))
+        assert (await _summary(batch_id, user_id))["status"] == "interrupted"
+        assert await batches._claim(batch_id) not in (None, owner)
+
+    run(scenario())
+
+
+def test_resuming_a_batch_reruns_only_failed_items(database, run, job_queue, model):
+    async def scenario():
+        await job_queue.start()
+        try:
+            user_id = await _user()
+            batch_id = await create_batch(user_id, ["a weather station", "please fail", "a robot car"])
+            first = [result async for result in run_batch(batch_id, user_id)]
+            after_first = await _summary(batch_id, user_id)
+
+            model.flaky = False
+            second = [result async for result in run_batch(batch_id, user_id)]
+            return first, after_first, second, await _summary(batch_id, user_id)
+        finally:
+            await job_queue.stop()
+
+    first, after_first, second, after_second = run(scenario())
+    assert first[0]["running"] == 3
+    assert sorted((r["position"], r["status"]) for r in first[1:]) == [(0, "succeeded"), (1, "failed"), (2, "succeeded")]
+    assert after_first["status"] == "partial"
+
+    assert second[0]["running"] == 1
+    assert [(r["position"], r["status"]) for r in second[1:]] == [(1, "succeeded")]
+    # "completed" rather than "running": the run released its lease on the way out
+    assert after_second["status"] == "completed" and after_second["succeeded"] == 3
+    assert after_second["finished_at"] is not None
+
+
+def test_other_users_cannot_see_a_batch(database, run):
+    async def scenario():
+        batch_id = await create_batch(await _user(), ["a weather station"])
+        async with AsyncSessionLocal() as db:
+            return await get_batch(db, batch_id, user_id=999)
+
+    assert run(scenario()) is None
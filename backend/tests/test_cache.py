@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from cache import SingleFlight
+
+
+def test_single_flight_shares_one_call_between_concurrent_callers():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "plan"
+
+    async def scenario():
+        return await asyncio.gather(*(flights.do("key", fetch) for _ in range(3)))
+
+    assert asyncio.run(scenario()) == ["plan"] * 3
+    assert calls == [1]
+    assert flights.stats() == {"in_flight": 0, "started": 1, "deduplicated": 2}
+
+
+def test_single_flight_starts_afresh_once_every_waiter_has_left():
+    flights = SingleFlight()
+    started = []
+
+    async def fetch():
+        started.append(1)
+        await asyncio.sleep(0.05)
+        return len(started)
+
+    async def scenario():
+        abandoned = asyncio.create_task(flights.do("key", fetch))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await abandoned
+        # The cancelled call is forgotten at once, not when its cancellation is delivered
+        assert flights.stats()["in_flight"] == 0
+        return await flights.do("key", fetch)
+
+    assert asyncio.run(scenario()) == 2
@@ -0,0 +1,23 @@
+import cad_engine
+
+
+def test_scripts_can_import_allowed_modules():
+    result = cad_engine.generate_stl("import math\nbody = Box(10, 10, math.sqrt(4))", "allowed-import")
+    assert "error" not in result
+    assert result["stl_body_url"].endswith("body_allowed-import.stl")
+
+
+def test_scripts_cannot_import_other_modules():
+    result = cad_engine.generate_stl("import os\nbody = Box(1, 1, 1)")
+    assert "not allowed" in result["error"]
+
+    result = cad_engine.generate_stl("from subprocess import run\nbody = Box(1, 1, 1)")
+    assert "not allowed" in result["error"]
+
+
+def test_scripts_run_without_file_and_eval_builtins():
+    result = cad_engine.generate_stl("open('/etc/passwd')\nbody = Box(1, 1, 1)")
+    assert "open" in result["error"]
+
+    result = cad_engine.generate_stl("eval('1')\nbody = Box(1, 1, 1)")
+    assert "eval" in result["error"]
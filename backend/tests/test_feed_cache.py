@@ -0,0 +1,104 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from auth import create_access_token
+from database import SessionLocal
+from feed_cache import FeedCache, feed_cache
+from models import User
+
+
+def _renderer(bodies):
+    """A render function returning the next body from `bodies` on each call."""
+    calls = iter(bodies)
+
+    async def render():
+        return next(calls), None
+
+    return render
+
+
+def test_fresh_pages_are_hits_and_stale_ones_are_refreshed_in_the_background():
+    cache = FeedCache(ttl_seconds=0.05, stale_seconds=60, max_entries=8)
+    render = _renderer([b"v1", b"v2"])
+
+    async def scenario():
+        first = await cache.get("k", render)
+        second = await cache.get("k", render)
+        await asyncio.sleep(0.06)
+        stale = await cache.get("k", render)
+        await asyncio.sleep(0.01)  # the background refresh
+        refreshed = await cache.get("k", render)
+        return first, second, stale, refreshed
+
+    first, second, stale, refreshed = asyncio.run(scenario())
+    assert (first[1], second[1], stale[1], refreshed[1]) == ("miss", "hit", "stale", "hit")
+    assert stale[0].body == b"v1" and refreshed[0].body == b"v2"
+    assert first[0].etag == second[0].etag != refreshed[0].etag
+
+
+def test_a_page_rendered_across_an_invalidation_is_not_cached():
+    cache = FeedCache(ttl_seconds=60, stale_seconds=0, max_entries=8)
+
+    async def render_then_write():
+        cache.invalidate()  # a build saved while the page was being rendered
+        return b"old", None
+
+    async def scenario():
+        served, _ = await cache.get("k", render_then_write)
+        return served, await cache.get("k", _renderer([b"new"]))
+
+    served, (page, source) = asyncio.run(scenario())
+    assert served.body == b"old"
+    assert source == "miss" and page.body == b"new"
+
+
+def test_workers_share_pages_and_invalidations_through_the_shared_dir(tmp_path):
+    one = FeedCache(ttl_seconds=60, stale_seconds=0, max_entries=8, shared_dir=str(tmp_path))
+    two = FeedCache(ttl_seconds=60, stale_seconds=0, max_entries=8, shared_dir=str(tmp_path))
+
+    async def scenario():
+        await one.get("k", _renderer([b"page"]))
+        shared = await two.get("k", _renderer([]))
+        # A write through the first worker evicts the page in the second
+        one.invalidate()
+        return shared, await two.get("k", _renderer([b"fresh"]))
+
+    (shared, shared_source), (fresh, fresh_source) = asyncio.run(scenario())
+    assert shared_source == "shared" and shared.body == b"page"
+    assert fresh_source == "miss" and fresh.body == b"fresh"
+
+
+@pytest.fixture
+def client(database):
+    from main import app
+
+    with SessionLocal() as db:
+        db.add(User(email="feed@example.com", password_hash="x"))
+        db.commit()
+    feed_cache.invalidate()
+    token = create_access_token({"sub": "feed@example.com"}, timedelta(minutes=5))
+    with TestClient(app) as client:
+        client.headers["Authorization"] = f"Bearer {token}"
+        yield client
+
+
+def test_the_feed_is_served_from_cache_until_a_build_is_created_or_deleted(client):
+    empty = client.get("/builds/public")
+    assert empty.json() == [] and empty.headers["x-cache"] == "miss"
+    cached = client.get("/builds/public")
+    assert cached.headers["x-cache"] == "hit"
+    revalidated = client.get("/builds/public", headers={"If-None-Match": cached.headers["etag"]})
+    assert revalidated.status_code == 304
+
+    build = client.post("/builds/generate", json={"prompt": "a weather station"}).json()
+    after_create = client.get("/builds/public")
+    assert after_create.headers["x-cache"] == "miss"
+    assert [summary["id"] for summary in after_create.json()] == [build["id"]]
+    assert client.get("/builds/public", headers={"If-None-Match": cached.headers["etag"]}).status_code == 200
+
+    assert client.delete(f"/builds/{build['id']}").status_code == 200
+    after_delete = client.get("/builds/public")
+    assert after_delete.headers["x-cache"] == "miss" and after_delete.json() == []
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+from jobs import FAILED, SUCCEEDED, InMemoryJobBackend, Job, QueueFull
+
+
+def _backend(**kwargs):
+    return InMemoryJobBackend(**{"max_depth": 100, "max_per_user": 10, "result_ttl_seconds": 3600, **kwargs})
+
+
+def _job(job_id, user_id):
+    return Job(id=job_id, user_id=user_id, prompt=f"prompt {job_id}")
+
+
+def test_dequeue_takes_users_in_turn():
+    backend = _backend()
+
+    async def scenario():
+        # User 1 submits a burst before users 2 and 3 submit one each
+        for i in range(4):
+            await backend.enqueue(_job(f"a{i}", 1))
+        await backend.enqueue(_job("b0", 2))
+        await backend.enqueue(_job("c0", 3))
+        return [(await backend.dequeue()).id for _ in range(6)]
+
+    assert asyncio.run(scenario()) == ["a0", "b0", "c0", "a1", "a2", "a3"]
+
+
+def test_queue_depth_and_per_user_limits():
+    backend = _backend(max_depth=3, max_per_user=2)
+
+    async def scenario():
+        await backend.enqueue(_job("a0", 1))
+        await backend.enqueue(_job("a1", 1))
+        with pytest.raises(QueueFull, match="2 generations queued"):
+            await backend.enqueue(_job("a2", 1))
+        await backend.enqueue(_job("b0", 2))
+        with pytest.raises(QueueFull, match="queue is full"):
+            await backend.enqueue(_job("c0", 3))
+        # Dequeuing frees room again
+        await backend.dequeue()
+        await backend.enqueue(_job("c0", 3))
+        return await backend.stats()
+
+    assert asyncio.run(scenario())["queued"] == 3
+
+
+def test_dequeue_waits_for_a_job():
+    backend = _backend()
+
+    async def scenario():
+        waiting = asyncio.create_task(backend.dequeue())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        await backend.enqueue(_job("a0", 1))
+        return (await asyncio.wait_for(waiting, 1)).id
+
+    assert asyncio.run(scenario()) == "a0"
+
+
+def test_wait_returns_when_the_job_changes_state():
+    backend = _backend()
+
+    async def scenario():
+        await backend.enqueue(_job("a0", 1))
+        job = await backend.dequeue()
+        waiting = asyncio.create_task(backend.wait(job.id, 5))
+        await asyncio.sleep(0.01)
+        job.status = SUCCEEDED
+        await backend.update(job)
+        return await asyncio.wait_for(waiting, 1)
+
+    assert asyncio.run(scenario()).status == SUCCEEDED
+
+
+def test_finished_jobs_are_forgotten_after_their_ttl():
+    backend = _backend(result_ttl_seconds=60)
+
+    async def scenario():
+        await backend.enqueue(_job("old", 1))
+        job = await backend.dequeue()
+        job.status, job.finished_at = FAILED, time.time() - 61
+        await backend.update(job)
+        # Pruning happens on the next enqueue
+        await backend.enqueue(_job("new", 1))
+        return await backend.get("old"), await backend.get("new")
+
+    old, new = asyncio.run(scenario())
+    assert old is None and new is not None
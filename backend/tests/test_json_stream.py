@@ -0,0 +1,91 @@
+import json
+import os
+import re
+
+import pytest
+
+from json_stream import IncrementalJSONParser, JSONRepairError, parse
+
+# A Gemini error dump captured from a production 500, shared with benchmarks/bench_json_extract.py
+ERROR_DUMP_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "corpus", "gemini_error_500.log"
+)
+
+PLAN = {
+    "device_name": "Greenhouse Monitor",
+    "parts": [
+        {"name": "ESP32 (v1)", "type": "microcontroller", "quantity": 1, "optional": False, "alternative": None},
+        {"name": "DHT22", "type": "sensor", "quantity": 2, "specs": "3.3V, \"single-wire\" @ 0.5Hz"},
+    ],
+    "wiring_diagram": [{"from": "DHT22 (DATA)", "to": "ESP32 (GPIO4)"}],
+    "firmware": "void loop() {\n\tif (ready) { send(\"{}\"); }\n}",
+}
+CLEAN = json.dumps(PLAN, indent=2)
+
+
+# (name, text, repair actions the parser must report)
+REPAIRABLE = [
+    ("clean", CLEAN, []),
+    ("fenced", f"```json\n{CLEAN}\n```", ["skipped_prefix", "ignored_trailing_text"]),
+    ("prose_with_braces", f"Here is your plan {{as requested}}:\n{CLEAN}\nEnjoy!", ["skipped_prefix", "ignored_trailing_text"]),
+    ("trailing_commas", re.sub(r'(["\]}\d]|true|false|null)(\n\s*[\]}])', r"\1,\2", CLEAN), ["trailing_comma"]),
+    ("missing_comma", CLEAN.replace('"quantity": 2,', '"quantity": 2'), ["missing_comma"]),
+    ("extra_comma", CLEAN.replace('"quantity": 2,', '"quantity": 2,,'), ["extra_comma"]),
+    ("unquoted_key", CLEAN.replace('"device_name"', "device_name"), ["unquoted_key"]),
+    ("python_literals", CLEAN.replace("false", "False").replace("null", "None"), ["python_literal"]),
+    ("comments", CLEAN.replace('"parts":', '// the bill of materials\n  "parts": /* two */'), ["comment"]),
+    ("raw_control_characters", json.dumps(PLAN).replace("\\n", "\n").replace("\\t", "\t"), ["control_character"]),
+]
+
+
+@pytest.mark.parametrize("name, text, actions", REPAIRABLE, ids=[case[0] for case in REPAIRABLE])
+def test_repairs_model_output_into_the_plan(name, text, actions):
+    plan, repairs = parse(text)
+    assert plan == PLAN
+    assert {action for action, _ in repairs} == set(actions)
+
+
+@pytest.mark.parametrize("name, text, actions", REPAIRABLE, ids=[case[0] for case in REPAIRABLE])
+def test_chunked_feed_matches_a_whole_parse(name, text, actions):
+    parser = IncrementalJSONParser()
+    events = []
+    for i in range(0, len(text), 7):
+        events += parser.feed(text[i:i + 7])
+    assert parser.finish() == PLAN
+    # Top-level members and array elements are emitted as soon as they close
+    assert [event[1] for event in events if event[0] == "value"] == list(PLAN)
+    assert [event[3] for event in events if event[0] == "item" and event[1] == "parts"] == PLAN["parts"]
+
+
+def test_invalid_escape_is_kept_literally():
+    plan, repairs = parse('{"pattern": "^\\d+$"}')
+    assert plan == {"pattern": "^\\d+$"}
+    assert [action for action, _ in repairs] == ["invalid_escape"]
+
+
+@pytest.mark.parametrize("cut", [0.25, 0.5, 0.9, 0.999])
+def test_truncated_output_is_rejected(cut):
+    with pytest.raises(JSONRepairError):
+        parse(CLEAN[: int(len(CLEAN) * cut)])
+
+
+def test_text_without_an_object_is_rejected():
+    with pytest.raises(JSONRepairError):
+        parse("I'm sorry, I can't generate that build plan.")
+
+
+def test_gemini_error_dump_is_rejected():
+    with open(ERROR_DUMP_PATH, encoding="utf-8") as f:
+        log = f.read()
+    # A traceback full of Python-repr dicts must not pass as a plan
+    with pytest.raises(JSONRepairError):
+        parse(log)
+
+    raw = log.split("RAW TEXT:\n", 1)[1] if "RAW TEXT:\n" in log else ""
+    if raw.strip() and raw.strip() != "N/A":
+        try:
+            plan, _ = parse(raw)
+        except JSONRepairError:
+            pass
+        else:
+            assert isinstance(plan, dict)
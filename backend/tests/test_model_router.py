@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+import pytest
+
+from model_router import FakeBackend, ModelRouter, PlanParseError
+
+
+def parse(text: str) -> dict:
+    try:
+        return json.loads(text)
+    except ValueError:
+        return {"error": "Failed to generate valid JSON."}
+
+
+def recording(name: str, reply: str, latency: float, replied: list) -> FakeBackend:
+    """A FakeBackend that notes in `replied` when it gets as far as answering (a cancelled call never does)."""
+    def answer(prompt):
+        replied.append(name)
+        return reply
+
+    return FakeBackend(name, reply=answer, latency=latency)
+
+
+def make_router(*backends, hedge_after: float = 0.05) -> ModelRouter:
+    return ModelRouter(list(backends), hedge_enabled=True, hedge_default_seconds=hedge_after)
+
+
+def test_no_hedge_when_the_primary_answers_in_time():
+    replied = []
+    primary = recording("primary", '{"plan": 1}', 0, replied)
+    secondary = recording("secondary", '{"plan": 2}', 0, replied)
+    router = make_router(primary, secondary, hedge_after=1)
+
+    assert asyncio.run(router.generate("prompt", parse)) == ({"plan": 1}, "primary")
+    assert router.hedges == 0
+    assert secondary.calls == 0
+
+
+def test_hedge_wins_and_the_slow_primary_is_cancelled():
+    replied = []
+    primary = recording("primary", '{"plan": 1}', 0.5, replied)
+    secondary = recording("secondary", '{"plan": 2}', 0, replied)
+    router = make_router(primary, secondary)
+
+    async def run():
+        result = await router.generate("prompt", parse)
+        await asyncio.sleep(0.6)  # past the point where the primary would have answered
+        return result
+
+    assert asyncio.run(run()) == ({"plan": 2}, "secondary")
+    assert replied == ["secondary"]
+    assert (router.hedges, router.hedge_wins) == (1, 1)
+    assert (primary.calls, primary.wins, primary.failures) == (1, 0, 0)
+    assert secondary.wins == 1
+    # The cancelled call is not a latency sample for the next hedge threshold
+    assert primary.latency.total == 0
+    assert secondary.latency.total == 1
+
+
+def test_losing_hedge_is_cancelled():
+    replied = []
+    primary = recording("primary", '{"plan": 1}', 0.1, replied)
+    secondary = recording("secondary", '{"plan": 2}', 0.5, replied)
+    router = make_router(primary, secondary)
+
+    async def run():
+        result = await router.generate("prompt", parse)
+        await asyncio.sleep(0.6)
+        return result
+
+    assert asyncio.run(run()) == ({"plan": 1}, "primary")
+    assert replied == ["primary"]
+    assert (router.hedges, router.hedge_wins) == (1, 0)
+    assert secondary.calls == 1
+
+
+def test_single_backend_hedges_against_itself():
+    latencies = iter([0.3, 0])
+    backend = FakeBackend("only", reply='{"plan": 1}', latency=lambda: next(latencies))
+    router = make_router(backend)
+
+    assert asyncio.run(router.generate("prompt", parse)) == ({"plan": 1}, "only")
+    assert backend.calls == 2
+    assert router.hedge_wins == 1
+
+
+def test_unparseable_reply_falls_back_to_the_next_backend():
+    primary = FakeBackend("primary", reply="Sorry, I can't help with that.")
+    secondary = FakeBackend("secondary", reply='{"plan": 2}')
+    router = make_router(primary, secondary, hedge_after=1)
+
+    assert asyncio.run(router.generate("prompt", parse)) == ({"plan": 2}, "secondary")
+    assert router.fallbacks == 1
+    assert router.hedges == 0
+    assert primary.failures == 1
+
+
+def test_last_error_is_raised_when_every_backend_fails():
+    primary = FakeBackend("primary", reply=RuntimeError("upstream down"))
+    secondary = FakeBackend("secondary", reply="not json")
+    router = make_router(primary, secondary, hedge_after=1)
+
+    with pytest.raises(PlanParseError):
+        asyncio.run(router.generate("prompt", parse))
+    assert (primary.failures, secondary.failures) == (1, 1)
+
+
+def test_hedge_delay_follows_the_primarys_recent_latency():
+    primary = FakeBackend("primary")
+    router = ModelRouter([primary], hedge_percentile=0.9, hedge_min_samples=20, hedge_default_seconds=20)
+    assert router.hedge_delay(primary) == 20
+    for _ in range(20):
+        primary.latency.observe(0.2)
+    assert 0.2 <= router.hedge_delay(primary) < 0.3
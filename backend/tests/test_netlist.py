@@ -0,0 +1,70 @@
+from netlist import Netlist, generate_fallback_wiring, normalize_wire, parse_endpoint
+
+PARTS = [
+    {"name": "ESP32", "type": "microcontroller"},
+    {"name": "DHT22", "type": "sensor"},
+    {"name": "LiPo Battery", "type": "battery"},
+    {"name": "Case", "type": "enclosure"},
+]
+
+
+def test_parse_endpoint_splits_on_the_last_parenthesis():
+    assert parse_endpoint("ESP32 (GND)") == ("ESP32", "GND")
+    assert parse_endpoint("Motor (A) (OUT1)") == ("Motor (A)", "OUT1")
+    assert parse_endpoint("Relay(IN)") == ("Relay", "IN")
+    assert parse_endpoint("ESP32") == ("ESP32", None)
+
+
+def test_normalize_wire_keeps_explicit_endpoints():
+    assert normalize_wire({"from": "ESP32 (GPIO4)", "to": "DHT22 (Data)"}) == {
+        "from": "ESP32 (GPIO4)", "to": "DHT22 (Data)",
+        "from_part": "ESP32", "from_pin": "GPIO4", "to_part": "DHT22", "to_pin": "Data",
+    }
+    wire = normalize_wire({"from": "ESP32", "to_part": "DHT22", "to_pin": "VCC"})
+    assert (wire["from_part"], wire["from_pin"], wire["to_part"], wire["to_pin"]) == ("ESP32", "Pin", "DHT22", "VCC")
+
+
+def test_wires_merge_pins_into_nets_case_insensitively():
+    netlist = Netlist(PARTS, [
+        {"from": "ESP32 (GND)", "to": "DHT22 (GND)"},
+        {"from": "dht22 (gnd)", "to": "LiPo Battery (-)"},
+        {"from": "ESP32 (GPIO4)", "to": "DHT22 (Data)"},
+    ])
+
+    assert sorted(netlist.net_of("LIPO battery", "-")) == ["DHT22 (GND)", "ESP32 (GND)", "LiPo Battery (-)"]
+    assert sorted(map(sorted, netlist.nets())) == [
+        ["DHT22 (Data)", "ESP32 (GPIO4)"],
+        ["DHT22 (GND)", "ESP32 (GND)", "LiPo Battery (-)"],
+    ]
+    assert netlist.net_of("ESP32", "VCC") == []
+    assert netlist.stats() == {"parts": 4, "pins": 5, "wires": 3, "nets": 2, "dangling": 0}
+
+
+def test_wires_to_unknown_parts_are_dangling():
+    netlist = Netlist(PARTS, [{"from": "ESP32 (GPIO5)", "to": "Buzzer (+)"}, "not a wire"])
+
+    assert netlist.dangling == [{"wire": 0, "end": "to", "part": "Buzzer"}]
+    assert netlist.stats()["parts"] == 4
+
+
+def test_parts_without_a_supply_net_are_unpowered():
+    netlist = Netlist(PARTS, [
+        {"from": "ESP32 (5V/VCC)", "to": "LiPo Battery (VCC)"},
+        {"from": "DHT22 (GND)", "to": "ESP32 (GND)"},
+    ])
+
+    # Batteries and enclosures never count; the sensor only shares ground
+    assert netlist.unpowered_parts() == ["DHT22"]
+    assert sorted(netlist.ground_pins()) == ["DHT22 (GND)", "ESP32 (GND)"]
+
+
+def test_fallback_wiring_powers_every_electrical_part():
+    netlist = Netlist(PARTS, [normalize_wire(wire) for wire in generate_fallback_wiring(PARTS)])
+
+    assert netlist.unpowered_parts() == []
+    assert netlist.dangling == []
+    assert "Case" not in {netlist.part_names[netlist.pin_part[pin]] for pin in range(len(netlist.pin_names))}
+
+
+def test_fallback_wiring_needs_a_controller():
+    assert generate_fallback_wiring([{"name": "DHT22", "type": "sensor"}]) == []
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from crud import add_build, add_builds
+from database import AsyncSessionLocal
+from models import Build, BuildPart
+from parts_catalog import (
+    builds_using, canonical_part_name, extract_catalog_parts, index_build, parts_matching, popular_parts,
+)
+
+ESP32 = {"name": "ESP32 Dev Kit", "type": "microcontroller"}
+L298N = {"name": "L298N  Motor Driver", "type": "Module", "quantity": 2}
+NANO = {"name": "Arduino Nano", "type": "microcontroller"}
+
+
+def _build(parts, created_at=None):
+    build = Build.from_plan(1, "a robot", {"device_name": "Robot", "parts": parts})
+    build.created_at = created_at or datetime.utcnow()
+    return build
+
+
+def test_names_and_types_are_canonicalized_and_repeats_merged():
+    assert canonical_part_name("  L298N  Motor Driver. ") == "l298n motor driver"
+    assert canonical_part_name(None) == ""
+
+    found = extract_catalog_parts([L298N, {"name": "l298n motor driver", "type": "module"}, {"type": "sensor"}, "x"])
+    assert found == {("l298n motor driver", "module"): {"name": "L298N Motor Driver", "quantity": 3}}
+    # Same name, different type: two catalog parts
+    assert len(extract_catalog_parts([ESP32, {"name": "ESP32 Dev Kit"}])) == 2
+
+
+def test_builds_share_catalog_rows_and_can_be_found_by_part(database, run):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            robot, station = await add_builds(db, [_build([ESP32, L298N]), _build([ESP32])])
+            other = await add_build(db, _build([NANO]))
+            await db.commit()
+            using_l298n = (await db.execute(
+                select(Build.id).where(Build.id.in_(builds_using(parts_matching("l298n"))))
+            )).scalars().all()
+            using_mcus = (await db.execute(
+                select(Build.id).where(Build.id.in_(builds_using(parts_matching("", "Microcontroller"))))
+            )).scalars().all()
+            return (robot.id, station.id, other.id), using_l298n, sorted(using_mcus), await popular_parts(db)
+
+    (robot, station, other), using_l298n, using_mcus, popular = run(scenario())
+    assert using_l298n == [robot]
+    assert using_mcus == [robot, station, other]
+    assert [(part["name"], part["builds"], part["quantity"]) for part in popular] == [
+        ("ESP32 Dev Kit", 2, 2), ("L298N Motor Driver", 1, 2), ("Arduino Nano", 1, 1),
+    ]
+
+
+def test_popularity_filters_by_type_name_and_window(database, run):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await add_builds(db, [
+                _build([ESP32], created_at=datetime.utcnow() - timedelta(days=30)),
+                _build([ESP32], created_at=datetime.utcnow() - timedelta(days=30)),
+                _build([NANO, L298N]),
+            ])
+            await db.commit()
+            week = datetime.utcnow() - timedelta(days=7)
+            return (
+                await popular_parts(db, kind="microcontroller"),
+                await popular_parts(db, kind="microcontroller", since=week),
+                await popular_parts(db, name="motor"),
+            )
+
+    all_time, this_week, motors = run(scenario())
+    assert [part["name"] for part in all_time] == ["ESP32 Dev Kit", "Arduino Nano"]
+    assert [part["name"] for part in this_week] == ["Arduino Nano"]
+    assert [part["name"] for part in motors] == ["L298N Motor Driver"]
+
+
+def test_reindexing_a_build_replaces_its_links(database, run):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            build = await add_build(db, _build([ESP32, L298N]))
+            build.parts_json = [NANO]
+            await index_build(db, build)
+            await db.commit()
+            return (await db.execute(select(BuildPart.quantity).where(BuildPart.build_id == build.id))).all()
+
+    assert run(scenario()) == [(1,)]
@@ -0,0 +1,94 @@
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from database import AsyncSessionLocal
+from models import PlanCacheEntry
+from plan_cache import PlanCache, make_key
+
+PLAN = {"device_name": "Weather Station", "parts": [{"name": "ESP32"}]}
+
+
+def _cache(**kwargs):
+    return PlanCache(**{"max_entries": 16, "ttl_seconds": 3600, "db_max_entries": 100, **kwargs})
+
+
+async def _age_rows(seconds):
+    async with AsyncSessionLocal() as db:
+        for entry in (await db.execute(select(PlanCacheEntry))).scalars():
+            entry.created_at = datetime.utcnow() - timedelta(seconds=seconds)
+        await db.commit()
+
+
+def test_keys_ignore_case_and_whitespace_but_not_the_model():
+    key = make_key("Build a  Weather\nstation", "gemini-flash", "abc")
+    assert key == make_key("build a weather station", "gemini-flash", "abc")
+    assert key != make_key("build a weather station", "gemini-pro", "abc")
+    assert key != make_key("build a weather station", "gemini-flash", "def")
+
+
+def test_miss_then_hit_returns_a_private_copy(database, run):
+    cache = _cache()
+
+    async def scenario():
+        assert await cache.get("k") is None
+        await cache.set("k", PLAN, model_name="gemini-flash", prompt="weather station")
+        first = await cache.get("k")
+        first["parts"].append({"name": "mutated"})
+        return await cache.get("k")
+
+    assert run(scenario()) == PLAN
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 2
+
+
+def test_another_worker_reads_the_shared_table(database, run):
+    writer, reader = _cache(), _cache()
+
+    async def scenario():
+        await writer.set("k", PLAN)
+        return await reader.get("k")
+
+    assert run(scenario()) == PLAN
+    assert reader.stats()["db_hits"] == 1
+
+
+def test_expired_rows_are_misses_and_are_deleted(database, run):
+    writer, reader = _cache(), _cache()
+
+    async def scenario():
+        await writer.set("k", PLAN)
+        await _age_rows(3601)
+        plan = await reader.get("k")
+        async with AsyncSessionLocal() as db:
+            return plan, await db.get(PlanCacheEntry, "k")
+
+    plan, row = run(scenario())
+    assert plan is None and row is None
+    assert reader.stats()["db_misses"] == 1
+
+
+def test_a_row_read_from_the_table_stays_in_memory_only_for_its_remaining_ttl(database, run):
+    writer, reader = _cache(), _cache()
+
+    async def scenario():
+        await writer.set("k", PLAN)
+        await _age_rows(3000)
+        return await reader.get("k")
+
+    assert run(scenario()) == PLAN
+    _, expires_at = reader.memory._data["k"]
+    assert expires_at - time.monotonic() <= 600
+
+
+def test_the_table_keeps_only_the_newest_rows(database, run):
+    cache = _cache(db_max_entries=3)
+
+    async def scenario():
+        for i in range(5):
+            await cache.set(f"k{i}", PLAN)
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(select(func.count()).select_from(PlanCacheEntry))
+
+    assert run(scenario()) == 3
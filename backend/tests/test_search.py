@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import insert
+
+import search
+from database import AsyncSessionLocal
+from models import Build, User
+from routers.builds import search_public_builds
+
+
+def _seed(engine, builds):
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"email": "search@example.com", "password_hash": "x"}])
+        user_id = conn.exec_driver_sql("SELECT id FROM users").scalar()
+        conn.execute(insert(Build), [
+            dict(build, user_id=user_id, wiring_json=[], steps_json=[], parts_json=build.get("parts_json", []))
+            for build in builds
+        ])
+
+
+async def _search(q, **kwargs):
+    response = Response()
+    async with AsyncSessionLocal() as db:
+        results = await search_public_builds(response, q=q, db=db, **{"limit": 20, "cursor": None, **kwargs})
+    return results, response.headers
+
+
+def test_fts5_query_quotes_every_term():
+    assert search.fts5_query('esp32 OR "x" NEAR(') == '"esp32" "OR" "x" "NEAR"'
+    assert search.fts5_query("¡¿") == ""
+
+
+def test_highlight_escapes_text_and_marks_matches():
+    assert search.highlight("<b>\x02esp32\x03</b>") == "&lt;b&gt;<mark>esp32</mark>&lt;/b&gt;"
+    assert search.highlight(None) == ""
+
+
+def test_search_ranks_matches_and_pages_through_the_cursor(migrated_database, run):
+    _seed(migrated_database, [
+        {"prompt": "a plant waterer", "device_name": "Plant Waterer", "description": "soil moisture"},
+        {"prompt": "a weather station", "device_name": "Weather Station", "description": "weather weather station"},
+        {"prompt": "robot car", "device_name": "Robot Car", "description": "drives around",
+         "parts_json": [{"name": "L298N Motor Driver"}]},
+        {"prompt": "station clock", "device_name": "Clock", "description": "a weather display"},
+    ])
+
+    async def scenario():
+        first, headers = await _search("weather", limit=1)
+        second, second_headers = await _search("weather", limit=1, cursor=headers["X-Next-Cursor"])
+        parts, _ = await _search("l298n")
+        return first, headers, second, second_headers, parts
+
+    first, headers, second, second_headers, parts = run(scenario())
+    assert first[0]["device_name"] == "Weather Station"
+    assert "<mark>" in first[0]["snippet"]
+    assert second[0]["device_name"] == "Clock"
+    assert "X-Next-Cursor" not in second_headers
+    assert headers["X-Search-Truncated"] == "0"
+    assert [result["device_name"] for result in parts] == ["Robot Car"]
+
+
+def test_search_reports_matches_beyond_the_candidate_window(migrated_database, run, monkeypatch):
+    _seed(migrated_database, [
+        {"prompt": f"esp32 gadget {i}", "device_name": f"Gadget {i}", "description": "esp32"} for i in range(5)
+    ])
+    monkeypatch.setattr(search, "SEARCH_CANDIDATES", 3)
+
+    results, headers = run(_search("esp32"))
+    # Only the newest three are ranked
+    assert sorted(result["device_name"] for result in results) == ["Gadget 2", "Gadget 3", "Gadget 4"]
+    assert headers["X-Search-Truncated"] == "1"
+
+
+def test_search_is_501_on_unsupported_databases(run):
+    db = SimpleNamespace(bind=SimpleNamespace(dialect=SimpleNamespace(name="mysql")))
+
+    with pytest.raises(HTTPException) as raised:
+        run(search_public_builds(Response(), q="esp32", limit=20, cursor=None, db=db))
+    assert raised.value.status_code == 501
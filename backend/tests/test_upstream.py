@@ -0,0 +1,196 @@
+import asyncio
+import threading
+
+import pytest
+
+import upstream
+from upstream import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, RetryBudget, UpstreamLimiter, UpstreamUnavailable
+
+
+class UpstreamError(Exception):
+    """Shaped like google.api_core errors: the HTTP status is in `.code`."""
+
+    def __init__(self, code: int):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(upstream, "time", clock)
+    return clock
+
+
+def make_limiter(**overrides) -> UpstreamLimiter:
+    settings = dict(
+        max_concurrency=2, rpm=0, tpm=0, queue_timeout_seconds=1, max_retries=3, retry_base_seconds=0,
+        retry_max_seconds=0, retry_budget_ratio=0.2, breaker_failures=5, breaker_reset_seconds=30,
+    )
+    settings.update(overrides)
+    return UpstreamLimiter(**settings)
+
+
+def flaky(failures: int, code: int = 503):
+    """A call that fails `failures` times with `code`, then returns "ok"; `.calls` counts attempts."""
+    def call():
+        call.calls += 1
+        if call.calls <= failures:
+            raise UpstreamError(code)
+        return "ok"
+
+    call.calls = 0
+    return call
+
+
+def test_retry_budget_earns_a_share_of_a_retry_per_request():
+    budget = RetryBudget(0.5, max_balance=2)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(10):
+        budget.deposit()
+    assert budget.balance == 2
+
+
+def test_retryable_errors_are_retried_until_success():
+    limiter = make_limiter()
+    call = flaky(2)
+    assert asyncio.run(limiter.call(call)) == "ok"
+    assert call.calls == 3
+    assert limiter.retries == 2
+    assert limiter.breaker.state == CLOSED
+
+
+def test_retries_stop_when_the_budget_is_spent():
+    limiter = make_limiter()
+    limiter.retry_budget = RetryBudget(0, max_balance=1)
+    call = flaky(5)
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(limiter.call(call))
+    assert call.calls == 2
+    assert limiter.retries == 1
+    assert limiter.retries_denied == 1
+
+
+def test_retries_stop_after_max_retries():
+    limiter = make_limiter(max_retries=2)
+    call = flaky(10)
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(limiter.call(call))
+    assert call.calls == 3
+
+
+def test_client_errors_are_not_retried():
+    limiter = make_limiter()
+    call = flaky(1, code=400)
+    with pytest.raises(UpstreamError):
+        asyncio.run(limiter.call(call))
+    assert call.calls == 1
+    assert limiter.retries == 0
+
+
+def test_breaker_opens_after_consecutive_failures_and_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.check()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(UpstreamUnavailable) as raised:
+        breaker.check()
+    assert raised.value.retry_after == 30
+
+    clock.now += 30
+    breaker.check()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(UpstreamUnavailable):
+        breaker.check()  # the trial is still in flight
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.consecutive_failures == 0
+    breaker.check()
+
+
+def test_failed_trial_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+    assert breaker.retry_after() == 30
+
+
+def test_released_trial_lets_the_next_caller_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    breaker.check()
+    breaker.release_trial()
+    breaker.check()
+    assert breaker.state == HALF_OPEN
+
+
+def test_server_errors_open_the_breaker_and_fail_fast():
+    limiter = make_limiter(max_retries=0, breaker_failures=1)
+    call = flaky(10)
+
+    async def run():
+        with pytest.raises(UpstreamUnavailable):
+            await limiter.call(call)
+        assert limiter.breaker.state == OPEN
+        with pytest.raises(UpstreamUnavailable):
+            await limiter.call(call)
+
+    asyncio.run(run())
+    assert call.calls == 1
+
+
+def test_rate_limits_do_not_open_the_breaker():
+    limiter = make_limiter(max_retries=0, breaker_failures=1)
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(limiter.call(flaky(10, code=429)))
+    assert limiter.rate_limited == 1
+    assert limiter.breaker.state == CLOSED
+
+
+def test_cancelled_caller_keeps_the_slot_until_its_thread_returns():
+    limiter = make_limiter(max_concurrency=1)
+    release = threading.Event()
+
+    async def run():
+        caller = asyncio.ensure_future(limiter.call(release.wait))
+        await asyncio.sleep(0.05)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        # The SDK call is still running in its thread, so it still counts against the cap
+        assert limiter._semaphore().locked()
+        assert (limiter.in_flight, limiter.abandoned) == (1, 1)
+
+        release.set()
+        for _ in range(100):
+            if not limiter._semaphore().locked():
+                break
+            await asyncio.sleep(0.01)
+        assert not limiter._semaphore().locked()
+        assert limiter.in_flight == 0
+        assert await limiter.call(lambda: "next") == "next"
+
+    asyncio.run(run())
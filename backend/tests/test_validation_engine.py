@@ -0,0 +1,68 @@
+from validation_engine import RULES, Rule, scan_text, validate_batch, validate_build
+
+GOOD = [
+    {"name": "ESP32 Dev Kit", "type": "microcontroller", "specs": "3.3V logic, 240mA peak"},
+    {"name": "18650 Battery", "type": "battery", "specs": "3.7V 2A"},
+]
+
+
+def test_scan_text_matches_whole_tokens_and_figures():
+    facts = scan_text("esp32-wroom with usb power supply, 15v 500ma 3v3 regulator, 2200mah")
+    assert facts.labels == {"mcu", "power_source"}
+    assert facts.volts == {15.0, 3.3}
+    assert facts.amps == (0.5,)
+    # "5v" is not found inside "15v"; separated units still count
+    assert 5.0 not in facts.volts
+    assert scan_text("12 volts 2 amps").volts == {12.0} and scan_text("12 volts 2 amps").amps == (2.0,)
+
+
+def test_a_complete_build_passes():
+    assert validate_build(GOOD) == []
+
+
+def test_missing_power_and_controller_are_reported():
+    warnings = validate_build([{"name": "SG90 Servo", "type": "motor"}])
+    assert warnings == [
+        "No obvious power source detected (battery, USB, adapter).",
+        "No common microcontroller detected. Ensure this is intended.",
+    ]
+    # Part types count even when the name says nothing
+    assert validate_build([{"name": "Main board", "type": "microcontroller"}, {"name": "Cell", "type": "battery"}]) == []
+
+
+def test_mixed_logic_voltages_are_reported():
+    warnings = validate_build(GOOD + [{"name": "Relay", "type": "module", "specs": "5V coil"}])
+    assert warnings == ["Mixed voltages (3.3V and 5V) detected. Ensure logic level shifting or regulation is used."]
+
+
+def test_loads_beyond_the_supply_rating_are_reported():
+    parts = GOOD + [{"name": "MG996R Servo", "type": "motor", "specs": "900mA stall", "quantity": 2}]
+    assert validate_build(parts) == [
+        "Estimated peak current draw (2040 mA) exceeds the power source rating (2000 mA)."
+    ]
+
+
+def test_wiring_checks_run_with_the_wiring_diagram():
+    wiring = [{"from": "ESP32 Dev Kit (GPIO4)", "to": "Buzzer (+)"}]
+    assert validate_build(GOOD, wiring=wiring) == [
+        "Wiring refers to parts that are not in the parts list: Buzzer.",
+        "No power connection found in the wiring for: ESP32 Dev Kit.",
+    ]
+
+
+def test_malformed_parts_do_not_raise():
+    # The unhashable name is still scanned (as text), so the controller is found
+    parts = [None, "ESP32", {"name": ["ESP32"], "specs": {"v": 5}}, {"quantity": "many"}]
+    assert validate_build(parts) == ["No obvious power source detected (battery, USB, adapter)."]
+
+
+def test_custom_rules_plug_in():
+    no_servos = Rule("no_servos", lambda facts: "Servo found." if any(p.type == "motor" for p in facts.parts) else None)
+    assert validate_build(GOOD + [{"name": "SG90", "type": "motor"}], rules=RULES + [no_servos]) == ["Servo found."]
+
+
+def test_validate_batch_counts_rule_hits_per_build():
+    report = validate_batch([(1, GOOD), (2, []), (3, "not a list")])
+    assert report.builds == 3 and report.warned == 2
+    assert report.rule_hits == {"power_source": 2, "voltage_domains": 0, "mcu": 2, "current_budget": 0}
+    assert set(report.warnings) == {2, 3}
@@ -0,0 +1,403 @@
+import asyncio
+import os
+import random
+import time
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+import logs
+
+# Client-side protection for the Gemini API: a concurrency cap, request and
+# token rate limits (the request rate backs off on 429s and recovers on
+# success), retries with jittered backoff under a retry budget, and a
+# circuit breaker that fails fast while upstream is down.
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))
+GEMINI_QUEUE_TIMEOUT_SECONDS = float(os.getenv("GEMINI_QUEUE_TIMEOUT_SECONDS", "30"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_RETRY_BASE_SECONDS = float(os.getenv("GEMINI_RETRY_BASE_SECONDS", "1"))
+GEMINI_RETRY_MAX_SECONDS = float(os.getenv("GEMINI_RETRY_MAX_SECONDS", "30"))
+GEMINI_RETRY_BUDGET_RATIO = float(os.getenv("GEMINI_RETRY_BUDGET_RATIO", "0.2"))
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET_SECONDS = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling upstream (breaker open, queue timeout) or after retries run out."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _status(e: Exception) -> Optional[int]:
+    # google.api_core errors carry the HTTP status in `.code`
+    code = getattr(e, "code", None)
+    if not isinstance(code, int):
+        code = getattr(e, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(e: Exception) -> bool:
+    code = _status(e)
+    return code is not None and (code == 429 or 500 <= code < 600)
+
+
+def is_rate_limited(e: Exception) -> bool:
+    return _status(e) == 429
+
+
+class TokenBucket:
+    """Refills `per_minute` tokens per minute up to one minute's worth; waiters are served in order."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.configured_rate = per_minute / 60.0
+        self.rate = self.configured_rate
+        self.tokens = per_minute
+        self._updated = time.monotonic()
+        self._lock = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        if not self.enabled:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def adjust(self, amount: float) -> None:
+        """Charges (or refunds, if negative) tokens after the fact, e.g. once real usage is known."""
+        if self.enabled:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+    def slow_down(self) -> None:
+        """Upstream says we're over quota: halve the refill rate and drop any saved-up burst."""
+        if self.enabled:
+            self._refill()
+            self.rate = max(self.configured_rate * 0.05, self.rate * 0.5)
+            self.tokens = min(self.tokens, 0)
+
+    def speed_up(self) -> None:
+        """Additive recovery toward the configured rate after each success."""
+        if self.enabled and self.rate < self.configured_rate:
+            self._refill()
+            self.rate = min(self.configured_rate, self.rate + self.configured_rate * 0.05)
+
+    def per_minute(self) -> Optional[float]:
+        return round(self.rate * 60, 1) if self.enabled else None
+
+    def available(self) -> Optional[float]:
+        if not self.enabled:
+            return None
+        self._refill()
+        return round(self.tokens, 1)
+
+
+class RetryBudget:
+    """Each request earns `ratio` retries (capped), so retries stay a fraction of real traffic."""
+
+    def __init__(self, ratio: float, max_balance: float = 10):
+        self.ratio = ratio
+        self.max_balance = max_balance
+        self.balance = max_balance
+
+    def deposit(self) -> None:
+        self.balance = min(self.max_balance, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive upstream failures (5xx, not
+    429s, which only mean we're over quota); one trial call is let through
+    after `reset_seconds`.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def check(self) -> None:
+        if self.failure_threshold <= 0 or self.state == CLOSED:
+            return
+        if self.state == OPEN and self.retry_after() == 0:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return
+        raise UpstreamUnavailable("AI service is temporarily unavailable, try again shortly.", self.retry_after() or 1)
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.failure_threshold > 0 and (self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold):
+            if self.state != OPEN:
+                self.times_opened += 1
+                logs.warning("upstream_breaker_opened", consecutive_failures=self.consecutive_failures)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def release_trial(self) -> None:
+        # The trial call ended without telling us anything about upstream health
+        self._trial_in_flight = False
+
+
+class UpstreamSlot:
+    """
+    A reserved place in the upstream limiter. Holding it counts against the
+    concurrency cap, so streaming callers keep it for the whole stream.
+    """
+
+    def __init__(self, limiter: "UpstreamLimiter", tokens: float):
+        self.limiter = limiter
+        self.tokens = tokens
+        self._acquired = False
+        self._running = None  # the thread-backed call in progress, see call()
+
+    async def __aenter__(self) -> "UpstreamSlot":
+        limiter = self.limiter
+        limiter.breaker.check()
+        started = time.monotonic()
+        limiter.waiting += 1
+        try:
+            await asyncio.wait_for(self._acquire(), limiter.queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            limiter.queue_timeouts += 1
+            limiter.breaker.release_trial()
+            raise UpstreamUnavailable("AI service is busy, try again shortly.", limiter.queue_timeout_seconds)
+        except BaseException:
+            limiter.breaker.release_trial()
+            raise
+        finally:
+            limiter.waiting -= 1
+        limiter._record_wait(time.monotonic() - started)
+        limiter.in_flight += 1
+        return self
+
+    async def _acquire(self) -> None:
+        limiter = self.limiter
+        await limiter._semaphore().acquire()
+        self._acquired = True
+        try:
+            await limiter.rpm.acquire(1)
+            await limiter.tpm.acquire(self.tokens)
+        except BaseException:
+            self._release()
+            raise
+
+    def _release(self) -> None:
+        if self._acquired:
+            self._acquired = False
+            self.limiter._semaphore().release()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        running = self._running
+        if running is not None and not running.done():
+            # The caller was cancelled (hedge loser, timeout) but the SDK call is still running in
+            # its thread; it keeps the slot until it returns, so the concurrency cap stays true
+            self.limiter.abandoned += 1
+            running.add_done_callback(self._finish_abandoned)
+        else:
+            self._finish()
+        if exc is not None and is_retryable(exc):
+            # Failure while consuming a streamed response
+            self.limiter._record_failure(exc)
+        else:
+            self.limiter.breaker.release_trial()
+
+    def _finish(self) -> None:
+        self.limiter.in_flight -= 1
+        self._release()
+
+    def _finish_abandoned(self, running: asyncio.Future) -> None:
+        if not running.cancelled():
+            running.exception()  # nobody is left to see the outcome
+        self._finish()
+
+    async def call(self, fn, *args, **kwargs):
+        """
+        Runs the blocking `fn` in a thread, retrying 429/5xx with jittered
+        exponential backoff. Retries keep the slot, so a struggling upstream
+        sees less concurrency rather than more. Cancelling the caller doesn't
+        stop the thread, so the slot is held until the thread returns.
+        """
+        limiter = self.limiter
+        limiter.requests += 1
+        limiter.retry_budget.deposit()
+        attempt = 0
+        while True:
+            self._running = asyncio.ensure_future(run_in_threadpool(fn, *args, **kwargs))
+            try:
+                result = await asyncio.shield(self._running)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                limiter._record_failure(e)
+                attempt += 1
+                if limiter.breaker.state == OPEN:
+                    raise UpstreamUnavailable("AI service is temporarily unavailable, try again shortly.", limiter.breaker.retry_after()) from e
+                if attempt > limiter.max_retries:
+                    raise UpstreamUnavailable("AI service is overloaded, try again shortly.", limiter.retry_max_seconds) from e
+                if not limiter.retry_budget.withdraw():
+                    limiter.retries_denied += 1
+                    raise UpstreamUnavailable("AI service is overloaded, try again shortly.", limiter.retry_max_seconds) from e
+                limiter.retries += 1
+                delay = limiter.backoff(attempt, getattr(e, "retry_after", None))
+                logs.warning("upstream_retry", status=getattr(e, "code", None), attempt=attempt, delay_seconds=round(delay, 1))
+                await asyncio.sleep(delay)
+                await limiter.rpm.acquire(1)
+                continue
+            limiter.breaker.record_success()
+            limiter.rpm.speed_up()
+            return result
+
+
+class UpstreamLimiter:
+    def __init__(
+        self,
+        max_concurrency: int,
+        rpm: float,
+        tpm: float,
+        queue_timeout_seconds: float,
+        max_retries: int,
+        retry_base_seconds: float,
+        retry_max_seconds: float,
+        retry_budget_ratio: float,
+        breaker_failures: int,
+        breaker_reset_seconds: float,
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.rpm = TokenBucket(rpm)
+        self.tpm = TokenBucket(tpm)
+        self.retry_budget = RetryBudget(retry_budget_ratio)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset_seconds)
+        self._sem = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.retries = 0
+        self.retries_denied = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.queue_timeouts = 0
+        self.abandoned = 0
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        return self._sem
+
+    def slot(self, tokens: float = 0) -> UpstreamSlot:
+        return UpstreamSlot(self, tokens)
+
+    async def call(self, fn, *args, tokens: float = 0, **kwargs):
+        """Waits for a slot, then runs `fn(*args, **kwargs)` in a thread with retries."""
+        async with self.slot(tokens) as slot:
+            return await slot.call(fn, *args, **kwargs)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        # "Full jitter": uniform over [0, capped exponential], never less than the server asked for
+        delay = random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempt - 1)))
+        return max(delay, retry_after or 0)
+
+    def _record_failure(self, e: Exception) -> None:
+        self.failures += 1
+        if is_rate_limited(e):
+            self.rate_limited += 1
+            self.rpm.slow_down()
+            self.breaker.release_trial()
+        else:
+            self.breaker.record_failure()
+
+    def _record_wait(self, seconds: float) -> None:
+        self.waits += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "requests": self.requests,
+            "retries": self.retries,
+            "retries_denied": self.retries_denied,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited,
+            "queue_timeouts": self.queue_timeouts,
+            "abandoned_calls": self.abandoned,
+            "queue_wait_ms_avg": round(1000 * self.wait_seconds_total / self.waits, 1) if self.waits else 0.0,
+            "queue_wait_ms_max": round(1000 * self.wait_seconds_max, 1),
+            "rpm_current": self.rpm.per_minute(),
+            "rpm_available": self.rpm.available(),
+            "tpm_available": self.tpm.available(),
+            "retry_budget": round(self.retry_budget.balance, 2),
+            "breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "times_opened": self.breaker.times_opened,
+                "retry_after_seconds": round(self.breaker.retry_after(), 1) if self.breaker.state != CLOSED else 0,
+            },
+        }
+
+
+gemini_limiter = UpstreamLimiter(
+    max_concurrency=GEMINI_MAX_CONCURRENCY,
+    rpm=GEMINI_RPM,
+    tpm=GEMINI_TPM,
+    queue_timeout_seconds=GEMINI_QUEUE_TIMEOUT_SECONDS,
+    max_retries=GEMINI_MAX_RETRIES,
+    retry_base_seconds=GEMINI_RETRY_BASE_SECONDS,
+    retry_max_seconds=GEMINI_RETRY_MAX_SECONDS,
+    retry_budget_ratio=GEMINI_RETRY_BUDGET_RATIO,
+    breaker_failures=GEMINI_BREAKER_FAILURES,
+    breaker_reset_seconds=GEMINI_BREAKER_RESET_SECONDS,
+)
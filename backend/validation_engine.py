@@ -1,23 +1,318 @@
-from typing import List, Dict, Any
+import functools
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
 
-def validate_build(parts: List[Dict[str, Any]]) -> List[str]:
+from metrics import span
+from netlist import Netlist
+
+# Declarative build checks. Each part's name + specs is split into tokens
+# once; keywords (compiled into a token trie) and voltage / current figures
+# are picked out of that single pass, so "5v" is never found inside "15v" and
+# a new rule only adds a check over the extracted facts, not another scan.
+# Scans are cached per distinct part (recurring parts are the common case).
+
+# label -> keywords. A trailing "*" matches a prefix ("stm32*" covers "stm32f103").
+KEYWORDS = {
+    "power_source": [
+        "battery", "usb", "power supply", "adapter", "plug", "lipo", "li-ion", "18650",
+        "power bank", "psu", "solar panel", "barrel jack",
+    ],
+    "mcu": [
+        "arduino", "esp32*", "esp8266", "stm32*", "raspberry", "pico", "attiny*", "atmega*",
+        "rp2040", "nrf52*", "teensy",
+    ],
+}
+
+# Part types that count on their own, whatever the part is called
+TYPE_LABELS = {"battery": "power_source", "microcontroller": "mcu"}
+
+LOGIC_VOLTAGES = (3.3, 5.0)
+
+# Current figures on these count as draw; on modules (relays, ESCs, regulators) they're usually ratings
+LOAD_TYPES = frozenset({"microcontroller", "camera", "sensor", "motor", "display", "led"})
+
+# Decimals stay one token ("3.3v"); everything else that isn't a letter or digit separates tokens
+TOKEN = re.compile(r"[0-9]+(?:\.[0-9]+)?[a-z0-9]*|[a-z0-9]+")
+QUANTITY = re.compile(r"(?P<num>[0-9]+(?:\.[0-9]+)?)(?P<unit>mah|ma|amps?|volts?|v|a)|(?P<vint>[0-9])v(?P<vfrac>[0-9])")
+UNITS = frozenset({"mah", "ma", "amp", "amps", "v", "volt", "volts"})  # "5 V", "2 amps"; a bare "a" is too ambiguous
+
+# Distinct part texts whose scan results are kept (see scan_text)
+SCAN_CACHE_SIZE = int(os.getenv("VALIDATION_SCAN_CACHE_SIZE", "4096"))
+
+
+def _compile(keywords: Dict[str, List[str]]):
     """
-    Analyzes parts list and returns a list of warnings.
+    Token trie: {token: (labels ending here, {next token: ...})}, plus the
+    prefix keywords as a tuple for str.startswith.
     """
+    trie: Dict[str, tuple] = {}
+    prefixes: Dict[str, Set[str]] = {}
+    for label, words in keywords.items():
+        for word in words:
+            word = word.lower()
+            if word.endswith("*"):
+                prefixes.setdefault(word[:-1], set()).add(label)
+                continue
+            node = trie
+            tokens = TOKEN.findall(word)
+            for i, token in enumerate(tokens):
+                entry = node.setdefault(token, (set(), {}))
+                if i == len(tokens) - 1:
+                    entry[0].add(label)
+                node = entry[1]
+    return trie, tuple(prefixes), prefixes
+
+
+KEYWORD_TRIE, PREFIXES, PREFIX_LABELS = _compile(KEYWORDS)
+
+
+class TextFacts(NamedTuple):
+    labels: FrozenSet[str]
+    volts: FrozenSet[float]
+    amps: Tuple[float, ...]
+
+
+class PartFacts(NamedTuple):
+    labels: FrozenSet[str]
+    volts: FrozenSet[float]
+    amps: Tuple[float, ...]
+    quantity: int = 1
+    type: Optional[str] = None
+
+
+EMPTY_PART = PartFacts(frozenset(), frozenset(), ())
+
+
+@dataclass
+class BuildFacts:
+    parts: List[PartFacts]
+    labels: Counter
+    volts: Set[float]
+
+    def has(self, label: str) -> bool:
+        return self.labels[label] > 0
+
+
+@functools.lru_cache(maxsize=SCAN_CACHE_SIZE)
+def scan_text(text: str) -> TextFacts:
+    """
+    Keywords, voltages and currents in one part's name + specs. Cached: the
+    same parts ("Arduino Nano", "SG90 Servo") recur across most builds.
+    """
+    labels, volts, amps = set(), set(), []
+    tokens = TOKEN.findall(text)
+    for i, token in enumerate(tokens):
+        entry = KEYWORD_TRIE.get(token)
+        if entry is not None:
+            labels |= entry[0]
+            # Multi-token keywords: follow the trie as far as the tokens go
+            node, j = entry[1], i + 1
+            while node and j < len(tokens) and tokens[j] in node:
+                found, node = node[tokens[j]]
+                labels |= found
+                j += 1
+        elif token.startswith(PREFIXES):
+            for prefix in PREFIXES:
+                if token.startswith(prefix):
+                    labels |= PREFIX_LABELS[prefix]
+        elif token[0].isdigit():
+            if i + 1 < len(tokens) and tokens[i + 1] in UNITS and token.replace(".", "", 1).isdigit():
+                token += tokens[i + 1]
+            match = QUANTITY.fullmatch(token)
+            if match is None:
+                continue
+            if match.group("vint") is not None:
+                volts.add(float(f"{match.group('vint')}.{match.group('vfrac')}"))
+                continue
+            value, unit = float(match.group("num")), match.group("unit")
+            if unit.startswith("v"):
+                volts.add(value)
+            elif unit == "ma":
+                amps.append(value / 1000)
+            elif unit != "mah":
+                amps.append(value)
+    return TextFacts(frozenset(labels), frozenset(volts), tuple(amps))
+
+
+@functools.lru_cache(maxsize=SCAN_CACHE_SIZE)
+def _part_facts(name: Any, specs: Any, kind: Any, quantity: Any) -> PartFacts:
+    text = scan_text(f"{name or ''} {specs or ''}".lower())
+    labels = text.labels
+    if kind in TYPE_LABELS:
+        labels = labels | {TYPE_LABELS[kind]}
+    try:
+        quantity = max(1, int(quantity or 1))
+    except (TypeError, ValueError):
+        quantity = 1
+    return PartFacts(labels, text.volts, text.amps, quantity, kind if isinstance(kind, str) else None)
+
+
+def extract_part(part: Any) -> PartFacts:
+    if not isinstance(part, dict):
+        return EMPTY_PART
+    try:
+        return _part_facts(part.get("name"), part.get("specs"), part.get("type"), part.get("quantity"))
+    except TypeError:
+        # Unhashable values (a list of specs, ...): scan without the cache
+        kind = part.get("type")
+        return _part_facts.__wrapped__(
+            part.get("name"), part.get("specs"), kind if isinstance(kind, str) else None, part.get("quantity")
+        )
+
+
+def extract_facts(parts: list) -> BuildFacts:
+    part_facts = [extract_part(part) for part in parts or []]
+    return BuildFacts(
+        parts=part_facts,
+        labels=Counter(chain.from_iterable(facts.labels for facts in part_facts)),
+        volts=set().union(*(facts.volts for facts in part_facts)),
+    )
+
+
+@dataclass
+class Rule:
+    id: str
+    check: Callable[[BuildFacts], Optional[str]]  # the warning, or None when the build passes
+    description: str = ""
+
+
+def _power_source(facts: BuildFacts) -> Optional[str]:
+    if not facts.has("power_source"):
+        return "No obvious power source detected (battery, USB, adapter)."
+    return None
+
+
+def _voltage_domains(facts: BuildFacts) -> Optional[str]:
+    if all(v in facts.volts for v in LOGIC_VOLTAGES):
+        return "Mixed voltages (3.3V and 5V) detected. Ensure logic level shifting or regulation is used."
+    return None
+
+
+def _mcu(facts: BuildFacts) -> Optional[str]:
+    if not facts.has("mcu"):
+        return "No common microcontroller detected. Ensure this is intended."
+    return None
+
+
+def _current_budget(facts: BuildFacts) -> Optional[str]:
+    # Sources are rated by their largest figure; loads draw their peak figure per unit
+    supply = sum(max(p.amps) for p in facts.parts if p.amps and "power_source" in p.labels)
+    load = sum(
+        max(p.amps) * p.quantity
+        for p in facts.parts
+        if p.amps and p.type in LOAD_TYPES and "power_source" not in p.labels
+    )
+    if supply and load > supply:
+        return (
+            f"Estimated peak current draw ({load * 1000:.0f} mA) exceeds the power source rating "
+            f"({supply * 1000:.0f} mA)."
+        )
+    return None
+
+
+RULES = [
+    Rule("power_source", _power_source, "A battery, USB or other supply is listed"),
+    Rule("voltage_domains", _voltage_domains, "Both 3.3V and 5V figures appear among the parts"),
+    Rule("mcu", _mcu, "A known microcontroller family is listed"),
+    Rule("current_budget", _current_budget, "Peak load current fits the supply's current rating"),
+]
+
+
+# Names listed in one wiring warning before "and N more"
+WIRING_WARNING_NAMES = 5
+
+
+def _name_list(names: List[str]) -> str:
+    shown = ", ".join(names[:WIRING_WARNING_NAMES])
+    if len(names) > WIRING_WARNING_NAMES:
+        shown += f" and {len(names) - WIRING_WARNING_NAMES} more"
+    return shown
+
+
+def wiring_warnings(parts: list, wiring: list) -> List[str]:
+    """Wires to parts that aren't in the parts list, and parts no wire supplies power to."""
+    if not wiring:
+        return []
+    netlist = Netlist(parts or [], wiring)
     warnings = []
-    
-    parts_text = " ".join([p.get("name", "").lower() + " " + p.get("specs", "").lower() for p in parts])
-    
-    # Check for power source
-    if not any(x in parts_text for x in ["battery", "usb", "power supply", "adapter", "plug"]):
-        warnings.append("No obvious power source detected (battery, USB, adapter).")
-        
-    # Check for voltage mismatch keywords (very basic heuristic)
-    if "3.3v" in parts_text and "5v" in parts_text:
-        warnings.append("Mixed voltages (3.3V and 5V) detected. Ensure logic level shifting or regulation is used.")
-        
-    # Check for microcontroller
-    if not any(x in parts_text for x in ["arduino", "esp32", "esp8266", "stm32", "raspberry", "pico", "attiny"]):
-        warnings.append("No common microcontroller detected. Ensure this is intended.")
-        
+    if netlist.dangling:
+        missing = list(dict.fromkeys(entry["part"] for entry in netlist.dangling))
+        warnings.append(f"Wiring refers to parts that are not in the parts list: {_name_list(missing)}.")
+    unpowered = netlist.unpowered_parts()
+    if unpowered:
+        warnings.append(f"No power connection found in the wiring for: {_name_list(unpowered)}.")
     return warnings
+
+
+def validate_build(
+    parts: List[Dict[str, Any]], rules: List[Rule] = RULES, wiring: Optional[list] = None
+) -> List[str]:
+    """
+    Analyzes parts list and returns a list of warnings. With the plan's
+    wiring_diagram, wiring checks (see wiring_warnings) are added.
+    """
+    with span("validate"):
+        facts = extract_facts(parts)
+        warnings = [warning for warning in (rule.check(facts) for rule in rules) if warning]
+        if wiring:
+            warnings += wiring_warnings(parts, wiring)
+        return warnings
+
+
+class BatchReport:
+    """Warnings per build plus hit counts and time spent per rule, over any number of validate_batch calls."""
+
+    def __init__(self, rules: List[Rule] = RULES, keep_warnings: bool = True):
+        self.rules = rules
+        self.keep_warnings = keep_warnings
+        self.builds = 0
+        self.warned = 0
+        self.extract_seconds = 0.0
+        self.rule_hits = {rule.id: 0 for rule in rules}
+        self.rule_seconds = {rule.id: 0.0 for rule in rules}
+        self.warnings: Dict[Any, List[str]] = {}
+
+    def to_dict(self) -> dict:
+        return {
+            "builds": self.builds,
+            "warned": self.warned,
+            "extract_ms": round(self.extract_seconds * 1000, 2),
+            "rules": {
+                rule.id: {"hits": self.rule_hits[rule.id], "ms": round(self.rule_seconds[rule.id] * 1000, 2)}
+                for rule in self.rules
+            },
+        }
+
+
+def validate_batch(rows: Iterable[Tuple[Any, list]], report: Optional[BatchReport] = None) -> BatchReport:
+    """
+    Validates many builds in one pass: rows are (build_id, parts). Facts are
+    extracted once per build and every rule runs against them, timed per rule.
+    """
+    report = report or BatchReport()
+    clock = time.perf_counter
+    for build_id, parts in rows:
+        started = clock()
+        facts = extract_facts(parts if isinstance(parts, list) else [])
+        report.extract_seconds += clock() - started
+
+        warnings = []
+        for rule in report.rules:
+            started = clock()
+            warning = rule.check(facts)
+            report.rule_seconds[rule.id] += clock() - started
+            if warning:
+                report.rule_hits[rule.id] += 1
+                warnings.append(warning)
+
+        report.builds += 1
+        if warnings:
+            report.warned += 1
+            if report.keep_warnings:
+                report.warnings[build_id] = warnings
+    return report